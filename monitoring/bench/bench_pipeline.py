@@ -0,0 +1,447 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+
+# End-to-end throughput of the extractor and the forwarder against local
+# stand-ins of OneView (REST and SCMB) and ServiceNow, no appliance needed.
+#
+#   python bench_pipeline.py --fleet 100,1000 --alerts 2000 --output results.json
+#   python bench_pipeline.py --compare baseline.json results.json
+#
+# Scenarios, each in its own process so that its RSS is its own:
+#   polling   - the collectors main.py runs per appliance (server, enclosure
+#               and port stats, NodeStats, active alerts) against a fleet
+#   scmb      - a burst of SCMB alerts through ScmbConsumer to the syslog file
+#   forwarder - a burst of syslog alerts through create_incident_with_syslog.py
+#               to the ServiceNow table API
+#
+# The polling and scmb results include the share of their CPU time spent in
+# the latency histograms and counters, which should stay under 1% at peak.
+#
+# main.py itself is not started: it logs in through the hpOneView client and
+# opens the SCMB over AMQPS with the certificates of a real appliance. The
+# scenarios run the same collectors and consumer, with the REST calls going
+# over https to the stand-in (self-signed certificate, made with openssl).
+# The scmb scenario needs amqplib installed, as ScmbConsumer's handler does.
+
+import argparse
+import contextlib
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+import urllib3
+
+# The OneView stand-in has a self-signed certificate
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+EXTRACTOR_DIR = os.path.join(HERE, '..', 'oneview_syslog_extractor')
+FORWARDER_DIR = os.path.join(HERE, '..', 'module_servicenow')
+
+import fake_oneview
+import fake_servicenow
+from fake_scmb import FakeScmbBroker
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def percentile(values, percent):
+    """
+    :return: nearest-rank percentile of the values, None when empty
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, int(-(-percent * len(values) // 100)) - 1))]
+
+
+def max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+@contextlib.contextmanager
+def background(target, *args):
+    """
+    Run a stand-in in its own process while in the block
+    :param target: serve function, called with args and a ready event
+    """
+    ready = mp.Event()
+    process = mp.Process(target=target, args=args + (ready,))
+    process.daemon = True
+    process.start()
+    ready.wait(30)
+    try:
+        yield process
+    finally:
+        process.terminate()
+        process.join()
+
+
+def isolated(scenario, *args):
+    """
+    Run a scenario function in a child process
+    :return: its result dictionary
+    """
+    results = mp.Queue()
+
+    def run():
+        try:
+            results.put(scenario(*args))
+        except Exception as e:
+            results.put({'error': "{}: {}".format(type(e).__name__, e)})
+
+    process = mp.Process(target=run)
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def _extractor(workdir):
+    """
+    Import the extractor from its directory, with its files under 'workdir'
+    """
+    os.chdir(workdir)
+    sys.path.insert(0, EXTRACTOR_DIR)
+    import internal.logutils as ovlog
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        ovlog.initialize_logging(syslogDir=workdir, syslogFile='oneview_syslog', flushInterval=0.1)
+    return ovlog
+
+
+def _syslog_lines(workdir):
+    with open(os.path.join(workdir, 'oneview_syslog'), 'rb') as syslog:
+        return sum(1 for _ in syslog)
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def instrumentation_overhead(instrumentation, cpuTime, calls=100000):
+    """
+    Share of the CPU time of a scenario spent in the instrumentation hooks:
+    the hook calls it made times the cost of a hook, measured afterwards in
+    the same process. A hook is a clock read around the timed code and a
+    histogram update by name; writeToSyslog also adds to a byte counter and
+    a failed OneView call to the error counter.
+    :param cpuTime: CPU seconds of the scenario
+    :return: dictionary with the hook calls and the overhead in percent
+    """
+    snapshot = instrumentation.stats.snapshot()
+    observes = sum(histogram['count'] for histogram in snapshot['histograms'].values())
+    counts = snapshot['histograms'].get('writeToSyslog', {}).get('count', 0) + \
+        snapshot['counters'].get('oneview errors', 0)
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        hookStart = time.perf_counter()
+        instrumentation.observe("bench overhead", time.perf_counter() - hookStart)
+    observeCost = (time.perf_counter() - start) / calls
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        instrumentation.count("bench overhead")
+    countCost = (time.perf_counter() - start) / calls
+
+    spent = observes * observeCost + counts * countCost
+    return {'hook_calls': observes + counts, 'hook_usec': round(observeCost * 1e6, 2),
+            'overhead_pct': round(100.0 * spent / cpuTime, 3) if cpuTime else None}
+
+
+###---------------------------------------------------------------
+# Scenarios
+# 
+###---------------------------------------------------------------
+def polling_scenario(host, workdir, max_in_flight):
+    """
+    One polling cycle of every collector, the port stats twice to get the rates
+    :param host: host:port of the OneView stand-in
+    :return: dictionary of results
+    """
+    ovlog = _extractor(workdir)
+    import internal.instrumentation as instrumentation
+    import internal.polling_processes as polling
+    from ov_client.connection_manager import OneViewConnection, OneViewRestClient
+
+    ovlog.initialize_port_rates()
+    connection = OneViewConnection(host, 'admin', 'admin', poolSize=max_in_flight)
+    connection.login()
+    client = OneViewRestClient(connection)
+
+    collectors = [('server_map', ovlog.create_server_map, (client,)),
+                  ('server_stats', polling.update_server_stats, (client, max_in_flight)),
+                  ('enclosure_stats', polling.update_enclosures_stats, (client, max_in_flight)),
+                  ('port_stats', polling.update_ports_status, (client, max_in_flight)),
+                  ('port_rates', polling.update_ports_status, (client, max_in_flight))]
+    collectors += [('nodestats_' + category, polling.update_all_hosts_status, (client, category))
+                   for category in ('server-hardware', 'enclosures', 'interconnects')]
+    collectors.append(('active_alerts', ovlog.logAlerts, (client, 'activeAlerts')))
+
+    seconds = {}
+    start = time.time()
+    cpuStart = cpu_seconds()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for name, collector, args in collectors:
+            collectorStart = time.time()
+            collector(*args)
+            seconds[name] = round(time.time() - collectorStart, 3)
+        ovlog.shutdown_logging()
+    elapsed = time.time() - start
+    cpuTime = cpu_seconds() - cpuStart
+    connection.close()
+
+    lines = _syslog_lines(workdir)
+    latencies = dict((name[len('oneview '):], dict((key, round(value, 4)) for key, value in histogram.items()))
+                     for name, histogram in instrumentation.stats.snapshot()['histograms'].items()
+                     if name.startswith('oneview '))
+    return {'seconds': round(elapsed, 3), 'syslog_lines': lines,
+            'events_per_sec': round(lines / elapsed, 1), 'collector_seconds': seconds,
+            'api_latency': latencies, 'cpu_seconds': round(cpuTime, 3),
+            'instrumentation': instrumentation_overhead(instrumentation, cpuTime),
+            'max_rss_kb': max_rss_kb()}
+
+
+def scmb_scenario(workdir, alerts, prefetch, workers):
+    """
+    A burst of 'alerts' SCMB messages, from delivery to acked once durable in the syslog file
+    :return: dictionary of results
+    """
+    ovlog = _extractor(workdir)
+    import internal.instrumentation as instrumentation
+    from internal.scmb_consumer import ScmbConsumer
+
+    broker = FakeScmbBroker()
+    broker.publish_alerts(alerts)
+    consumer = ScmbConsumer('fake-scmb', 'scmb.alerts.#', prefetch=prefetch, workers=workers,
+                            connect=broker.connect)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.time()
+        cpuStart = cpu_seconds()
+        thread = threading.Thread(target=consumer.run)
+        thread.start()
+        done = broker.wait_acked(alerts, timeout=600)
+        elapsed = time.time() - start
+        cpuTime = cpu_seconds() - cpuStart
+        consumer.stop()
+        thread.join()
+        ovlog.shutdown_logging()
+
+    latency = instrumentation.stats.snapshot()['histograms'].get('scmb receive-to-write', {})
+    return {'alerts': alerts, 'acked': broker.acked, 'complete': done, 'seconds': round(elapsed, 3),
+            'events_per_sec': round(broker.acked / elapsed, 1), 'syslog_lines': _syslog_lines(workdir),
+            'latency_p50': latency.get('p50'), 'latency_p99': latency.get('p99'),
+            'cpu_seconds': round(cpuTime, 3), 'instrumentation': instrumentation_overhead(instrumentation, cpuTime),
+            'max_rss_kb': max_rss_kb()}
+
+
+def forwarder_scenario(snow_port, workdir, alerts, workers, batch):
+    """
+    A burst of 'alerts' critical alerts appended to the syslog file followed by
+    create_incident_with_syslog.py, until all the SNOW records are written
+    :return: dictionary of results
+    """
+    sys.path.insert(0, EXTRACTOR_DIR)
+    from internal.syslog_formatter import SyslogFormatter
+
+    base = 'http://127.0.0.1:{}'.format(snow_port)
+    syslog_file = os.path.join(workdir, 'oneview_syslog')
+    checkpoint_file = os.path.join(workdir, 'syslog_checkpoint.json')
+    open(syslog_file, 'w').close()
+    # Follow the file from its start rather than from its end
+    with open(checkpoint_file, 'w') as checkpoint:
+        json.dump({'file': syslog_file, 'inode': os.stat(syslog_file).st_ino, 'offset': 0}, checkpoint)
+
+    properties = {
+        'servicenow': {'instance_url': base + '/api/now/table', 'username': 'admin', 'password': 'admin'},
+        'incident': {'caller': 'admin'},
+        'syslog_file': syslog_file,
+        'dispatcher': {'workers': workers, 'pool_size': workers},
+        'cache': {'ttl': 3600, 'persist_file': os.path.join(workdir, 'snow_cache.json')},
+        'follower': {'checkpoint_file': checkpoint_file, 'poll_interval': 0.1},
+        'syslog_source': 'file',
+        'coalescer': {'window': 0},
+        'batch': batch,
+        'outbox': {'path': os.path.join(workdir, 'snow_outbox.db')},
+        'stats': {'interval': 0}}
+    with open(os.path.join(workdir, 'properties.json'), 'w') as properties_file:
+        json.dump(properties, properties_file)
+
+    formatter = SyslogFormatter()
+    lines = [formatter.alert(2, fake_oneview.timestamp(time.time()), '10.0.0.1',
+                             'server-hardware' if idx % 2 == 0 else 'enclosures', 'resource-{}'.format(idx),
+                             str(100000 + idx), 'Power', 'Active', None, None, [],
+                             'Synthetic power supply failure {}.'.format(idx))
+             for idx in range(alerts)]
+
+    stats = lambda: requests.get(base + fake_servicenow.STATS_PATH).json()
+    with open(os.devnull, 'w') as devnull:
+        process = subprocess.Popen([sys.executable, os.path.join(FORWARDER_DIR, 'create_incident_with_syslog.py')],
+                                   cwd=workdir, stdout=devnull, stderr=subprocess.STDOUT)
+    try:
+        # Started once the caller is validated
+        while stats()['GET'] < 1 and process.poll() is None:
+            time.sleep(0.05)
+        time.sleep(0.5)
+        records = stats()['records']
+
+        start = time.time()
+        with open(syslog_file, 'a') as syslog:
+            syslog.write("\n".join(lines) + "\n")
+        while stats()['records'] - records < alerts and process.poll() is None and time.time() - start < 600:
+            time.sleep(0.05)
+        elapsed = time.time() - start
+
+        with open('/proc/{}/status'.format(process.pid)) as status:
+            rss = [int(line.split()[1]) for line in status if line.startswith('VmHWM')]
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    calls = stats()
+    latencies = [written - start for written in requests.get(base + fake_servicenow.TIMES_PATH).json()[records:]]
+    return {'alerts': alerts, 'records': len(latencies), 'seconds': round(elapsed, 3),
+            'events_per_sec': round(len(latencies) / elapsed, 1),
+            'latency_p50': round(percentile(latencies, 50) or 0, 4),
+            'latency_p99': round(percentile(latencies, 99) or 0, 4),
+            'api_calls': calls, 'max_rss_kb': rss[0] if rss else None}
+
+
+###---------------------------------------------------------------
+# Comparison of two result files
+# 
+###---------------------------------------------------------------
+def compare(baseline, current):
+    """
+    Print the change of every numeric result of 'current' against 'baseline'
+    """
+    def flatten(results, prefix=''):
+        values = {}
+        for name, value in results.items():
+            if isinstance(value, dict):
+                values.update(flatten(value, prefix + name + '.'))
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                values[prefix + name] = value
+        return values
+
+    old = flatten(baseline.get('scenarios', {}))
+    new = flatten(current.get('scenarios', {}))
+    print("{:70} {:>12} {:>12} {:>8}".format('result', 'baseline', 'current', 'change'))
+    for name in sorted(set(old) & set(new)):
+        change = "{:+.1f}%".format((new[name] - old[name]) * 100.0 / old[name]) if old[name] else ""
+        print("{:70} {:>12} {:>12} {:>8}".format(name, old[name], new[name], change))
+
+
+def git_version():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Extractor and forwarder benchmarks against local stand-ins")
+    parser.add_argument('--scenarios', default='polling,scmb,forwarder')
+    parser.add_argument('--fleet', default='100,1000', help="server hardware counts of the polling scenario")
+    parser.add_argument('--ports', type=int, default=16, help="ports per interconnect")
+    parser.add_argument('--samples', type=int, default=12, help="samples per utilization metric")
+    parser.add_argument('--active-alerts', type=int, default=200, help="active alerts on the appliance")
+    parser.add_argument('--ov-latency', type=float, default=0.002, help="seconds per OneView request")
+    parser.add_argument('--max-inflight', type=int, default=8)
+    parser.add_argument('--alerts', type=int, default=1000, help="alerts of the scmb and forwarder bursts")
+    parser.add_argument('--prefetch', type=int, default=100)
+    parser.add_argument('--scmb-workers', type=int, default=4)
+    parser.add_argument('--snow-workers', type=int, default=16)
+    parser.add_argument('--snow-batch', action='store_true', help="SNOW writes through the Batch API")
+    parser.add_argument('--snow-latency', type=float, default=0.005, help="seconds per SNOW request")
+    parser.add_argument('--record-cost', type=float, default=0.0002, help="seconds per SNOW record")
+    parser.add_argument('--output', help="JSON results file")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help="compare two results files")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as baseline, open(args.compare[1]) as current:
+            compare(json.load(baseline), json.load(current))
+        sys.exit(0)
+
+    scenarios = args.scenarios.split(',')
+    results = {'version': git_version(), 'python': platform.python_version(), 'cpus': os.cpu_count(),
+               'time': fake_oneview.timestamp(time.time()), 'arguments': vars(args), 'scenarios': {}}
+
+    if 'polling' in scenarios:
+        certdir = tempfile.mkdtemp()
+        certfile, keyfile = fake_oneview.make_certificate(certdir)
+        for servers in [int(size) for size in args.fleet.split(',')]:
+            port = free_port()
+            fleet = {'servers': servers, 'ports': args.ports, 'alerts': args.active_alerts,
+                     'samples': args.samples, 'latency': args.ov_latency}
+            with background(fake_oneview.serve, port, fleet, certfile, keyfile):
+                result = isolated(polling_scenario, '127.0.0.1:{}'.format(port), tempfile.mkdtemp(), args.max_inflight)
+                result['api_calls'] = requests.get('https://127.0.0.1:{}{}'.format(port, fake_oneview.STATS_PATH),
+                                                   verify=False).json()
+            results['scenarios']['polling_{}'.format(servers)] = result
+            print("polling   {:6} servers  {}".format(servers, json.dumps(
+                dict((key, result.get(key)) for key in ('seconds', 'syslog_lines', 'events_per_sec', 'max_rss_kb',
+                                                        'instrumentation', 'error')))))
+
+    if 'scmb' in scenarios:
+        result = isolated(scmb_scenario, tempfile.mkdtemp(), args.alerts, args.prefetch, args.scmb_workers)
+        results['scenarios']['scmb'] = result
+        print("scmb      {}".format(json.dumps(result)))
+
+    if 'forwarder' in scenarios:
+        port = free_port()
+        batch = {'enabled': args.snow_batch}
+        with background(fake_servicenow.serve, port, args.snow_latency, args.record_cost):
+            result = isolated(forwarder_scenario, port, tempfile.mkdtemp(), args.alerts, args.snow_workers, batch)
+        results['scenarios']['forwarder'] = result
+        print("forwarder {}".format(json.dumps(dict((key, value) for key, value in result.items() if key != 'api_calls'))))
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=4)
@@ -0,0 +1,150 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+
+# Records/sec of the SNOW operations, one HTTP request per record versus
+# the Batch API, against the local SNOW stand-in.
+#
+#   python bench_snow_batch.py --events 2000 --workers 64 --chunk-size 50
+
+import argparse
+import contextlib
+import json
+import multiprocessing as mp
+import os
+import socket
+import sys
+import tempfile
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'module_servicenow'))
+
+import create_incident_with_syslog as forwarder
+from fake_servicenow import serve, STATS_PATH
+from snow_dispatcher import event_key
+
+
+def make_events(count, prefix):
+    """
+    Critical alerts, half on server hardware (incidents), half on enclosures (events)
+    :param count: number of events
+    :param prefix: prefix of the resource names, distinct per run
+    :return: list of tokenized events
+    """
+    events = []
+    for idx in range(count):
+        hardware = idx % 2 == 0
+        events.append({
+            'oneviewIp': '10.0.0.1', 'alertResource': '{}-{}'.format(prefix, idx),
+            'alertMessage': 'Synthetic failure {}'.format(idx), 'alertId': str(100000 + idx),
+            'alertType': 'Alert', 'alertStatus': 'Active', 'severity': 'CRITICAL',
+            'alertCategory': 'server-hardware' if hardware else 'enclosures',
+            'eventTimeStamp': '2020-06-01T00:00:00.000Z', 'caseId': '', 'caseStatus': '',
+            'caseContactDetails': '', 'childEvents': []})
+    return events
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def run(port, events, workers, batch):
+    """
+    Send the events through the forwarder twice: creates, then updates of the same records
+    :param port: port of the SNOW stand-in
+    :param events: tokenized events
+    :param workers: dispatcher workers
+    :param batch: 'batch' properties
+    :return: dictionary of results
+    """
+    base = 'http://127.0.0.1:{}'.format(port)
+    calls = lambda: requests.get(base + STATS_PATH).json()
+    p = [base + '/api/now/table', 'admin', 'admin', 'admin', None, {'workers': workers, 'pool_size': workers},
+         {'ttl': 3600}, {}, 'socket', {'window': 0}, batch,
+         {'path': os.path.join(tempfile.mkdtemp(), 'snow_outbox.db')}, {'interval': 0}]
+    result = {}
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        dispatcher = forwarder.start_forwarder(p)
+        for phase in ('create', 'update'):
+            records = calls()['records']
+            start = time.time()
+            for event in events:
+                dispatcher.submit(event_key(event), dict(event))
+            # Wait for the phase without stopping the dispatcher
+            while calls()['records'] - records < len(events) and time.time() - start < 600:
+                time.sleep(0.1)
+            elapsed = time.time() - start
+            written = calls()['records'] - records
+            result[phase] = {'records': written, 'seconds': round(elapsed, 3),
+                             'records_per_sec': round(written / elapsed, 1)}
+        forwarder.stop_forwarder(dispatcher)
+
+    result['calls'] = calls()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="SNOW single versus batched writes")
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--chunk-size', type=int, default=50)
+    parser.add_argument('--flush-interval', type=float, default=0.05)
+    parser.add_argument('--latency', type=float, default=0.005, help="seconds per HTTP request of the stand-in")
+    parser.add_argument('--record-cost', type=float, default=0.0002, help="seconds per record of the stand-in")
+    parser.add_argument('--output', help="JSON results file")
+    args = parser.parse_args()
+
+    results = {'events': args.events, 'workers': args.workers, 'latency': args.latency,
+               'record_cost': args.record_cost}
+    modes = [('single', {'enabled': False}),
+             ('batched', {'enabled': True, 'chunk_size': args.chunk_size, 'flush_interval': args.flush_interval})]
+    for mode, batch in modes:
+        port = free_port()
+        ready = mp.Event()
+        server = mp.Process(target=serve, args=(port, args.latency, args.record_cost, ready))
+        server.daemon = True
+        server.start()
+        ready.wait()
+        try:
+            results[mode] = run(port, make_events(args.events, mode), args.workers, batch)
+        finally:
+            server.terminate()
+            server.join()
+        print("{:8} create {:8.1f} rec/s   update {:8.1f} rec/s   calls {}".format(
+            mode, results[mode]['create']['records_per_sec'], results[mode]['update']['records_per_sec'],
+            results[mode]['calls']))
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=4)
@@ -0,0 +1,289 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+# Stand-in of a OneView appliance for the benchmarks, serving a synthetic
+# fleet over https.
+
+import json
+import os
+import re
+import ssl
+import subprocess
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit, parse_qs
+
+STATS_PATH = '/stats'
+PAGE_SIZE = 500
+
+SERVER_METRICS = ('AmbientTemperature', 'AveragePower', 'CpuAverageFreq', 'CpuUtilization', 'PeakPower', 'PowerCap')
+ENCLOSURE_METRICS = ('AmbientTemperature', 'AveragePower', 'PeakPower')
+
+# name='value', name>'value' and name>='value' terms of the filters
+FILTER_TERM = re.compile(r"(\w+)\s*(>=|>|=)\s*'([^']*)'")
+
+# Volume of the ports in bytes/sec, the counters grow with the time
+PORT_BYTES_PER_SEC = 50 * 1000 * 1000
+
+
+def timestamp(seconds):
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(seconds))
+
+
+def make_certificate(directory):
+    """
+    Self-signed certificate of the stand-in, the extractor connects with https only
+    :param directory: directory of the certificate and key files
+    :return: (certificate file, key file)
+    """
+    certfile = os.path.join(directory, 'fake_oneview.pem')
+    keyfile = os.path.join(directory, 'fake_oneview.key')
+    subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                           '-subj', '/CN=127.0.0.1', '-keyout', keyfile, '-out', certfile],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return certfile, keyfile
+
+
+def make_alert(idx, created, server_uri=None):
+    """
+    Active critical alert, on a server hardware when 'server_uri' is given, else on an enclosure
+    :param idx: alert id
+    :param created: creation timestamp
+    :return: alert resource
+    """
+    return {
+        'uri': '/rest/alerts/{}'.format(idx), 'category': 'alerts',
+        'created': created, 'modified': created, 'severity': 'Critical', 'alertState': 'Active',
+        'physicalResourceType': 'server-hardware' if server_uri else 'enclosures',
+        'associatedResource': {'resourceName': 'resource-{}'.format(idx),
+                               'resourceUri': server_uri or '/rest/enclosures/enc-{}'.format(idx)},
+        'healthCategory': 'Power', 'assignedToUser': None, 'serviceEventSource': False,
+        'serviceEventDetails': None, 'childAlerts': [], 'correctiveAction': None,
+        'description': 'Synthetic power supply failure {}.'.format(idx)}
+
+
+class FakeOneView(object):
+    """
+    In-memory stand-in of the OneView REST API used by the extractor, with a
+    synthetic fleet: 'servers' server hardware in enclosures of 12 bays, 2
+    interconnects per enclosure with 'ports' ports each (half of them linked),
+    one logical interconnect per enclosure and 'alerts' active alerts.
+
+    Every HTTP request costs 'latency' seconds. The calls are counted per
+    endpoint and returned on /stats.
+    """
+
+    def __init__(self, port=0, servers=100, ports=16, alerts=100, samples=12, latency=0.002,
+                 certfile=None, keyfile=None):
+        """
+        :param port: listening port, 0 for any free port
+        :param servers: server hardware of the fleet
+        :param ports: ports per interconnect
+        :param alerts: active alerts
+        :param samples: samples per metric of the utilization responses
+        :param latency: seconds spent per HTTP request
+        :param certfile: certificate to serve https with, plain http without
+        """
+        self.latency = latency
+        self.samples = samples
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.calls = {}
+
+        now = time.time()
+        enclosures = max(1, (servers + 11) // 12)
+        self.collections = {
+            'server-hardware': [self._resource('server-hardware', 'sh-{:05d}'.format(idx), 'Enclosure-{}, bay {}'.format(idx // 12, idx % 12 + 1),
+                                               now, uuid='sh-{:05d}'.format(idx), serverName='server-{:05d}'.format(idx),
+                                               serialNumber='SN{:08d}'.format(idx), model='Synergy 480 Gen10')
+                                for idx in range(servers)],
+            'enclosures': [self._resource('enclosures', 'enc-{:04d}'.format(idx), 'Enclosure-{}'.format(idx), now,
+                                          model='Synergy 12000 Frame')
+                           for idx in range(enclosures)],
+            'interconnects': [self._resource('interconnects', 'ic-{:05d}'.format(idx), 'Enclosure-{}, interconnect {}'.format(idx // 2, idx % 2 * 3 + 3),
+                                             now, model='Virtual Connect SE 40Gb F8 Module')
+                              for idx in range(enclosures * 2)],
+            'sas-interconnects': [],
+            'logical-interconnects': [self._resource('logical-interconnects', 'li-{:04d}'.format(idx), 'LI-{}'.format(idx), now)
+                                      for idx in range(enclosures)],
+        }
+        servers = self.collections['server-hardware']
+        self.collections['alerts'] = [make_alert(idx, timestamp(now - alerts + idx),
+                                                 servers[idx % len(servers)]['uri'] if servers and idx % 2 == 0 else None)
+                                      for idx in range(alerts)]
+        self.ports = [{'portName': 'Q{}'.format(idx + 1), 'portStatus': 'Linked' if idx % 2 == 0 else 'Unlinked',
+                       'status': 'OK', 'operationalSpeed': 'Speed10G',
+                       'neighbor': {'remotePortId': 'Ten-GigabitEthernet1/0/{}'.format(idx + 1),
+                                    'remoteMgmtAddress': '10.0.0.{}'.format(idx + 1)}}
+                      for idx in range(ports)]
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                status, result = fake.handle(method, self.path)
+                data = json.dumps(result).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        self.server = Server(('127.0.0.1', port), Handler)
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        self.port = self.server.server_address[1]
+        self.host = '127.0.0.1:{}'.format(self.port)
+        self.thread = None
+
+    @staticmethod
+    def _resource(category, uid, name, now, **fields):
+        resource = {'uri': '/rest/{}/{}'.format(category, uid), 'category': category, 'name': name,
+                    'status': 'OK', 'state': 'Monitored', 'modified': timestamp(now), 'eTag': timestamp(now)}
+        resource.update(fields)
+        return resource
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-oneview")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, method, path):
+        """
+        Serve one HTTP request
+        :return: (status code, JSON result)
+        """
+        parts = urlsplit(path)
+        if parts.path == STATS_PATH:
+            with self.lock:
+                return 200, dict(self.calls)
+
+        time.sleep(self.latency)
+        names = parts.path.strip('/').split('/')
+        # Endpoint of the call, resource ids and port names left out
+        endpoint = '{} /{}'.format(method, '/'.join(name if idx not in (2, 4) else '*' for idx, name in enumerate(names)))
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+        if parts.path == '/rest/login-sessions' and method == 'POST':
+            return 200, {'sessionID': 'fake-session'}
+        if len(names) < 2 or names[0] != 'rest' or names[1] not in self.collections:
+            return 404, {'errorCode': 'RESOURCE_NOT_FOUND', 'message': path}
+
+        collection = names[1]
+        if len(names) == 2:
+            return 200, self._page(collection, parts.path, parse_qs(parts.query))
+        if len(names) == 4 and names[3] == 'utilization':
+            metrics = SERVER_METRICS if collection == 'server-hardware' else ENCLOSURE_METRICS
+            return 200, self._utilization(metrics)
+        if len(names) == 4 and names[3] == 'ports':
+            return 200, {'members': self.ports, 'total': len(self.ports)}
+        if len(names) == 5 and names[3] == 'statistics':
+            counter = int((time.time() - self.started) * PORT_BYTES_PER_SEC)
+            return 200, {'commonStatistics': {'rfc1213IfInOctets': str(counter),
+                                              'rfc1213IfOutOctets': str(counter // 2)}}
+        uri = '/rest/{}/{}'.format(collection, names[2])
+        for resource in self.collections[collection]:
+            if resource['uri'] == uri:
+                return 200, resource
+        return 404, {'errorCode': 'RESOURCE_NOT_FOUND', 'message': path}
+
+    def _page(self, collection, path, query):
+        members = self.collections[collection]
+        for filters in query.get('filter', []):
+            for field, operator, value in FILTER_TERM.findall(filters):
+                if operator == '=':
+                    members = [member for member in members if str(member.get(field)) == value]
+                elif operator == '>=':
+                    members = [member for member in members if str(member.get(field)) >= value]
+                else:
+                    members = [member for member in members if str(member.get(field)) > value]
+        if query.get('sort', [''])[0].startswith('modified'):
+            members = sorted(members, key=lambda member: member['modified'])
+
+        start = int(query.get('start', [0])[0])
+        count = int(query.get('count', [PAGE_SIZE])[0])
+        page = {'members': members[start:start + count], 'total': len(members), 'start': start}
+        if start + count < len(members):
+            nextQuery = dict((name, values[0]) for name, values in query.items())
+            nextQuery.update(start=start + count, count=count)
+            page['nextPageUri'] = path + '?' + '&'.join('{}={}'.format(name, value) for name, value in nextQuery.items())
+        return page
+
+    def _utilization(self, metrics):
+        now = int(time.time()) // 300 * 300
+        samples = [[(now - 300 * idx) * 1000, 20 + idx % 10] for idx in range(self.samples)]
+        return {'metricList': [{'metricName': metric, 'metricSamples': samples, 'metricCapacity': 100}
+                               for metric in metrics]}
+
+
+###---------------------------------------------------------------
+# Run the stand-in
+# 
+###---------------------------------------------------------------
+def serve(port, fleet, certfile=None, keyfile=None, ready=None):
+    """
+    Serve until terminated. Run in its own process so that the stand-in
+    does not compete with the measured extractor for the interpreter lock.
+    :param fleet: keyword arguments of FakeOneView (servers, ports, alerts, samples, latency)
+    :param ready: multiprocessing.Event set once listening
+    """
+    fake = FakeOneView(port, certfile=certfile, keyfile=keyfile, **fleet)
+    print("Fake OneView listening on {}://{}".format('https' if certfile else 'http', fake.host))
+    if ready:
+        ready.set()
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        fake.server.server_close()
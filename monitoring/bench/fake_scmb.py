@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+
+# Stand-in of the SCMB (the AMQP broker of OneView) for the benchmarks,
+# plugged into the extractor's ScmbConsumer through its 'connect' hook.
+
+import json
+import queue
+import socket
+import threading
+import time
+
+from fake_oneview import make_alert, timestamp
+
+
+class FakeMessage(object):
+
+    def __init__(self, delivery_tag, body):
+        self.delivery_tag = delivery_tag
+        self.body = body
+
+
+class FakeChannel(object):
+    """
+    Channel of the stand-in, with the amqplib calls of ScmbConsumer.
+    Deliveries respect the prefetch window and wait() times out like a
+    socket with nothing to read.
+    """
+
+    def __init__(self, broker, timeout=0.5):
+        self.broker = broker
+        self.timeout = timeout
+        self.prefetch = 0
+        self.callback = None
+        self.next_tag = 1
+        self.acked = 0
+
+    def basic_qos(self, prefetch_size, prefetch_count, a_global):
+        self.prefetch = prefetch_count
+
+    def queue_declare(self, queue='', durable=False, exclusive=True, auto_delete=True):
+        return queue or 'amq.gen-fake', 0, 0
+
+    def queue_bind(self, queue, exchange, routing_key):
+        pass
+
+    def basic_consume(self, queue, no_ack=False, callback=None):
+        self.callback = callback
+
+    def wait(self):
+        window = self.prefetch - (self.next_tag - 1 - self.acked) if self.prefetch else 1
+        if window <= 0:
+            time.sleep(0.001)
+            return
+        try:
+            body = self.broker.messages.get(timeout=self.timeout)
+        except queue.Empty:
+            raise socket.timeout()
+        while True:
+            self.callback(FakeMessage(self.next_tag, body))
+            self.next_tag += 1
+            window -= 1
+            if window <= 0:
+                break
+            try:
+                body = self.broker.messages.get_nowait()
+            except queue.Empty:
+                break
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        acked = delivery_tag if multiple else self.acked + 1
+        self.broker.acknowledge(acked - self.acked)
+        self.acked = acked
+
+    def close(self):
+        pass
+
+
+class FakeConnection(object):
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def channel(self):
+        return FakeChannel(self.broker)
+
+    def close(self):
+        pass
+
+
+class FakeScmbBroker(object):
+    """
+    Queue of SCMB alert messages. connect() is the ScmbConsumer hook.
+    """
+
+    def __init__(self):
+        self.messages = queue.Queue()
+        self.lock = threading.Lock()
+        self.published = 0
+        self.acked = 0
+
+    def connect(self, host):
+        return FakeConnection(self)
+
+    def publish(self, body):
+        with self.lock:
+            self.published += 1
+        self.messages.put(body)
+
+    def publish_alerts(self, count, first_id=1, server_uri=None):
+        """
+        Burst of 'count' new critical alerts
+        :param first_id: id of the first alert
+        :param server_uri: server hardware of the alerts, enclosures when None
+        """
+        now = time.time()
+        for idx in range(first_id, first_id + count):
+            alert = make_alert(idx, timestamp(now), server_uri)
+            self.publish(json.dumps({'resource': alert, 'changeType': 'Created',
+                                     'resourceUri': alert['uri'], 'eTag': alert['modified']}))
+
+    def acknowledge(self, count):
+        with self.lock:
+            self.acked += count
+
+    def wait_acked(self, count, timeout=60):
+        """
+        :return: True once 'count' messages are acked
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self.lock:
+                if self.acked >= count:
+                    return True
+            time.sleep(0.01)
+        return False
@@ -0,0 +1,216 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+
+import argparse
+import base64
+import itertools
+import json
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlsplit, parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlsplit, parse_qs
+
+TABLE_API = '/api/now/table/'
+BATCH_API = '/api/now/v1/batch'
+STATS_PATH = '/stats'
+TIMES_PATH = '/stats/times'
+
+
+class FakeServiceNow(object):
+    """
+    In-memory stand-in of the SNOW table and batch APIs.
+
+    Every HTTP request costs 'latency' seconds (network round trip and
+    transaction overhead of the instance) and every record written costs
+    'record_cost' seconds, so single and batched writes can be compared.
+    """
+
+    def __init__(self, port=0, latency=0.005, record_cost=0.0002, caller='admin'):
+        """
+        :param port: listening port, 0 for any free port
+        :param latency: seconds spent per HTTP request
+        :param record_cost: seconds spent per record written
+        :param caller: user name of the sys_user record
+        """
+        self.latency = latency
+        self.record_cost = record_cost
+        self.tables = {'sys_user': {'user0': {'sys_id': 'user0', 'user_name': caller}}}
+        self.numbers = itertools.count(1)
+        self.lock = threading.Lock()
+        self.calls = {'GET': 0, 'POST': 0, 'PUT': 0, 'batch': 0, 'records': 0}
+        # Time each record was written, for the end-to-end latencies
+        self.written = []
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b""
+                status, result = fake.handle(method, self.path, body)
+                data = json.dumps(result).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_PUT(self):
+                self._handle('PUT')
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        self.server = Server(('127.0.0.1', port), Handler)
+        self.port = self.server.server_address[1]
+        self.url = 'http://127.0.0.1:{}/api/now/table'.format(self.port)
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-servicenow")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, method, path, body):
+        """
+        Serve one HTTP request
+        :return: (status code, JSON result)
+        """
+        if path == STATS_PATH:
+            with self.lock:
+                return 200, dict(self.calls)
+        if path == TIMES_PATH:
+            with self.lock:
+                return 200, list(self.written)
+
+        time.sleep(self.latency)
+        if path.startswith(BATCH_API) and method == 'POST':
+            return 200, self._batch(json.loads(body.decode('utf-8')))
+        with self.lock:
+            self.calls[method] += 1
+        return self._table(method, path, body)
+
+    def _batch(self, batch):
+        with self.lock:
+            self.calls['batch'] += 1
+
+        serviced = []
+        for request in batch.get('rest_requests', []):
+            body = base64.b64decode(request.get('body') or "")
+            status, result = self._table(request['method'], request['url'], body)
+            serviced.append({'id': request['id'], 'status_code': status, 'status_text': "",
+                             'headers': [{'name': 'Content-Type', 'value': 'application/json'}],
+                             'body': base64.b64encode(json.dumps(result).encode('utf-8')).decode('ascii'),
+                             'execution_time': 0})
+        return {'batch_request_id': batch.get('batch_request_id'),
+                'serviced_requests': serviced, 'unserviced_requests': []}
+
+    def _table(self, method, path, body):
+        parts = urlsplit(path)
+        if not parts.path.startswith(TABLE_API):
+            return 404, {'error': {'message': 'Invalid path', 'detail': path}}
+        names = parts.path[len(TABLE_API):].split('/')
+        table = names[0]
+
+        if method == 'GET':
+            query = parse_qs(parts.query)
+            conditions = [condition.split('=', 1) for condition in query.get('sysparm_query', [""])[0].split('^') if condition]
+            limit = int(query.get('sysparm_limit', [0])[0])
+            with self.lock:
+                records = [record for record in self.tables.get(table, {}).values()
+                           if all(str(record.get(field)) == value for field, value in conditions)]
+            return 200, {'result': records[:limit] if limit else records}
+
+        time.sleep(self.record_cost)
+        data = json.loads(body.decode('utf-8')) if body else {}
+        with self.lock:
+            self.calls['records'] += 1
+            self.written.append(time.time())
+            rows = self.tables.setdefault(table, {})
+            if method == 'POST':
+                number = next(self.numbers)
+                record = dict(data, sys_id='{:032x}'.format(number), number='{}{:07d}'.format(table[:3].upper(), number))
+                rows[record['sys_id']] = record
+                return 201, {'result': record}
+            if method == 'PUT' and len(names) > 1 and names[1] in rows:
+                rows[names[1]].update(data)
+                return 200, {'result': rows[names[1]]}
+        return 404, {'error': {'message': 'No Record found', 'detail': path}}
+
+
+###---------------------------------------------------------------
+# Run the stand-in
+# 
+###---------------------------------------------------------------
+def serve(port, latency, record_cost, ready=None):
+    """
+    Serve until interrupted. Run in its own process so that the stand-in
+    does not compete with the measured client for the interpreter lock.
+    :param ready: multiprocessing.Event set once listening
+    """
+    fake = FakeServiceNow(port, latency, record_cost)
+    print("Fake SNOW listening on {}".format(fake.url))
+    if ready:
+        ready.set()
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        fake.server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fake SNOW table and batch APIs")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--record-cost', type=float, default=0.0002)
+    args = parser.parse_args()
+
+    serve(args.port, args.latency, args.record_cost)
@@ -24,9 +24,11 @@
 # Author : GSE Team, HPE
 ###
 
-import requests
 import json
 
+import snow_cache
+import snow_client
+
 ###---------------------------------------------------------------
 # Verify the alert ID. 
 # 
@@ -41,6 +43,12 @@ def check_event(s_url, username, password, alert_id):
     :return: None
     """
 
+    key = snow_cache.cache_key('em_event', alert_id)
+    sys_id = snow_cache.get_cache().get(key)
+    if sys_id:
+        print("Alert ID '%s' is already present (cached)." % alert_id)
+        return sys_id
+
     # Set the request parameters
     api_url = 'em_event?sysparm_query=u_alert_id=' + alert_id
     url = s_url + '/' + api_url
@@ -49,13 +57,10 @@ def check_event(s_url, username, password, alert_id):
     headers = {"Content-Type": "application/json", "Accept": "application/json"}
 
     # Do the HTTP request
-    response = requests.get(url, auth=(username, password), headers=headers)
+    response = snow_client.get(url, auth=(username, password), headers=headers)
 
     # Check for HTTP codes other than 200
-    if response.status_code != 200:
-        print('Status 1:', response.status_code, 'Headers:', response.headers, 'Error Response:', response.json())
-        # data = response.json()
-        exit()
+    snow_client.check_response(response, 200, "Event lookup")
 
     # Decode the JSON response into a dictionary and use the data
     data = response.json()
@@ -63,6 +68,7 @@ def check_event(s_url, username, password, alert_id):
         print("Alert ID '%s' is already present." % alert_id)
         print("Start updating Event ...." )
         sys_id = data['result'][0]['sys_id']
+        snow_cache.get_cache().set(key, sys_id)
         return sys_id
     else:
         print("Alert ID '%s' is not found in any event instances." % alert_id)
@@ -130,18 +136,21 @@ def create_event(p, tokenized_events, alert_id):
     data1 = json.dumps(data)
 
     # Do the HTTP request
-    response = requests.post(url, auth=(username, password), headers=headers, data=data1)
+    # Creates of the same event pending in one batch are merged
+    response = snow_client.post(url, auth=(username, password), headers=headers, data=data1,
+                                merge_key=snow_cache.cache_key('em_event', alert_id))
 
-    # Check for HTTP codes other than 200
-    if response.status_code != 201:
-        print('Status 2:', response.status_code, 'Headers:', response.headers, 'Error Response:', response.json())
-        exit()
+    # Check for HTTP codes other than 201
+    snow_client.check_response(response, 201, "Event creation")
 
     # Decode the JSON response into a dictionary and use the data
     data = response.json()
     sys_id = data['result']['sys_id']
     print("New event '%s' created in SNOW instance." % data['result']['sys_id'])
 
+    # Later events with the same alert id update this event
+    snow_cache.get_cache().set(snow_cache.cache_key('em_event', alert_id), sys_id)
+
     return sys_id
 
 
@@ -179,12 +188,10 @@ def update_event(s_url, username, password, event_sys_id, tokenized_events):
     data1 = json.dumps(data)
 
     # Do the HTTP request
-    response = requests.put(url, auth=(username, password), headers=headers, data=data1)
+    response = snow_client.put(url, auth=(username, password), headers=headers, data=data1)
 
     # Check for HTTP codes other than 200
-    if response.status_code != 200:
-        print('Status 3:', response.status_code, 'Headers:', response.headers, 'Error Response:', response.json())
-        exit()
+    snow_client.check_response(response, 200, "Event update")
 
     # Decode the JSON response into a dictionary and use the data
     data = response.json()
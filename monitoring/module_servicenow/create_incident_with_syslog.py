@@ -24,31 +24,36 @@
 # Author : GSE Team, HPE
 ###
 
-import requests
 import json
+import sys
+
+import snow_cache
+import snow_client
+import snow_stats
 
 from os import path
 from create_event_with_syslog import  create_event
 from parser import OneviewSyslogParser as ovParser
+from snow_dispatcher import event_key, DEFAULT_WORKERS
+from snow_outbox import SnowOutbox, DEFAULT_PATH, DEFAULT_MAX_EVENTS, DEFAULT_RETRY_MIN, DEFAULT_RETRY_MAX
+from snow_coalescer import short_description_key, DEFAULT_WINDOW, DEFAULT_MAX_KEYS
 
 ###---------------------------------------------------------------
 # Read SNOW properties
 # 
 ###---------------------------------------------------------------
-def read_properties():
+def read_properties(properties_file='properties.json'):
     """
     Read from properties.json file
+    :param properties_file: path of the properties file
     :return: properties
     """
     print("Entered -- read_properties()")
 
-    value = str(path.exists('properties.json'))
-
-    if value is False:
-        print("File properties.json file does not exist in current directory. Please re-check and try it again. !!!!")
-        exit()
+    if not path.exists(properties_file):
+        raise Exception("File {} does not exist. Please re-check and try it again. !!!!".format(properties_file))
 
-    with open('properties.json') as data_file:
+    with open(properties_file) as data_file:
         prop = json.load(data_file)
 
     properties = []
@@ -59,7 +64,15 @@ def read_properties():
     properties.append(snow_args["username"])
     properties.append(snow_args["password"])
     properties.append(incident_prop["caller"])
-    properties.append(prop["syslog_file"])
+    properties.append(prop.get("syslog_file"))
+    properties.append(prop.get("dispatcher", {}))
+    properties.append(prop.get("cache", {}))
+    properties.append(prop.get("follower", {}))
+    properties.append(prop.get("syslog_source", "file"))
+    properties.append(prop.get("coalescer", {}))
+    properties.append(prop.get("batch", {}))
+    properties.append(prop.get("outbox", {}))
+    properties.append(prop.get("stats", {}))
     
     print("Leaving -- read_properties()")
 
@@ -81,6 +94,12 @@ def get_cmdb_ci(s_url, username, password, server):
     """
     print("Entered -- get_cmdb_ci()")
 
+    key = snow_cache.cache_key('cmdb_ci', server)
+    sys_id = snow_cache.get_cache().get(key)
+    if sys_id:
+        print("Leaving -- get_cmdb_ci() (cached)")
+        return sys_id
+
     # Set the request parameters
     api_url = 'cmdb_ci?sysparm_query=name=' + server
     url = s_url + '/' + api_url
@@ -89,20 +108,19 @@ def get_cmdb_ci(s_url, username, password, server):
     headers = {"Content-Type": "application/json", "Accept": "application/json"}
 
     # Do the HTTP request
-    response = requests.get(url, auth=(username, password), headers=headers)
+    response = snow_client.get(url, auth=(username, password), headers=headers)
 
     print("Leaving -- get_cmdb_ci()")
     
     # Check for HTTP codes other than 200
-    if response.status_code != 200:
-        print('Status:', response.status_code, 'Headers:', response.headers, 'Error Response:', response.json())
-        return 
+    snow_client.check_response(response, 200, "CMDB CI lookup")
 
     # Decode the JSON response into a dictionary and use the data
     data = response.json()
         
     if len(data['result']) > 0:
         sys_id = data['result'][0]['sys_id']
+        snow_cache.get_cache().set(key, sys_id)
         return sys_id
     else:
         return None
@@ -126,6 +144,12 @@ def get_caller_sys_id(properties):
     password = properties[2]
     caller = properties[3]
 
+    key = snow_cache.cache_key('sys_user', caller)
+    sys_id = snow_cache.get_cache().get(key)
+    if sys_id:
+        print("Leaving -- get_caller_sys_id() (cached)")
+        return sys_id
+
     # Set the request parameters
     api_url = 'sys_user?sysparm_query=user_name=' + caller
     url = s_url + '/' + api_url
@@ -134,23 +158,21 @@ def get_caller_sys_id(properties):
     headers = {"Content-Type": "application/json", "Accept": "application/json"}
 
     # Do the HTTP request
-    response = requests.get(url, auth=(username, password), headers=headers)
+    response = snow_client.get(url, auth=(username, password), headers=headers)
 
     print("Leaving -- get_caller_sys_id()")
     
     # Check for HTTP codes other than 200
-    if response.status_code != 200:
-        print('Status:', response.status_code, 'Headers:', response.headers, 'Error Response:', response.json())
-        exit()
+    snow_client.check_response(response, 200, "Caller lookup")
 
     # Decode the JSON response into a dictionary and use the data
     data = response.json()
     if len(data['result']) > 0:
         sys_id = data['result'][0]['sys_id']
+        snow_cache.get_cache().set(key, sys_id)
         return sys_id
     else:
-        print("SNOW User '%s' is not found in SNOW. Try with another user name !!!." % caller)
-        exit()
+        raise snow_client.SnowRequestError(404, "SNOW User '%s' is not found in SNOW. Try with another user name !!!." % caller)
 
 ###---------------------------------------------------------------
 # Check if incident already exists in SNOW
@@ -170,21 +192,26 @@ def check_incident(s_url, username, password, alert_id, tokenized_events):
     print("Entered -- check_incident()")
     
     # Set the request parameters
-    qShortDescription = tokenized_events["oneviewIp"] + " :-- " + tokenized_events["alertResource"] +  " :-- " +  tokenized_events["alertMessage"]
-    api_url = 'incident?sysparm_query=short_description=' + qShortDescription[:160]
+    qShortDescription = short_description_key(tokenized_events)
+    api_url = 'incident?sysparm_query=short_description=' + qShortDescription
     url = s_url + '/' + api_url
 
+    key = snow_cache.cache_key('incident', qShortDescription)
+    sys_id = snow_cache.get_cache().get(key)
+    if sys_id:
+        print("Leaving -- check_incident() (cached)")
+        print("Alert is already present in incident {}.".format(sys_id))
+        return sys_id
+
     # Set proper headers
     headers = {"Content-Type": "application/json", "Accept": "application/json"}
 
     # Do the HTTP request
-    response = requests.get(url, auth=(username, password), headers=headers)
+    response = snow_client.get(url, auth=(username, password), headers=headers)
 
     print("Leaving -- check_incident()")
     # Check for HTTP codes other than 200
-    if response.status_code != 200:
-        print('Status:', response.status_code, 'Headers:', response.headers, 'Error Response:', response.json())
-        return
+    snow_client.check_response(response, 200, "Incident lookup")
 
     # Decode the JSON response into a dictionary and use the data
     data = response.json()
@@ -193,6 +220,7 @@ def check_incident(s_url, username, password, alert_id, tokenized_events):
         print("Alert is already present in {} incident.".format(data['result'][0]['number']))
         print("Start updating {} incident  with remote support service details.".format(data['result'][0]['number']))
         sys_id = data['result'][0]['sys_id']
+        snow_cache.get_cache().set(key, sys_id)
         return sys_id
     else:
         print("Alert {} is not found in any incident intances.".format(alert_id))
@@ -270,17 +298,20 @@ def create_incident(p, tokenized_events, caller_id, alert_id):
     dataJson = json.dumps(data)
 
     # Do the HTTP request
-    response = requests.post(url, auth=(username, password), headers=headers, data=dataJson)
+    # Creates of the same incident pending in one batch are merged
+    response = snow_client.post(url, auth=(username, password), headers=headers, data=dataJson,
+                                merge_key=snow_cache.cache_key('incident', qShortDescription[:160]))
 
-    # Check for HTTP codes other than 200
-    if response.status_code != 201:
-        print('Status:', response.status_code, 'Headers:', response.headers, 'Error Response:', response.json())
-        return
+    # Check for HTTP codes other than 201
+    snow_client.check_response(response, 201, "Incident creation")
 
     # Decode the JSON response into a dictionary and use the data
     data = response.json()
     sys_id = data['result']['sys_id']
     print("New Incident {} created in SNOW instance.".format(data['result']['number']))
+
+    # Later events with the same short description update this incident
+    snow_cache.get_cache().set(snow_cache.cache_key('incident', qShortDescription[:160]), sys_id)
     
     print("Leaving -- create_incident()")
 
@@ -331,14 +362,12 @@ def update_incident(s_url, username, password, incident_sys_id, tokenized_events
     dataJson = json.dumps(data)
 
     # Do the HTTP request
-    response = requests.put(url, auth=(username, password), headers=headers, data=dataJson)
+    response = snow_client.put(url, auth=(username, password), headers=headers, data=dataJson)
 
     print("Leaving -- update_incident()")
     
     # Check for HTTP codes other than 200
-    if response.status_code != 200:
-        print('Status:', response.status_code, 'Headers:', response.headers, 'Error Response:', response.json())
-        return
+    snow_client.check_response(response, 200, "Incident update")
 
     # Decode the JSON response into a dictionary and use the data
     data = response.json()
@@ -370,15 +399,10 @@ def validate_snow_user(properties):
     headers = {"Content-Type": "application/json", "Accept": "application/json"}
     print("url - {}, username - {}, password - {}".format(s_url, username, password))
     # Do the HTTP request
-    response = requests.get(s_url, auth=(username, password), headers=headers)
+    response = snow_client.get(s_url, auth=(username, password), headers=headers)
 
     # Check for HTTP codes other than 200
-    if response.status_code != 200:
-        # print('Status:', response.status_code, 'Headers:', response.headers, 'Error Response:', response.json())
-        data = response.json()
-        print("Failed to login snow instance with error message '%s' with code %s " % (data['error']['message'],
-                                                                                       response.status_code))
-        exit()
+    snow_client.check_response(response, 200, "Login to SNOW instance")
         
     print("Leaving -- validate_snow_user()")
 
@@ -392,20 +416,30 @@ def validate_snow(p):
     """
     Validate SNOW instance with login credentials
     :param p: SNOW instance and its' login credentials
+    :return: caller sys_id, None if the SNOW instance is not available yet
+    :raises Exception: if the properties or the SNOW credentials are not valid
     """
     
     print("Entered -- validate_snow()")
 
-    # validate snow log-in user and password.
-    validate_snow_user(p)
     # check for syslog file in properties.json file
-    if p[4] is None:
-        print("No syslog file in properties.json file. Try it valid file !!!")
-        exit()
-
-    # Verify that SNOW user already exists and find its caller_id.
-    # If SNOW user(caller) does not exits, it exits the program
-    caller_id = get_caller_sys_id(p)
+    if p[8] == "file" and p[4] is None:
+        raise Exception("No syslog file in properties.json file. Try it valid file !!!")
+
+    try:
+        # validate snow log-in user and password.
+        validate_snow_user(p)
+
+        # Verify that SNOW user already exists and find its caller_id.
+        # If SNOW user(caller) does not exits, the error is raised
+        caller_id = get_caller_sys_id(p)
+    except snow_client.SnowRequestError as e:
+        if not e.retryable:
+            raise
+        # SNOW instance not available, the events wait in the outbox and
+        # the caller is looked up again by the first SNOW operation
+        print("SNOW instance not available, starting anyway. {}".format(e))
+        caller_id = None
     
     print("Leaving -- validate_snow()")
     
@@ -437,7 +471,7 @@ def get_description(p, alert_id):
     headers = {"Content-Type": "application/json", "Accept": "application/json"}
 
     # Do the HTTP request
-    response = requests.get(url, auth=(username, password), headers=headers)
+    response = snow_client.get(url, auth=(username, password), headers=headers)
 
     # Check for HTTP codes other than 200
     if response.status_code != 200:
@@ -487,7 +521,7 @@ def snow_operations(tokenized_message, caller_id, p):
                     #if des:
                        #message = str(des) + "\n\n" + "Message from Child:" + "\n" + tokenized_message['alertMessage']
                        #tokenized_message['alertMessage'] = message
-                    create_incident(tokenized_message, caller_id, str(x))
+                    create_incident(p, tokenized_message, caller_id, str(x))
 
             # if there is no childEvents, create new incident with case id details
             else:
@@ -513,6 +547,57 @@ def snow_operations(tokenized_message, caller_id, p):
     print("Leaving -- snow_operations()")
 
 
+###---------------------------------------------------------------
+# Start / stop the SNOW operations
+# 
+###---------------------------------------------------------------
+def start_forwarder(p):
+    """
+    Set up the SNOW session and lookup cache and start the dispatcher
+    :param p: SNOW instance and its credentials
+    :return: outbox to submit the tokenized events to
+    :raises Exception: if the SNOW properties or credentials are not valid
+    """
+    # Pooled keep-alive session shared by all SNOW operations
+    snow_client.configure(p[5])
+
+    # Inserts and updates sent in chunks through the Batch API
+    snow_client.configure_batch(p[10], p[0])
+
+    # Cache of the CMDB CI, caller, incident and event lookups
+    snow_cache.configure(p[6])
+
+    # Periodic summary of the SNOW request latencies and counters
+    snow_stats.start_reporting(p[12].get('interval', snow_stats.DEFAULT_INTERVAL))
+
+    # validate SNOW user "caller"
+    caller_id = validate_snow(p)
+
+    # SNOW operations run on a worker pool, in order per resource. The events
+    # are kept on disk until done and retried while SNOW is not available.
+    # Repeated events of a flapping alert are collapsed to the latest one
+    # once stored.
+    return SnowOutbox(lambda event: snow_operations(event, caller_id or get_caller_sys_id(p), p),
+                      path=p[11].get('path', DEFAULT_PATH),
+                      workers=p[5].get('workers', DEFAULT_WORKERS),
+                      max_events=p[11].get('max_events', DEFAULT_MAX_EVENTS),
+                      retry_min=p[11].get('retry_min', DEFAULT_RETRY_MIN),
+                      retry_max=p[11].get('retry_max', DEFAULT_RETRY_MAX),
+                      window=p[9].get('window', DEFAULT_WINDOW),
+                      max_keys=p[9].get('max_keys', DEFAULT_MAX_KEYS))
+
+
+def stop_forwarder(dispatcher):
+    """
+    Finish the SNOW operations already queued and save the lookup cache
+    :param dispatcher: dispatcher returned by start_forwarder()
+    """
+    dispatcher.stop()
+    snow_client.stop_batch()
+    snow_cache.get_cache().save()
+    snow_stats.print_summary()
+
+
 ###---------------------------------------------------------------
 # Main module. Execution starts from here. 
 # 
@@ -520,22 +605,43 @@ def snow_operations(tokenized_message, caller_id, p):
 if __name__ == '__main__':
 
     # Read snow credentials from properties.json file
-    p = read_properties()
-    
-    print("Snow properties - {}".format(p))
-    # validate SNOW user "caller"
-    caller_id = validate_snow(p)
+    try:
+        p = read_properties()
+
+        print("Snow properties - {}".format(p))
+        dispatcher = start_forwarder(p)
+    except Exception as e:
+        print(e)
+        sys.exit(1)
     
     # Parsing syslog file using parser module
     sys_log = p[4]
     parserClient = ovParser(sys_log)
+    snow_stats.watch("parser lines", lambda: parserClient.lines)
+
+    # Stats dump on SIGUSR1
+    snow_stats.install_signal()
     eventCounter = 0
     print("Starting to wait for tokenised messages..!")
-    for eventMsg in parserClient.follow():
-        eventCounter +=1
-        #print("KVR-TEST: received message from pytail. Delete this msg later. Event Count - {}".format(eventCounter))
-        alertDictionary = parserClient.tokenize_event_message(eventMsg)
-        if alertDictionary:
-            print("Tokenised message :")
-            print(json.dumps(alertDictionary, indent=4, sort_keys=True))
-            snow_operations(alertDictionary, caller_id, p)
+    # Syslog file, or the socket the extractor's sinks send the records to
+    if p[8] == "file":
+        events = parserClient.follow(**p[7])
+    else:
+        events = parserClient.listen(p[8])
+
+    try:
+        for eventMsg in events:
+            eventCounter +=1
+            #print("KVR-TEST: received message from pytail. Delete this msg later. Event Count - {}".format(eventCounter))
+            # A bad record must not stop the forwarder
+            try:
+                alertDictionary = parserClient.tokenize_event_message(eventMsg)
+                if alertDictionary:
+                    print("Tokenised message :")
+                    print(json.dumps(alertDictionary, indent=4, sort_keys=True))
+                    dispatcher.submit(event_key(alertDictionary), alertDictionary)
+            except Exception as e:
+                print("Failed to process the message {} - {}".format(eventCounter, e))
+    finally:
+        # Finish the SNOW operations already queued
+        stop_forwarder(dispatcher)
@@ -1,130 +1,230 @@
+import re
 import sys
-import tailer
 import json
 from time import sleep
 
+from syslog_follower import SyslogFollower
+from syslog_socket import SyslogSocketSource
+
 class OneviewSyslogParser(object):
     SEVERITY_MAP = {'2':'CRITICAL', '3':'ERROR', '4':'WARNING', '5':'UNKNOWN', '6':'OK', '7':'DEBUG'}
 
+    # RFC 5424 records of the extractor (syslog_format "rfc5424"):
+    #   <PRI>1 timestamp host oneview - Type [oneview@11 resource="..." name="value" ...] message
+    RFC5424_RE = re.compile(
+        r'<(\d{1,3})>1 (\S+) (\S+) \S+ \S+ (\S+) \[oneview@11((?:[^\]"]|"(?:[^"\\]|\\.)*")*)\](?: (.*))?$', re.S)
+    SD_PARAM_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+    SD_ESCAPE_RE = re.compile(r'\\(.)')
+
+    # Alert info of an alert message, matched right after its opening bracket:
+    #   id|healthCategory|alertState|assignedToUser|serviceEventInfo|[childEvents]] [
+    # serviceEventInfo is either None or {caseId|primaryContact|remoteSupportState}.
+    # The numeric id makes the match fail on the first character of a stats message.
+    ALERT_INFO_RE = re.compile(
+        r'(\d+)\|([^|\]]*)\|([^|\]]*)\|[^|\]]*\|(None|\{[^}]*\})(?:\|\[([^\]]*)\])?\]\s*\[')
+
     def __init__(self, fileName):
         self.fileName = fileName
+        # Lines tokenized so far, reported by snow_stats
+        self.lines = 0
 
     def tokenize_event_message(self, event):
-        eventTokens = {}
-        #print("Event to tokenize :- {}".format(event))
-        #print("Karthik calling tokenize")
         '''
         Sample event message: (for critical alert)
-        event - <2> 2019-09-12T05:54:40.133Z cs-oneview1.cbcng.local ovgd server-profiles [cs-esx1] [deecb4d5-bb21-4729-b6c4-5d6773317a0e|Connection|Locked|None|None] [An error has occurred on connection 19.  Interconnect {"name":"ConvergedSystem-Encl1, interconnect 1","uri":"/rest/interconnects/5e90904c-5159-4c3a-a381-d690148ca094"} port 1 subport a is unlinked.If the server {"name":"ConvergedSystem-Encl1, bay 1","uri":"/rest/server-hardware/31353337-3135-5A43-3333-343353373950"} is power cycling or powered off, connectivity alerts may occur as the network adapter is either disconnected or negotiates connectivity with the interconnect. These alerts can be ignored and should clear automatically. If this server is booted up and running an operating system, this alert indicates a loss of connectivity between the network adapter and the interconnect. Verify the configuration of the operating system, health and link status of the downlink ports on which the connection depends. If the problem persists, please contact your authorized support representative and provide them with a support dump.]
+        event - <2> 2020-06-23T04:07:25.039Z 10.188.0.180 oneview interconnects [] [15911|ConnectionInstance|Active|None|None|[]] [Connection on downlink port 3, subport a has failed. The subport is unlinked.If the server {"name":"MXQ71906VL, bay 3","uri":"/rest/server-hardware/39313738-3034-5535-4E38-313036313853"} is power cycling or powered off, connectivity alerts may occur ...]
         '''
         '''
         Sample event message: (for power stats)
         event - <6> 2019-07-31T10:45:00Z 10.188.239.35 oneview ServerStats [0000A66101, bay 6] [AmbientTemperature=29 dec C|AveragePower=136 watts|CpuAverageFreq=2801 Hz|CpuUtilization=23 %|PeakPower=142 watts|PowerCap=None]
         '''
+        self.lines += 1
+
+        # JSON-lines records of the extractor (syslog_format "jsonl")
+        if event.startswith('{'):
+            return self.tokenize_json_message(event)
+
+        # RFC 5424 records of the extractor (syslog_format "rfc5424")
+        rfc5424 = self.RFC5424_RE.match(event)
+        if rfc5424:
+            return self.tokenize_rfc5424_message(rfc5424)
+
+        # Single pass over the line: header up to the first bracket, then the
+        # resource, the optional alert info and the message. The message runs
+        # up to the last closing bracket, so brackets inside the description
+        # (e.g. the embedded {"name":...} fragments) are kept.
+        resourceStart = event.find('[')
+        if resourceStart < 0:
+            #print("Improper message received. ")
+            return None
+        resourceEnd = event.find(']', resourceStart)
+        messageStart = event.find('[', resourceEnd)
+        if resourceEnd < 0 or messageStart < 0:
+            return None
+
+        #--------------------------- Header processing..
+        header = event[:resourceStart].split()
+        if len(header) < 5 or header[0][1:-1] not in self.SEVERITY_MAP:
+            print("Unknown syslog format, message skipped - {}".format(event[:80]))
+            return None
+
+        alertCategory = header[4]
+        alertResource = event[resourceStart + 1:resourceEnd].strip()
+        if alertCategory == 'server-hardware':
+            serialNumber = alertResource.split(';')[-1]
+            alertResource = alertResource.split(';')[0]
+        else:
+            serialNumber = "NA"
+
+        eventTokens = {
+            'severity': self.SEVERITY_MAP[header[0][1:-1]], # Mapping severity to verbose.
+            'eventTimeStamp': header[1],
+            'oneviewIp': header[2],
+            'alertCategory': alertCategory,
+            'alertResource': alertResource,
+            'serialNumber': serialNumber,
+            # Init to blanks before actual init
+            'alertId': "", 'alertStatus': "", 'caseId': "",
+            'caseStatus': "", 'caseContactDetails': ""
+        }
+
+        #--------------------------- Alert info processing..
+        alertInfo = self.ALERT_INFO_RE.match(event, messageStart + 1)
+        if alertInfo:
+            messageStart = alertInfo.end() - 1
+            alertId, alertType, alertStatus, service, children = alertInfo.groups()
+            eventTokens["alertId"] = alertId
+            eventTokens["alertType"] = alertType
+            eventTokens["alertStatus"] = alertStatus
 
-        allTokens = event.split('[')
+            if service != "None":
+                caseDetails = service[1:-1].split('|')
+                eventTokens["caseId"] = caseDetails[0]
+                if len(caseDetails) > 2:
+                    eventTokens["caseContactDetails"] = caseDetails[1]
+                    eventTokens["caseStatus"] = caseDetails[2]
+
+            # If child alerts are present, it will be comma separated strings.
+            if children and children.strip():
+                eventTokens["childEvents"] = [int(element) for element in children.split(',')]
+            else:
+                eventTokens["childEvents"] = []
+
+        #--------------------------- Message processing..
+        alertMessage = event[messageStart + 1:].rstrip()
+        if alertMessage.endswith(']'):
+            alertMessage = alertMessage[:-1] # Remove the closing big bracket
+        eventTokens['alertMessage'] = alertMessage
+
+        if not alertInfo:
+            if '[' not in alertMessage:
+                eventTokens['alertType'] = "Stats"
+            else:
+                print("**********************************.Non compliant message received.. Please reconfirm.**********************************")
+                eventTokens['alertMessage'] = "Non compliant message.\n]n" + event
+
+        #print("eventTokens {}".format(json.dumps(eventTokens, indent=2)))
+        return eventTokens
+
+    # Record fields which are not stats values
+    JSON_COMMON_FIELDS = ('type', 'severity', 'timestamp', 'host', 'resource', 'message')
+
+    def tokenize_json_message(self, event):
         '''
-        print("\nTokens:")
-        for token in allTokens:
-            print(token)
-        print('\n\n')
+        Sample event message: (for critical alert, syslog_format "jsonl")
+        event - {"type":"Alert","severity":2,"timestamp":"2020-06-23T04:07:25.039Z","host":"10.188.0.180","resource":"","category":"interconnects","alertId":"15911","healthCategory":"ConnectionInstance","alertState":"Active","assignedToUser":null,"childAlerts":[],"message":"Connection on downlink port 3, subport a has failed."}
         '''
-        if len(allTokens) < 3:
-            #print("Improper message received. ")
+        try:
+            record = json.loads(event)
+        except ValueError:
             return None
+        return self.tokenize_record(record)
+
+    def tokenize_rfc5424_message(self, match):
+        '''
+        Sample event message: (for critical alert, syslog_format "rfc5424")
+        event - <130>1 2020-06-23T04:07:25.039Z 10.188.0.180 oneview - Alert [oneview@11 resource="" category="interconnects" alertId="15911" healthCategory="ConnectionInstance" alertState="Active" assignedToUser="None"] Connection on downlink port 3, subport a has failed.
+        '''
+        priority, timestamp, host, recordType, structuredData, message = match.groups()
+        record = {'type': recordType, 'severity': int(priority) % 8,
+                  'timestamp': timestamp, 'host': host}
+        for name, value in self.SD_PARAM_RE.findall(structuredData):
+            record[name] = self.SD_ESCAPE_RE.sub(r'\1', value)
+        record['message'] = (message or "").rstrip()
+        if 'childAlerts' in record:
+            record['childAlerts'] = [int(element) for element in record['childAlerts'].split(',') if element]
+        return self.tokenize_record(record)
 
-        #print("len(allTokens) - {}".format(len(allTokens)))
-        #--------------------------- First token processing..
-
-        token1 = allTokens[0].strip()
-        token1SubSplit = token1.split(' ')
-        
-        eventTokens['severity'] = token1SubSplit[0]
-        eventTokens['eventTimeStamp'] = token1SubSplit[1]
-        eventTokens['oneviewIp'] = token1SubSplit[2]
-        eventTokens['alertCategory'] = token1SubSplit[4]
-    
-        idx = eventTokens['severity'][1]
-        eventTokens['severity'] = self.SEVERITY_MAP[idx] # Mapping severity to verbose.
-        #---------------------------
-    
-        #--------------------------- Second token processing..
-        temp = allTokens[1].strip()
-        eventTokens['alertResource'] = temp[0:len(temp)-1] # Remove the closing big bracket
-        if eventTokens['alertCategory'] == 'server-hardware':
-            eventTokens['serialNumber'] = eventTokens['alertResource'].split(';')[-1]
-            eventTokens['alertResource'] = eventTokens['alertResource'].split(';')[0]
+    def tokenize_record(self, record):
+        '''
+        Tokenize a structured record of the jsonl or rfc5424 format.
+        :param record: dict of the record fields
+        :return: tokenized event, None if the record is not an event
+        '''
+        try:
+            recordType = record['type']
+            severity = self.SEVERITY_MAP[str(record['severity'])]
+        except (KeyError, TypeError):
+            print("Unknown syslog record, message skipped - {}".format(record))
+            return None
+
+        alertCategory = record.get('category', recordType)
+        alertResource = record.get('resource') or ""
+        if alertCategory == 'server-hardware':
+            serialNumber = alertResource.split(';')[-1]
+            alertResource = alertResource.split(';')[0]
         else:
-            eventTokens['serialNumber'] = "NA"
-    
-        # Init to blanks before actual init
-        eventTokens["alertId"] = eventTokens["alertStatus"] = eventTokens["caseId"] = ""
-        eventTokens["caseStatus"] = eventTokens["caseContactDetails"] = ""
-
-        if len(allTokens) == 3:
-            temp = allTokens[2].strip()
-            eventTokens['alertMessage'] = temp[0:len(temp)-1]
-            eventTokens['alertType'] = "Stats"
-        
-        elif len(allTokens) == 5:
-            #----- Processing alert message. Token #4.
-            temp = allTokens[4].strip()
-            eventTokens['alertMessage'] = temp[0:len(temp)-1]
-            
-            '''
-            Split the eventId and contact details. 
-                allTokens[2] = 1269|Storage|Active|None|None]
-                allTokens[2] = 1186|Storage|Active|None|{111231231|test@hpe.com|Open}
-            '''
-            temp = allTokens[2].strip(' ')
-            #temp = allTokens[2].strip('{')
-            #temp = allTokens[2].strip('}')
-            #contactDetails = temp[0:len(temp)-1] # Remove the pipe symbol at the end
-            contactSubSplit = temp.split('|')
-            #print("contactSubSplit - {}".format(contactSubSplit))
-                
-            eventTokens["alertId"] = contactSubSplit[0]
-            eventTokens["alertType"] = contactSubSplit[1]
-            eventTokens["alertStatus"] = contactSubSplit[2]
-        
-            if contactSubSplit[4] != "None":
-                eventTokens["caseId"] = contactSubSplit[4][1:]
-                eventTokens["caseContactDetails"] = contactSubSplit[5]
-                eventTokens["caseStatus"] = contactSubSplit[6][:-1]
-            
-            # Child events
-            childEventArray = []
-            
-            temp = allTokens[3].strip()
-            #print("type(temp) - {}, len(temp) - {}, temp - {}".format(type(temp), len(temp), temp))
-            if len(temp) > 2: # Just a new line char or string ']]' present
-                temp = temp[0:len(temp)-2]
-                #print("temp - {}".format(temp))
-                childEventsSubSplit = temp.split(',')
-
-                # If child alerts are present, it will be comma separated strings.
-                if len(childEventsSubSplit) > 0:
-                    for element in childEventsSubSplit:
-                        element = element.strip()
-                        #print("type(element) - {}. element - {}".format(type(element), element))
-                        childId = int(element)
-                        #print(childId)
-                        childEventArray.append(childId)
-
-            eventTokens["childEvents"] = childEventArray
-        
-            #print("eventTokens {}".format(eventTokens))
+            serialNumber = "NA"
+
+        eventTokens = {
+            'severity': severity,
+            'eventTimeStamp': record.get('timestamp'),
+            'oneviewIp': record.get('host'),
+            'alertCategory': alertCategory,
+            'alertResource': alertResource,
+            'serialNumber': serialNumber,
+            'alertId': "", 'alertStatus': "", 'caseId': "",
+            'caseStatus': "", 'caseContactDetails': ""
+        }
+
+        if recordType == 'Alert':
+            eventTokens["alertId"] = str(record.get('alertId', ""))
+            eventTokens["alertType"] = record.get('healthCategory')
+            eventTokens["alertStatus"] = record.get('alertState')
+            if record.get('caseId'):
+                eventTokens["caseId"] = record['caseId']
+                eventTokens["caseContactDetails"] = record.get('primaryContact', "")
+                eventTokens["caseStatus"] = str(record.get('remoteSupportState', ""))
+            eventTokens["childEvents"] = record.get('childAlerts') or []
+            eventTokens['alertMessage'] = record.get('message', "")
         else:
-            print("**********************************.Non compliant message received.. Please reconfirm.**********************************")
-            alertMessage = "**********************************.Non compliant message received.. Please reconfirm.**********************************"
-        
-        
-            eventTokens['alertMessage'] = "Non compliant message.\n]n" + event
-            #print("\n\nalertMessage - {}\n\n".format(alertMessage))
-    
-        #print("eventTokens {}".format(json.dumps(eventTokens, indent=2)))
+            # Stats values, in the name=value|... form of the bracket messages
+            eventTokens['alertType'] = "Stats"
+            eventTokens['alertMessage'] = "|".join("{}={}".format(name, value) for name, value in record.items()
+                                                   if name not in self.JSON_COMMON_FIELDS)
+
         return eventTokens
 
+    def tokenize_event_messages(self, events):
+        """
+        Tokenize a batch of syslog lines.
+        :param events: list of syslog lines
+        :return: list of tokenized events, lines which are not events are left out
+        """
+        tokenize = self.tokenize_event_message
+        return [eventTokens for eventTokens in map(tokenize, events) if eventTokens]
+
+
+    def follow(self, **follower_args):
+        """
+        Follow the syslog file, see SyslogFollower for the arguments.
+        :return: generator of the lines appended to the syslog file
+        """
+        return SyslogFollower(self.fileName, **follower_args).follow()
 
-    def follow(self):
-        return tailer.follow(open(self.fileName))
+    def listen(self, address):
+        """
+        Receive the records sent by the extractor's socket sinks
+        :param address: unix:///path, tcp://host:port or udp://host:port
+        :return: generator of the received records
+        """
+        return SyslogSocketSource(address).records()
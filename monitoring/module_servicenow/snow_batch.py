@@ -0,0 +1,232 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+
+import base64
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import snow_stats
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+BATCH_API = '/api/now/v1/batch'
+
+DEFAULT_CHUNK_SIZE = 50
+DEFAULT_FLUSH_INTERVAL = 0.1
+DEFAULT_SENDERS = 4
+
+
+class BatchResponse(object):
+    """
+    Result of one request of a batch. Has the attributes of a
+    requests.Response used by the SNOW operations.
+    """
+
+    def __init__(self, status_code, body, headers=None, status_text=""):
+        self.status_code = status_code
+        self.content = body
+        self.headers = headers or {}
+        self.reason = status_text
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8')) if self.content else {}
+
+
+class SnowBatchWriter(object):
+    """
+    Sends the SNOW inserts and updates through the Batch API.
+
+    Requests submitted by the SNOW operations are gathered for up to
+    'flush_interval' seconds or 'chunk_size' requests and sent in one
+    POST to /api/now/v1/batch. Each submitter waits for the result of
+    its own request, which is mapped back by the request id. Up to
+    'senders' batches are in flight at a time.
+
+    A create submitted while a create with the same merge key is still
+    pending is merged into it, so the record is created once with the
+    latest fields and both submitters get its result.
+    """
+
+    def __init__(self, client, instance_url, chunk_size=DEFAULT_CHUNK_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, senders=DEFAULT_SENDERS):
+        """
+        :param client: SnowClient used to send the batches
+        :param instance_url: table API url of the instance, e.g. https://x.service-now.com/api/now/table
+        :param chunk_size: max requests per batch
+        :param flush_interval: max seconds a request waits for the batch to fill
+        :param senders: max batches in flight
+        """
+        parts = urlsplit(instance_url)
+        self.base_url = "{}://{}".format(parts.scheme, parts.netloc)
+        self.batch_url = self.base_url + BATCH_API
+        self.client = client
+        self.chunk_size = max(1, int(chunk_size))
+        self.flush_interval = float(flush_interval)
+
+        self.ids = itertools.count(1)
+        self.pending = []       # [request, future, auth]
+        self.merge_keys = {}    # merge key -> pending entry
+        self.condition = threading.Condition()
+        self.running = True
+
+        self.batches = 0
+        self.requests = 0
+        self.merged = 0
+
+        self.senders = ThreadPoolExecutor(max_workers=max(1, int(senders)))
+
+        self.thread = threading.Thread(target=self._run, name="snow-batch")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def request(self, method, url, auth=None, headers=None, data=None, merge_key=None, **kwargs):
+        """
+        Queue a request and wait for its result
+        :param method: POST or PUT
+        :param url: full table API url of the record
+        :param auth: (username, password)
+        :param headers: request headers
+        :param data: JSON body
+        :param merge_key: key of a create which may be merged with a pending one
+        :return: BatchResponse
+        """
+        with self.condition:
+            entry = self.merge_keys.get(merge_key) if merge_key else None
+            if entry:
+                # Latest fields win
+                body = json.loads(entry[3])
+                body.update(json.loads(data))
+                entry[3] = json.dumps(body)
+                self.merged += 1
+            else:
+                path = url[len(self.base_url):] if url.startswith(self.base_url) else url
+                entry = [{'id': str(next(self.ids)), 'url': path, 'method': method,
+                          'headers': [{'name': name, 'value': value} for name, value in (headers or {}).items()]},
+                         Future(), auth, data or ""]
+                self.pending.append(entry)
+                if merge_key:
+                    self.merge_keys[merge_key] = entry
+                self.condition.notify()
+
+        return entry[1].result()
+
+    def _take_chunk(self):
+        chunk = self.pending[:self.chunk_size]
+        del self.pending[:self.chunk_size]
+        sent = set(id(entry) for entry in chunk)
+        for key in [key for key, entry in self.merge_keys.items() if id(entry) in sent]:
+            del self.merge_keys[key]
+        return chunk
+
+    def _send(self, chunk):
+        # One batch per credentials, they are sent with the batch request
+        auth = chunk[0][2]
+        rest_requests = []
+        for request, _, _, data in chunk:
+            request['body'] = base64.b64encode(data.encode('utf-8')).decode('ascii')
+            rest_requests.append(request)
+
+        batch = {'batch_request_id': str(next(self.ids)), 'rest_requests': rest_requests}
+        futures = dict((request['id'], future) for request, future, _, _ in chunk)
+        try:
+            start = time.perf_counter()
+            response = self.client.post(self.batch_url, auth=auth, data=json.dumps(batch),
+                                        headers={"Content-Type": "application/json", "Accept": "application/json"})
+            snow_stats.observe("snow POST batch", time.perf_counter() - start)
+            if response.status_code != 200:
+                # Each request of the batch gets the failed response
+                for future in futures.values():
+                    future.set_result(BatchResponse(response.status_code, response.content, response.headers))
+                futures = {}
+            else:
+                for served in response.json().get('serviced_requests', []):
+                    future = futures.pop(served['id'], None)
+                    if future:
+                        body = base64.b64decode(served.get('body') or "")
+                        headers = dict((header['name'], header['value']) for header in served.get('headers', []))
+                        future.set_result(BatchResponse(served['status_code'], body, headers,
+                                                        served.get('status_text', "")))
+
+            # Not serviced (e.g. the batch hit the instance's time limit), to be sent again
+            for request_id, future in futures.items():
+                error = {'error': {'message': "Request {} of the batch was not serviced".format(request_id)}}
+                future.set_result(BatchResponse(503, json.dumps(error).encode('utf-8')))
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+
+        with self.condition:
+            self.batches += 1
+            self.requests += len(chunk)
+
+    def stats(self):
+        """
+        :return: counters of the batch writer
+        """
+        return "batches = {}, requests = {}, merged = {}, avg batch = {:.1f}".format(
+            self.batches, self.requests, self.merged, float(self.requests) / max(1, self.batches))
+
+    def stop(self):
+        """
+        Send the pending requests and stop
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+        self.senders.shutdown()
+        print("SNOW batch writer stopped. {}".format(self.stats()))
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.pending:
+                    break
+
+                # Give the batch a chance to fill
+                deadline = time.time() + self.flush_interval
+                while self.running and len(self.pending) < self.chunk_size and time.time() < deadline:
+                    self.condition.wait(deadline - time.time())
+
+                # Requests of other credentials wait for the next batch
+                auth = self.pending[0][2]
+                same = [entry for entry in self.pending if entry[2] == auth]
+                others = [entry for entry in self.pending if entry[2] != auth]
+                self.pending = same
+                chunk = self._take_chunk()
+                self.pending = self.pending + others
+
+            self.senders.submit(self._send, chunk)
@@ -0,0 +1,169 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_SIZE = 10000
+DEFAULT_TTL = 300
+
+# Cache shared by all the SNOW lookups of this process
+_cache = None
+
+
+class TTLCache(object):
+    """
+    In-process cache of SNOW lookups with TTL expiry and LRU eviction.
+    Optionally persisted to a JSON file across restarts.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL, persist_file=None):
+        """
+        :param max_size: max number of entries before the least recently used is evicted
+        :param ttl: seconds an entry stays valid
+        :param persist_file: JSON file used by load() and save()
+        """
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.persist_file = persist_file
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        :param key: cache key
+        :return: cached value, None if missing or expired
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] < time.time():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.time() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def load(self):
+        """
+        Load the entries, which are not yet expired, from the persist file
+        """
+        if not self.persist_file or not os.path.exists(self.persist_file):
+            return
+
+        try:
+            with open(self.persist_file) as data_file:
+                data = json.load(data_file)
+        except Exception as e:
+            print("Unable to load SNOW cache from {} : {}".format(self.persist_file, e))
+            return
+
+        now = time.time()
+        with self.lock:
+            for key, value, expires in data:
+                if expires > now:
+                    self.entries[key] = (value, expires)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        print("Loaded {} SNOW cache entries from {}".format(len(self.entries), self.persist_file))
+
+    def save(self):
+        """
+        Write the entries to the persist file
+        """
+        if not self.persist_file:
+            return
+
+        with self.lock:
+            data = [[key, value, expires] for key, (value, expires) in self.entries.items()]
+
+        temp_file = self.persist_file + '.tmp'
+        with open(temp_file, 'w') as data_file:
+            json.dump(data, data_file)
+        os.rename(temp_file, self.persist_file)
+        print("SNOW cache: {} entries saved, {} hits, {} misses".format(len(data), self.hits, self.misses))
+
+
+###---------------------------------------------------------------
+# Cache key of a lookup
+# 
+###---------------------------------------------------------------
+def cache_key(table, value):
+    """
+    :param table: looked up table, e.g. cmdb_ci, sys_user, incident, em_event
+    :param value: looked up value, e.g. server name, short description, alert id
+    :return: key
+    """
+    return "{}:{}".format(table, value)
+
+
+###---------------------------------------------------------------
+# Configure the shared cache
+# 
+###---------------------------------------------------------------
+def configure(settings):
+    """
+    Create the shared cache from the 'cache' properties and load its persisted entries
+    :param settings: dictionary with max_size, ttl and persist_file
+    :return: TTLCache
+    """
+    global _cache
+
+    _cache = TTLCache(max_size=settings.get('max_size', DEFAULT_MAX_SIZE),
+                      ttl=settings.get('ttl', DEFAULT_TTL),
+                      persist_file=settings.get('persist_file'))
+    _cache.load()
+    return _cache
+
+
+def get_cache():
+    """
+    Shared cache. Created with the defaults if not configured.
+    :return: TTLCache
+    """
+    global _cache
+
+    if _cache is None:
+        _cache = TTLCache()
+    return _cache
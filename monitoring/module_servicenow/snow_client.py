@@ -0,0 +1,267 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+import time
+import requests
+import snow_stats
+from snow_batch import SnowBatchWriter, DEFAULT_CHUNK_SIZE, DEFAULT_FLUSH_INTERVAL, DEFAULT_SENDERS
+from requests.adapters import HTTPAdapter
+try:
+    from requests.packages.urllib3.util.retry import Retry
+except ImportError:
+    from urllib3.util.retry import Retry
+
+# HTTP codes retried with backoff by the session. Only the lookups and
+# updates are sent again right away: a POST which got a 5xx or no
+# response may still have created the record, so it is not repeated
+# blindly (a POST which could not connect is still retried).
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+RETRY_METHODS = ('GET', 'PUT')
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_TIMEOUT = 30
+
+# HTTP codes of failed requests worth sending again later. A failed
+# create is retried by the outbox through the whole SNOW operation,
+# which first looks the record up again (lookups that find nothing are
+# never cached), so the record is only created if the lookup finds none.
+# A record created by the failed POST but not yet visible to the lookup
+# can still end up duplicated.
+RETRYABLE_STATUS_CODES = (408, 429)
+
+# Client shared by all the SNOW operations of this process
+_client = None
+
+# Batch API writer of the inserts and updates, when enabled
+_batch = None
+
+
+###---------------------------------------------------------------
+# Retry policy for the SNOW session
+# 
+###---------------------------------------------------------------
+def _retry_policy(max_retries, backoff_factor):
+    """
+    Build the urllib3 retry policy, whichever urllib3 version is installed
+    :param max_retries: number of retries of a request
+    :param backoff_factor: backoff factor between retries
+    :return: Retry
+    """
+    params = dict(total=max_retries, connect=max_retries, read=max_retries,
+                  status=max_retries, backoff_factor=backoff_factor,
+                  status_forcelist=RETRY_STATUS_CODES)
+    try:
+        return Retry(allowed_methods=frozenset(RETRY_METHODS), raise_on_status=False, **params)
+    except TypeError:
+        # urllib3 < 1.26
+        return Retry(method_whitelist=frozenset(RETRY_METHODS), **params)
+
+
+class SnowRequestError(Exception):
+    """
+    SNOW request which did not get the expected response.
+    Raised instead of leaving the SNOW operation half done.
+    """
+
+    def __init__(self, status_code, message):
+        """
+        :param status_code: HTTP code of the response, None if the SNOW instance could not be reached
+        :param message: description of the failure
+        """
+        super(SnowRequestError, self).__init__(message)
+        self.status_code = status_code
+
+    @property
+    def retryable(self):
+        """
+        True if the request may succeed later, e.g. during an outage or maintenance of the instance
+        """
+        return self.status_code is None or self.status_code in RETRYABLE_STATUS_CODES or self.status_code >= 500
+
+
+###---------------------------------------------------------------
+# Check the response of a SNOW request
+# 
+###---------------------------------------------------------------
+def check_response(response, expected, operation):
+    """
+    Raise SnowRequestError unless the response has the expected HTTP code
+    :param response: response of the SNOW request
+    :param expected: expected HTTP code
+    :param operation: name of the SNOW operation, for the error message
+    """
+    if response.status_code == expected:
+        return
+
+    try:
+        detail = response.json()['error']['message']
+    except Exception:
+        detail = response.content[:200]
+    raise SnowRequestError(response.status_code, "{} failed with status {}: {}".format(
+        operation, response.status_code, detail))
+
+
+class SnowClient(object):
+    """
+    HTTP client for the SNOW table API.
+    Keeps a pool of keep-alive connections to the SNOW instance and
+    retries throttled or unavailable responses with backoff.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=_retry_policy(max_retries, backoff_factor))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.post(url, **kwargs)
+
+    def put(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.put(url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+###---------------------------------------------------------------
+# Configure the shared SNOW client
+# 
+###---------------------------------------------------------------
+def configure(settings):
+    """
+    Create the shared SNOW client from the 'dispatcher' properties
+    :param settings: dictionary with pool_size, max_retries, backoff_factor and timeout
+    :return: SnowClient
+    """
+    global _client
+
+    if _client:
+        _client.close()
+
+    _client = SnowClient(pool_size=settings.get('pool_size', DEFAULT_POOL_SIZE),
+                         max_retries=settings.get('max_retries', DEFAULT_MAX_RETRIES),
+                         backoff_factor=settings.get('backoff_factor', DEFAULT_BACKOFF_FACTOR),
+                         timeout=settings.get('timeout', DEFAULT_TIMEOUT))
+    return _client
+
+
+def get_client():
+    """
+    Shared SNOW client. Created with the defaults if not configured.
+    :return: SnowClient
+    """
+    global _client
+
+    if _client is None:
+        _client = SnowClient()
+    return _client
+
+
+###---------------------------------------------------------------
+# Configure the Batch API writer
+# 
+###---------------------------------------------------------------
+def configure_batch(settings, instance_url):
+    """
+    Send the inserts and updates through the Batch API if enabled in the 'batch' properties
+    :param settings: dictionary with enabled, chunk_size, flush_interval and senders
+    :param instance_url: table API url of the SNOW instance
+    :return: SnowBatchWriter, or None if not enabled
+    """
+    global _batch
+
+    stop_batch()
+    if settings.get('enabled'):
+        _batch = SnowBatchWriter(get_client(), instance_url,
+                                 chunk_size=settings.get('chunk_size', DEFAULT_CHUNK_SIZE),
+                                 flush_interval=settings.get('flush_interval', DEFAULT_FLUSH_INTERVAL),
+                                 senders=settings.get('senders', DEFAULT_SENDERS))
+    return _batch
+
+
+def stop_batch():
+    """
+    Send the pending batched requests and stop the Batch API writer
+    """
+    global _batch
+
+    if _batch:
+        _batch.stop()
+        _batch = None
+
+
+def _send(method, url, **kwargs):
+    """
+    Send a request, through the Batch API for the inserts and updates if enabled
+    :return: response
+    :raises SnowRequestError: if the SNOW instance could not be reached
+    """
+    start = time.perf_counter()
+    try:
+        if _batch and method != 'GET':
+            return _batch.request(method, url, **kwargs)
+        kwargs.pop('merge_key', None)
+        return getattr(get_client(), method.lower())(url, **kwargs)
+    except requests.exceptions.RequestException as e:
+        snow_stats.count("snow errors")
+        raise SnowRequestError(None, "{} {} failed: {}".format(method, url, e))
+    finally:
+        snow_stats.observe("snow {} {}".format(method, _table(url)), time.perf_counter() - start)
+
+
+def _table(url):
+    """
+    :return: table of a Table API url, the last path element otherwise
+    """
+    path = url.split('?', 1)[0].rstrip('/')
+    if '/table/' in path:
+        return path.split('/table/', 1)[1].split('/', 1)[0]
+    return path.rsplit('/', 1)[-1]
+
+
+def get(url, **kwargs):
+    return _send('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return _send('POST', url, **kwargs)
+
+
+def put(url, **kwargs):
+    return _send('PUT', url, **kwargs)
@@ -0,0 +1,55 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+
+# Coalescing of the events of a flapping alert, done by SnowOutbox
+DEFAULT_WINDOW = 2.0
+DEFAULT_MAX_KEYS = 10000
+
+
+###---------------------------------------------------------------
+# Short description of the incident of an event
+# 
+###---------------------------------------------------------------
+def short_description_key(tokenized_events):
+    """
+    Incidents are looked up by this short description (first 160 characters)
+    :param tokenized_events: events from syslog module
+    :return: short description
+    """
+    short_description = tokenized_events["oneviewIp"] + " :-- " + tokenized_events["alertResource"] + \
+        " :-- " + tokenized_events["alertMessage"]
+    return short_description[:160]
+
+
+def coalesce_key(tokenized_events):
+    """
+    Events with the same key update the same SNOW record. Events of a
+    support case are kept apart from the plain alert.
+    :param tokenized_events: events from syslog module
+    :return: key
+    """
+    return "{}|{}".format(short_description_key(tokenized_events), tokenized_events.get('caseId', ""))
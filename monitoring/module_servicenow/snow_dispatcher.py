@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+import threading
+import zlib
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 1000
+
+# Marker pushed on a worker queue to stop the worker
+_STOP = object()
+
+
+class SnowDispatcher(object):
+    """
+    Runs SNOW operations on a pool of worker threads.
+    Events with the same key always go to the same worker, so the
+    operations of one resource run one after another in arrival
+    order while different resources are dispatched concurrently.
+    """
+
+    def __init__(self, handler, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        :param handler: function called with each submitted event
+        :param workers: number of worker threads
+        :param queue_size: max events waiting per worker before submit() blocks
+        """
+        self.handler = handler
+        self.queues = [queue.Queue(queue_size) for _ in range(max(1, workers))]
+        self.threads = []
+
+        for idx, work_queue in enumerate(self.queues):
+            thread = threading.Thread(target=self._run, args=(work_queue,),
+                                      name="snow-worker-{}".format(idx))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, key, event):
+        """
+        Queue an event on the worker owning its key
+        :param key: ordering key, e.g. the alert resource
+        :param event: tokenized event
+        """
+        idx = zlib.crc32(str(key).encode('utf-8')) % len(self.queues)
+        self.queues[idx].put(event)
+
+    def stop(self):
+        """
+        Process the queued events and stop the workers
+        """
+        for work_queue in self.queues:
+            work_queue.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+
+    def _run(self, work_queue):
+        while True:
+            event = work_queue.get()
+            if event is _STOP:
+                break
+            try:
+                self.handler(event)
+            except (Exception, SystemExit) as e:
+                # A handler calling exit() must not take the worker down, the
+                # events of its keys would wait forever.
+                # Events are tokenized alerts, or the keys submitted by SnowOutbox
+                name = event.get('alertId') if isinstance(event, dict) else event
+                print("Error in SNOW operation for event {} : {}".format(name, e))
+
+
+###---------------------------------------------------------------
+# Ordering key of a tokenized event
+# 
+###---------------------------------------------------------------
+def event_key(tokenized_events):
+    """
+    Events of the same resource on the same appliance share the same key.
+    Incidents are looked up by appliance, resource and message, so all
+    the events that may touch the same incident are kept in order.
+    :param tokenized_events: events from syslog module
+    :return: key
+    """
+    return "{}:{}".format(tokenized_events.get('oneviewIp'), tokenized_events.get('alertResource'))
@@ -0,0 +1,291 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+
+import heapq
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import deque, OrderedDict
+
+from snow_client import SnowRequestError
+from snow_coalescer import coalesce_key, DEFAULT_WINDOW, DEFAULT_MAX_KEYS
+from snow_dispatcher import SnowDispatcher, DEFAULT_WORKERS
+
+DEFAULT_PATH = 'snow_outbox.db'
+DEFAULT_MAX_EVENTS = 100000
+DEFAULT_RETRY_MIN = 1.0
+DEFAULT_RETRY_MAX = 300.0
+
+
+class SnowOutbox(object):
+    """
+    Persistent outbox in front of the SNOW operations.
+
+    Each submitted event is stored in a SQLite database (WAL journal)
+    before it is dispatched and removed once its SNOW operation is done.
+    An operation failing with a retryable SnowRequestError (SNOW instance
+    unreachable, 5xx, 408, 429) is retried in the background with
+    exponential backoff. The events of the same key wait behind it, so
+    they are still applied in order, while the other keys keep flowing.
+
+    A stored event is held for 'window' seconds before it is dispatched.
+    Events of the same coalesce key received meanwhile replace its row,
+    so only the latest state of a flapping alert reaches the SNOW
+    operations. At most 'max_keys' keys are held; when full, the oldest
+    is dispatched right away (evicted). A window of 0 dispatches every
+    event as it is stored.
+
+    The events left in the outbox when the forwarder stops or crashes,
+    held ones included, are replayed when it starts again. At most
+    'max_events' events are kept; new events are dropped while the
+    outbox is full. Stats events have no SNOW operation and are not
+    stored.
+    """
+
+    def __init__(self, handler, path=DEFAULT_PATH, workers=DEFAULT_WORKERS, max_events=DEFAULT_MAX_EVENTS,
+                 retry_min=DEFAULT_RETRY_MIN, retry_max=DEFAULT_RETRY_MAX, window=DEFAULT_WINDOW,
+                 max_keys=DEFAULT_MAX_KEYS):
+        """
+        :param handler: SNOW operation called with each event
+        :param path: SQLite database of the outbox
+        :param workers: number of dispatcher worker threads
+        :param max_events: max events kept in the outbox
+        :param retry_min: seconds before the first retry of a failed operation
+        :param retry_max: max seconds between retries
+        :param window: seconds to hold the events of a coalesce key, 0 for none
+        :param max_keys: max coalesce keys held
+        """
+        self.handler = handler
+        self.max_events = max_events
+        self.retry_min = float(retry_min)
+        self.retry_max = float(retry_max)
+        self.window = float(window)
+        self.max_keys = max(1, int(max_keys))
+
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                        "key TEXT NOT NULL, event TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0)")
+
+        self.lock = threading.Condition()
+        self.keys = {}          # key -> deque of [id, event, attempts], head is in progress
+        self.held = OrderedDict()   # coalesce key -> [deadline, id, key, latest event], oldest first
+        self.retries = []       # heap of (due time, key)
+        self.size = 0
+        self.running = True
+
+        self.received = 0
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.collapsed = 0
+        self.evicted = 0
+
+        # Replay the events left by the previous run, in their order
+        rows = self.db.execute("SELECT id, key, event, attempts FROM outbox ORDER BY id").fetchall()
+        for row_id, key, event, attempts in rows:
+            self.keys.setdefault(key, deque()).append([row_id, json.loads(event), attempts])
+        self.size = len(rows)
+        if rows:
+            print("SNOW outbox: replaying {} events of {} keys from {}".format(len(rows), len(self.keys), path))
+
+        self.dispatcher = SnowDispatcher(self._process, workers=workers)
+        for key in list(self.keys):
+            self.dispatcher.submit(key, key)
+
+        self.thread = threading.Thread(target=self._run, name="snow-outbox-retry")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, key, event):
+        """
+        Store an event and queue its SNOW operation
+        :param key: ordering key, e.g. the alert resource
+        :param event: tokenized event
+        """
+        if event.get('alertType') == "Stats":
+            self.skipped += 1
+            return
+
+        ready = []
+        with self.lock:
+            self.received += 1
+            ckey = coalesce_key(event) if self.window > 0 else None
+            entry = self.held.get(ckey) if ckey else None
+            if entry:
+                # Latest state wins, the deadline of the first event stays
+                self._execute("UPDATE outbox SET key = ?, event = ? WHERE id = ?",
+                              (key, json.dumps(event), entry[1]))
+                entry[2] = key
+                entry[3] = event
+                self.collapsed += 1
+                return
+
+            if self.size >= self.max_events:
+                self.dropped += 1
+                print("SNOW outbox full ({} events), dropping event {}".format(self.size, event.get('alertId')))
+                return
+
+            # Not stored on a database error, the event is still dispatched
+            cursor = self._execute("INSERT INTO outbox (key, event) VALUES (?, ?)", (key, json.dumps(event)))
+            row_id = cursor.lastrowid if cursor else None
+            self.size += 1
+            if ckey:
+                if len(self.held) >= self.max_keys:
+                    _, evicted = self.held.popitem(last=False)
+                    self.evicted += 1
+                    if self._queue(*evicted[1:]):
+                        ready.append(evicted[2])
+                self.held[ckey] = [time.time() + self.window, row_id, key, event]
+                self.lock.notify()
+            elif self._queue(row_id, key, event):
+                ready.append(key)
+
+        for key in ready:
+            self.dispatcher.submit(key, key)
+
+    def _queue(self, row_id, key, event):
+        # Called with the lock held. True when the key has to be dispatched,
+        # otherwise the event waits behind an operation in progress or a retry
+        entries = self.keys.setdefault(key, deque())
+        entries.append([row_id, event, 0])
+        return len(entries) == 1
+
+    def _execute(self, sql, args):
+        # A database error (disk full, I/O error) must not stop the dispatch.
+        # The row is then missing or stale in the outbox until the next start.
+        try:
+            return self.db.execute(sql, args)
+        except sqlite3.Error as e:
+            print("SNOW outbox database error : {}".format(e))
+            return None
+
+    def _process(self, key):
+        # Apply the events of the key until none is left or one has to be retried
+        while True:
+            with self.lock:
+                entry = self.keys[key][0]
+
+            try:
+                self.handler(entry[1])
+            except SnowRequestError as e:
+                if e.retryable:
+                    # Stays in the outbox for the next start when stopping
+                    if self.running:
+                        self._retry(key, entry, e)
+                    return
+                print("SNOW operation for event {} failed, dropping it. {}".format(entry[1].get('alertId'), e))
+                done = False
+            except (Exception, SystemExit) as e:
+                # exit() in an operation drops the event, the key keeps flowing
+                print("Error in SNOW operation for event {} : {}".format(entry[1].get('alertId'), e))
+                done = False
+            else:
+                done = True
+
+            with self.lock:
+                if done:
+                    self.delivered += 1
+                else:
+                    self.failed += 1
+                if entry[0] is not None:
+                    self._execute("DELETE FROM outbox WHERE id = ?", (entry[0],))
+                self.size -= 1
+                entries = self.keys[key]
+                entries.popleft()
+                if not entries:
+                    del self.keys[key]
+                    return
+
+    def _retry(self, key, entry, error):
+        with self.lock:
+            entry[2] += 1
+            self.retried += 1
+            if entry[0] is not None:
+                self._execute("UPDATE outbox SET attempts = ? WHERE id = ?", (entry[2], entry[0]))
+
+            # Exponential backoff with jitter, so that the keys do not all retry together
+            delay = min(self.retry_max, self.retry_min * 2 ** (entry[2] - 1)) * random.uniform(0.8, 1.2)
+            heapq.heappush(self.retries, (time.time() + delay, key))
+            self.lock.notify()
+        print("SNOW operation for event {} failed (attempt {}), retrying in {:.1f}s. {}".format(
+            entry[1].get('alertId'), entry[2], delay, error))
+
+    def stats(self):
+        """
+        :return: counters of the outbox
+        """
+        return "received = {}, collapsed = {}, evicted = {}, delivered = {}, retried = {}, failed = {}, " \
+               "dropped = {}, stats skipped = {}, pending = {}".format(
+                   self.received, self.collapsed, self.evicted, self.delivered, self.retried, self.failed,
+                   self.dropped, self.skipped, self.size)
+
+    def stop(self):
+        """
+        Dispatch the held events, finish the SNOW operations already queued
+        and stop. The events waiting for a retry stay in the outbox for the
+        next start.
+        """
+        with self.lock:
+            self.running = False
+            self.lock.notify()
+        self.thread.join()
+        self.dispatcher.stop()
+        self.db.close()
+        print("SNOW outbox stopped. {}".format(self.stats()))
+
+    def _run(self):
+        # Dispatch the held events whose window is over and the keys due for a retry
+        while True:
+            ready = []
+            with self.lock:
+                while True:
+                    now = time.time()
+                    while self.held and (not self.running or next(iter(self.held.values()))[0] <= now):
+                        _, entry = self.held.popitem(last=False)
+                        if self._queue(*entry[1:]):
+                            ready.append(entry[2])
+                    while self.running and self.retries and self.retries[0][0] <= now:
+                        ready.append(heapq.heappop(self.retries)[1])
+                    if ready or not self.running:
+                        break
+
+                    deadlines = [self.retries[0][0]] if self.retries else []
+                    if self.held:
+                        deadlines.append(next(iter(self.held.values()))[0])
+                    self.lock.wait(min(deadlines) - now if deadlines else None)
+                running = self.running
+
+            for key in ready:
+                self.dispatcher.submit(key, key)
+            if not running:
+                return
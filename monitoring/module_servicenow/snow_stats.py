@@ -0,0 +1,197 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+
+import signal
+import threading
+import time
+from bisect import bisect_left
+
+DEFAULT_INTERVAL = 300
+
+# Upper bounds (sec) of the latency buckets, 100 usec to ~105 sec
+LATENCY_BOUNDS = [0.0001 * 2 ** exponent for exponent in range(21)]
+
+
+class Histogram(object):
+    """
+    Latency histogram with fixed, doubling buckets. Percentiles are the
+    upper bound of the bucket they fall in (within a factor 2).
+    """
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, percent):
+        rank = self.count * percent / 100.0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return 0.0
+
+    def summary(self):
+        with self.lock:
+            if not self.count:
+                return "count = 0"
+            return "count = {}, avg = {:.4f} sec, p50 <= {:.4f} sec, p99 <= {:.4f} sec, max = {:.4f} sec".format(
+                self.count, self.total / self.count, self.percentile(50), self.percentile(99), self.max)
+
+
+class Stats(object):
+    """
+    Named latency histograms and counters of the forwarder.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        # Counters kept by their owners, read only for the summary
+        self.sources = {}
+        self.started = time.time()
+        # Counter values at the previous summary, for the rates
+        self.last_summary = self.started
+        self.last_values = {}
+
+    def observe(self, name, value):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        histogram.observe(value)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def watch(self, name, read):
+        """
+        Report a counter kept elsewhere, e.g. in a hot loop
+        :param name: counter name
+        :param read: callable returning the current value
+        """
+        with self.lock:
+            self.sources[name] = read
+
+    def summary(self):
+        """
+        :return: one line per histogram and counter, the counters with their rate since the previous summary
+        """
+        now = time.time()
+        elapsed = max(now - self.last_summary, 1e-6)
+        lines = ["Forwarder stats over {:.0f} sec (uptime {:.0f} sec)".format(elapsed, now - self.started)]
+        for name in sorted(self.histograms):
+            lines.append("  {}: {}".format(name, self.histograms[name].summary()))
+        with self.lock:
+            counters = dict(self.counters)
+            sources = dict(self.sources)
+        for name, read in sources.items():
+            counters[name] = read()
+        for name in sorted(counters):
+            lines.append("  {}: total = {}, {:.1f}/sec".format(
+                name, counters[name], (counters[name] - self.last_values.get(name, 0)) / elapsed))
+        self.last_values = counters
+        self.last_summary = now
+        return "\n".join(lines)
+
+
+# Stats of this process
+stats = Stats()
+
+_dump_requested = threading.Event()
+_reporter = None
+
+
+def observe(name, value):
+    stats.observe(name, value)
+
+
+def count(name, amount=1):
+    stats.count(name, amount)
+
+
+def watch(name, read):
+    stats.watch(name, read)
+
+
+def print_summary():
+    print(stats.summary())
+
+
+###---------------------------------------------------------------
+# Periodic summary and SIGUSR1 dump
+# 
+###---------------------------------------------------------------
+def start_reporting(interval=DEFAULT_INTERVAL):
+    """
+    Print the stats summary every 'interval' seconds (0 for none) and on request_dump()
+    :param interval: seconds between the summaries
+    """
+    global _reporter
+    if _reporter is not None:
+        return
+
+    def run():
+        while True:
+            _dump_requested.wait(interval or None)
+            _dump_requested.clear()
+            try:
+                print_summary()
+            except Exception as e:
+                print("Error in printing the forwarder stats: {}".format(e))
+
+    _reporter = threading.Thread(target=run, name="snow-stats")
+    _reporter.daemon = True
+    _reporter.start()
+
+
+def request_dump():
+    _dump_requested.set()
+
+
+def install_signal(signum=getattr(signal, 'SIGUSR1', None)):
+    """
+    Dump the stats on 'signum'. The handler only wakes the reporter thread,
+    so nothing is printed from inside the handler. Call from the main thread.
+    """
+    if signum is not None:
+        signal.signal(signum, lambda signal_number, frame: request_dump())
@@ -0,0 +1,243 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import time
+
+DEFAULT_CHUNK_SIZE = 65536
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_CHECKPOINT_INTERVAL = 1.0
+
+# inotify flags, see <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+
+class _Inotify(object):
+    """
+    Minimal inotify watch on the directory of the followed file.
+    Used only to wake up the follower; it re-checks the file itself.
+    """
+
+    def __init__(self, directory):
+        self.fd = None
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            return
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            return
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return
+        if libc.inotify_add_watch(fd, directory.encode('utf-8'), IN_MODIFY | IN_CREATE | IN_MOVED_TO) < 0:
+            os.close(fd)
+            return
+        self.fd = fd
+
+    def wait(self, timeout):
+        """
+        Wait for a change in the directory
+        :param timeout: max seconds to wait
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            try:
+                # Drain the queued events, the follower re-reads the file anyway
+                while os.read(self.fd, 4096):
+                    pass
+            except (BlockingIOError, OSError):
+                pass
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class SyslogFollower(object):
+    """
+    Follows the syslog file written by the extractor.
+    Reads in large chunks and yields complete lines. The byte offset
+    and inode of the last consumed line are checkpointed, so a restart
+    resumes exactly where the previous run stopped. Rename and truncate
+    rotation of the file are followed.
+    Waits for new data with inotify, or polls when inotify is not available.
+    """
+
+    def __init__(self, fileName, checkpoint_file=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 poll_interval=DEFAULT_POLL_INTERVAL, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
+        """
+        :param fileName: syslog file to follow
+        :param checkpoint_file: file keeping the offset and inode, None to always start at the end
+        :param chunk_size: bytes read at once
+        :param poll_interval: max seconds between checks of the file
+        :param checkpoint_interval: min seconds between two checkpoint writes
+        """
+        self.fileName = fileName
+        self.checkpoint_file = checkpoint_file
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.checkpoint_interval = checkpoint_interval
+
+        self.file = None
+        self.inode = None
+        self.offset = 0            # offset after the last consumed line
+        self.saved = (None, None)  # last checkpointed (inode, offset)
+        self.last_save = 0
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_file or not os.path.exists(self.checkpoint_file):
+            return None
+        try:
+            with open(self.checkpoint_file) as data_file:
+                return json.load(data_file)
+        except Exception as e:
+            print("Unable to read syslog checkpoint {} : {}".format(self.checkpoint_file, e))
+            return None
+
+    def save_checkpoint(self):
+        """
+        Write the offset and inode of the last consumed line
+        """
+        if not self.checkpoint_file or self.saved == (self.inode, self.offset):
+            return
+
+        temp_file = self.checkpoint_file + '.tmp'
+        with open(temp_file, 'w') as data_file:
+            json.dump({'file': self.fileName, 'inode': self.inode, 'offset': self.offset}, data_file)
+        os.rename(temp_file, self.checkpoint_file)
+        self.saved = (self.inode, self.offset)
+        self.last_save = time.time()
+
+    def _open(self, resume):
+        """
+        Open the syslog file and position it.
+        :param resume: True to resume from the checkpoint, or from the end without one
+        """
+        while True:
+            try:
+                self.file = open(self.fileName, 'rb')
+                break
+            except IOError:
+                print("Waiting for syslog file {} to be created.".format(self.fileName))
+                time.sleep(self.poll_interval)
+
+        stat = os.fstat(self.file.fileno())
+        self.inode = stat.st_ino
+        self.offset = 0
+
+        if resume:
+            checkpoint = self._load_checkpoint()
+            if checkpoint is None:
+                # Nothing consumed yet, start following from the end
+                self.offset = stat.st_size
+            elif checkpoint.get('inode') == self.inode and checkpoint.get('offset', 0) <= stat.st_size:
+                self.offset = checkpoint['offset']
+            else:
+                print("Syslog file {} rotated or truncated since the last run. Reading from the start.".format(self.fileName))
+
+        self.file.seek(self.offset)
+        print("Following {} from offset {}".format(self.fileName, self.offset))
+
+    def _rotated(self):
+        """
+        :return: 'renamed' if the path now points to another file,
+                 'truncated' if the file shrank below the read position, else None
+        """
+        try:
+            stat = os.stat(self.fileName)
+        except OSError:
+            return None   # Rotated away and not yet re-created, keep the old file
+
+        if stat.st_ino != self.inode:
+            return 'renamed'
+        if stat.st_size < self.file.tell():
+            return 'truncated'
+        return None
+
+    def follow(self):
+        """
+        Generator of the complete lines appended to the syslog file
+        """
+        self._open(resume=True)
+        watcher = _Inotify(os.path.dirname(os.path.abspath(self.fileName)))
+        if watcher.fd is None:
+            print("inotify not available. Polling {} every {} sec".format(self.fileName, self.poll_interval))
+
+        pending = b''
+        renamed = False
+        try:
+            while True:
+                chunk = self.file.read(self.chunk_size)
+                if chunk:
+                    pending += chunk
+                    lines = pending.split(b'\n')
+                    pending = lines.pop()
+                    for line in lines:
+                        yield line.decode('utf-8', 'replace')
+                        # The consumer asked for the next line, so this one is done
+                        self.offset += len(line) + 1
+                        if time.time() - self.last_save >= self.checkpoint_interval:
+                            self.save_checkpoint()
+                    continue
+
+                if renamed:
+                    # The old file is fully read, switch to the new one
+                    print("Syslog file {} rotated. Following the new file.".format(self.fileName))
+                    self.file.close()
+                    pending = b''
+                    renamed = False
+                    self._open(resume=False)
+                    continue
+
+                # At the end of the file
+                self.save_checkpoint()
+                rotation = self._rotated()
+                if rotation == 'renamed':
+                    # Read what was appended to the old file before the rename
+                    renamed = True
+                elif rotation == 'truncated':
+                    print("Syslog file {} truncated. Reading from the start.".format(self.fileName))
+                    pending = b''
+                    self.offset = 0
+                    self.file.seek(0)
+                elif watcher.fd is not None:
+                    watcher.wait(self.poll_interval)
+                else:
+                    time.sleep(self.poll_interval)
+        finally:
+            watcher.close()
+            self.save_checkpoint()
+            self.file.close()
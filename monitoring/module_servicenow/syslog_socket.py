@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# (C) Copyright (2012-2020) Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author : GSE Team, HPE
+###
+
+
+import os
+import selectors
+import socket
+
+DEFAULT_BACKLOG = 16
+RECV_SIZE = 65536
+
+
+class _FrameReader(object):
+    """
+    Splits the octet-counted stream of one connection ("<length> <record>")
+    into records.
+    """
+
+    def __init__(self):
+        self.buffer = b''
+
+    def feed(self, data):
+        """
+        Add received data
+        :param data: bytes received on the connection
+        :return: list of the complete records
+        """
+        self.buffer += data
+        records = []
+        while True:
+            space = self.buffer.find(b' ')
+            if space < 0:
+                break
+            length = self.buffer[:space]
+            if not length.isdigit():
+                raise ValueError("Invalid syslog frame length {!r}".format(length[:16]))
+            end = space + 1 + int(length)
+            if len(self.buffer) < end:
+                break
+            records.append(self.buffer[space + 1:end].decode('utf-8', 'replace'))
+            self.buffer = self.buffer[end:]
+        return records
+
+
+class SyslogSocketSource(object):
+    """
+    Receives the syslog records sent by the extractor's socket sinks,
+    so the forwarder does not go through the syslog file.
+
+    address:
+        unix:///path/to/socket - local stream socket, octet-counting framing
+        tcp://host:port        - TCP, octet-counting framing
+        udp://host:port        - UDP, one record per datagram
+    """
+
+    def __init__(self, address, backlog=DEFAULT_BACKLOG):
+        self.address = address
+        self.backlog = backlog
+        self.selector = selectors.DefaultSelector()
+        self.server = None
+        self.datagram = False
+        self.readers = {}
+
+    def open(self):
+        """
+        Bind the listening socket
+        """
+        if self.address.startswith('unix://'):
+            path = self.address[len('unix://'):]
+            if os.path.exists(path):
+                os.unlink(path)
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server.bind(path)
+        elif self.address.startswith('tcp://') or self.address.startswith('udp://'):
+            host, _, port = self.address[len('tcp://'):].rpartition(':')
+            self.datagram = self.address.startswith('udp://')
+            self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM if self.datagram else socket.SOCK_STREAM)
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server.bind((host, int(port)))
+        else:
+            raise ValueError("Invalid syslog source {}. Use unix:///path, tcp://host:port or udp://host:port".format(self.address))
+
+        if not self.datagram:
+            self.server.listen(self.backlog)
+        self.server.setblocking(False)
+        self.selector.register(self.server, selectors.EVENT_READ)
+        print("Listening for syslog records on {}".format(self.address))
+
+    def close(self):
+        """
+        Close the listening socket and the connections
+        """
+        for sock in list(self.readers):
+            self._drop(sock)
+        if self.server:
+            self.selector.unregister(self.server)
+            self.server.close()
+            self.server = None
+            if self.address.startswith('unix://'):
+                try:
+                    os.unlink(self.address[len('unix://'):])
+                except OSError:
+                    pass
+
+    def _drop(self, sock):
+        self.selector.unregister(sock)
+        sock.close()
+        del self.readers[sock]
+
+    def records(self):
+        """
+        Receive the records from all the connected senders
+        :return: generator of the records, in the order they were received per sender
+        """
+        if self.server is None:
+            self.open()
+        try:
+            while True:
+                for key, _ in self.selector.select(timeout=1.0):
+                    sock = key.fileobj
+                    if sock is self.server:
+                        if self.datagram:
+                            data, _ = sock.recvfrom(RECV_SIZE)
+                            yield data.decode('utf-8', 'replace')
+                            continue
+                        conn, _ = sock.accept()
+                        conn.setblocking(False)
+                        self.selector.register(conn, selectors.EVENT_READ)
+                        self.readers[conn] = _FrameReader()
+                        continue
+
+                    try:
+                        data = sock.recv(RECV_SIZE)
+                    except (BlockingIOError, InterruptedError):
+                        continue
+                    except OSError:
+                        data = b''
+                    if not data:
+                        self._drop(sock)
+                        continue
+
+                    try:
+                        received = self.readers[sock].feed(data)
+                    except ValueError as e:
+                        print("Dropping syslog connection : {}".format(e))
+                        self._drop(sock)
+                        continue
+                    for record in received:
+                        yield record
+        finally:
+            self.close()
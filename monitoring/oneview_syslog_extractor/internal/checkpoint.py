@@ -0,0 +1,139 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import logging
+import os
+import threading
+import time
+
+# Legacy checkpoint file of each alert class. The per appliance file is
+# "<legacy file>.<appliance>", the legacy file is only read as a fallback.
+CHECKPOINT_FILES = {"activeAlerts": ".timestamp", "hpeOVRSAlerts": ".serviceInfoTimestamp"}
+
+
+##################################################################
+# Checkpoint of the last logged alert, per appliance and alert class.
+#
+# The highest 'modified' timestamp seen is tracked in memory and the
+# checkpoint files are written at most every 'flushInterval' seconds
+# or every 'flushMessages' updates. Each file is written to a temp
+# file and renamed over the old one, so a crash never leaves an empty
+# or partial checkpoint behind.
+#
+# OneView timestamps are UTC with a fixed format
+# ('%Y-%m-%dT%H:%M:%S.%fZ'), so they compare as strings.
+##################################################################
+class CheckpointManager(object):
+
+    def __init__(self, flushInterval=1.0, flushMessages=100, directory=None):
+        self.flushInterval = float(flushInterval)
+        self.flushMessages = max(1, int(flushMessages))
+        self.directory = directory or os.getcwd()
+
+        self._lock = threading.Lock()
+        self._latest = {}       # (host, alertClass) -> timestamp
+        self._dirty = set()
+        self._updates = 0
+        self._lastFlush = time.time()
+
+        self._stopEvent = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="checkpoint-flusher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def fileName(self, host, alertClass):
+        return os.path.join(self.directory, "{}.{}".format(CHECKPOINT_FILES[alertClass], host))
+
+    ##################################################################
+    # Last checkpointed timestamp of an appliance, or None.
+    ##################################################################
+    def get(self, host, alertClass):
+        key = (host, alertClass)
+        with self._lock:
+            if key in self._latest:
+                return self._latest[key]
+
+        timestamp = None
+        legacyFile = os.path.join(self.directory, CHECKPOINT_FILES[alertClass])
+        for fileName in (self.fileName(host, alertClass), legacyFile):
+            try:
+                with open(fileName, 'r') as timestampFile:
+                    timestamp = timestampFile.readline().strip() or None
+            except IOError:
+                continue
+            if timestamp:
+                break
+
+        with self._lock:
+            # An update may have raced with the read
+            if key not in self._latest:
+                self._latest[key] = timestamp
+            return self._latest[key]
+
+    ##################################################################
+    # Record a logged alert. Only moves the checkpoint forward.
+    ##################################################################
+    def update(self, host, alertClass, timestamp):
+        if not timestamp:
+            return
+
+        key = (host, alertClass)
+        with self._lock:
+            current = self._latest.get(key)
+            if current and current >= timestamp:
+                return
+            self._latest[key] = timestamp
+            self._dirty.add(key)
+            self._updates += 1
+            due = self._updates >= self.flushMessages
+
+        if due:
+            self.flush()
+
+    ##################################################################
+    # Write the checkpoints updated since the last flush.
+    ##################################################################
+    def flush(self):
+        with self._lock:
+            pending = [(key, self._latest[key]) for key in self._dirty]
+            self._dirty = set()
+            self._updates = 0
+            self._lastFlush = time.time()
+
+        for (host, alertClass), timestamp in pending:
+            fileName = self.fileName(host, alertClass)
+            tmpFile = fileName + ".tmp"
+            try:
+                with open(tmpFile, 'w') as timestampFile:
+                    timestampFile.write(timestamp)
+                    timestampFile.flush()
+                    os.fsync(timestampFile.fileno())
+                os.rename(tmpFile, fileName)
+            except Exception as e:
+                logging.error("Error in writing the checkpoint {} : {}".format(fileName, e))
+                with self._lock:
+                    self._dirty.add((host, alertClass))
+
+    def close(self):
+        self._stopEvent.set()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stopEvent.wait(self.flushInterval / 2):
+            if self._dirty and time.time() - self._lastFlush >= self.flushInterval:
+                self.flush()
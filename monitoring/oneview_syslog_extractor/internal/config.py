@@ -19,7 +19,13 @@ import logging
 import json
 import os
 
+from internal.timeseries_store import SEGMENT_SECONDS
+
 ##################################################################
+# Supervisor mode: the config file can list several appliances in
+# "oneview_appliances". Each entry is merged over "oneview_config",
+# which then only holds the settings shared by the appliances.
+#
 # List of parameters that would be imported
 #    OV_HOSTNAME - Mandatory
 #    OV_USERNAME - Mandatory
@@ -27,13 +33,53 @@ import os
 #    OV_ALIAS_NAME        - Optional: Oneview-OV_HOSTNAME
 #    OV_AUTH_LOGIN_DOMAIN - Optional: LOCAL
 #    OV_SCMB_ROUTE        - Optional: 'scmb.alerts.#'
+#    OV_SCMB_MODE         - Optional: "async" (async:legacy)
+#    OV_SCMB_PREFETCH     - Optional: 100 (unacked SCMB messages in flight)
+#    OV_SCMB_WORKERS      - Optional: 4
+#    OV_SCMB_QUEUE        - Optional: "" (named durable queue, server named when empty)
 #    OV_ALERT_TYPE        - Optional: "Critical:Warning:Ok"
 #    OV_RESOURCE_CATEGORY - Optional: "server-hardware:enclosures:interconnects:logical-interconnects:sas-interconnects"
 #    OV_COLLECT_STATS     - Optional: "true"
 #    OV_COLLECT_HPEOV_SERVICE     - Optional: "false"
 #    OV_REFRESH_INTERVAL  - Optional: 600
+#    OV_MAX_INFLIGHT      - Optional: 8 (concurrent OneView calls per collector)
+#    OV_API_RATE          - Optional: 10 (OneView API calls/sec per appliance, shared by its pollers)
+#    OV_API_BURST         - Optional: 20
+#    OV_POOL_SIZE         - Optional: 6 (poller threads shared by all the appliances)
+#    OV_CONNECTION_POOL   - Optional: 16 (keep-alive connections per appliance)
+#    OV_INVENTORY_CAPACITY           - Optional: 8192 (servers in the shared server index)
+#    OV_INVENTORY_RECONCILE_INTERVAL - Optional: 3600 (seconds between full server listings)
+#    OV_NODESTATS_MODE      - Optional: "full" (full:changes - NodeStats of every resource, or of
+#                                       the status/state transitions only)
+#    OV_NODESTATS_HEARTBEAT - Optional: 3600 (seconds between full NodeStats listings in changes
+#                                       mode, 0 for none)
+#    OV_SNAPSHOT_CAPACITY   - Optional: 16384 (resources in the shared snapshot store)
+#    OV_TIMESERIES_DIR        - Optional: "" (directory of the local time-series store of the
+#                                         utilization samples and port counters, off when empty)
+#    OV_TIMESERIES_RETENTION  - Optional: 2592000 (seconds of samples kept)
+#    OV_TIMESERIES_DOWNSAMPLE_AFTER - Optional: 86400 (seconds of samples kept at full resolution)
+#    OV_TIMESERIES_DOWNSAMPLE_STEP  - Optional: 300 (seconds averaged into one older sample,
+#                                         a divisor of the 3600 seconds of a segment)
+#    OV_PORT_UTIL_THRESHOLD - Optional: 80 (percent of the port speed flagging a linked port as
+#                                       congested, 0 for none)
+#    OV_METRICS_PORT        - Optional: 0 (port of the Prometheus /metrics endpoint, off when 0)
+#    OV_METRICS_ADDRESS     - Optional: "" (address of the /metrics endpoint, all when empty)
 #    OV_SYSLOG_FILEPATH   - Optional: "logs"
 #    OV_SYSLOG_FILE       - Optional: "oneview_syslog"
+#    OV_SYSLOG_FLUSH_LINES    - Optional: 500
+#    OV_SYSLOG_FLUSH_INTERVAL - Optional: 1.0 (seconds)
+#    OV_SYSLOG_FSYNC          - Optional: "batch" (never:batch:interval)
+#    OV_SYSLOG_FORMAT         - Optional: "bracket" (bracket:rfc5424:jsonl)
+#    OV_SYSLOG_SINKS          - Optional: "file" (comma separated - file, udp://host:port,
+#                                         tcp://host:port, unix:///path)
+#    OV_SYSLOG_RETRY_LINES    - Optional: 100000 (records kept per sink to retry while it fails)
+#    OV_CHECKPOINT_FLUSH_MS       - Optional: 1000 (alert checkpoint flush interval)
+#    OV_CHECKPOINT_FLUSH_MESSAGES - Optional: 100
+#    OV_SERVICENOW_PIPELINE     - Optional: "" (directory of module_servicenow to send the
+#                                           alerts to ServiceNow in-process)
+#    OV_SERVICENOW_AUDIT_SYSLOG - Optional: "true" (also write the alerts to the syslog sinks)
+#    OV_STATS_INTERVAL    - Optional: 300 (seconds between the latency/counter summaries in
+#                                     activity.log, 0 for none; SIGUSR1 logs one at any time)
 #    OV_LOGGING_LEVEL     - Optional: "WARNING"
 ##################################################################
 
@@ -42,11 +88,43 @@ CONFIG_DEFAULTS = {
     'alert_hardware_category': "server-hardware:enclosures:interconnects:logical-interconnects:sas-interconnects",
     'authLoginDomain': "LOCAL",
     'route': "scmb.alerts.#",
+    'scmb_mode': "async",
+    'scmb_prefetch': 100,
+    'scmb_workers': 4,
+    'scmb_queue': "",
     'syslog_dir': "logs",
     "collect_stats": "true",
     "collect_hpeov_service_info": "false",
     "refresh_interval": 600,
+    "ov_max_inflight": 8,
+    "ov_api_rate": 10,
+    "ov_api_burst": 20,
+    "ov_pool_size": 6,
+    "ov_connection_pool": 16,
+    "inventory_capacity": 8192,
+    "inventory_reconcile_interval": 3600,
+    "nodestats_mode": "full",
+    "nodestats_heartbeat": 3600,
+    "snapshot_capacity": 16384,
+    "port_util_threshold": 80,
+    "stats_interval": 300,
+    "metrics_port": 0,
+    "metrics_address": "",
+    "timeseries_dir": "",
+    "timeseries_retention": 2592000,
+    "timeseries_downsample_after": 86400,
+    "timeseries_downsample_step": 300,
     'syslog_file': "oneview_syslog",
+    'syslog_flush_lines': 500,
+    'syslog_flush_interval': 1.0,
+    'syslog_fsync': "batch",
+    'syslog_format': "bracket",
+    'syslog_sinks': "file",
+    'syslog_retry_lines': 100000,
+    'checkpoint_flush_ms': 1000,
+    'checkpoint_flush_messages': 100,
+    'servicenow_pipeline': "",
+    'servicenow_audit_syslog': "true",
     'logging_level': "WARNING"
 }
 
@@ -78,12 +156,27 @@ def fillMissingVars(inputConfig):
     # Optional Parameters
     oneview_config = inputConfig['oneview_config']
 
-    if not oneview_config.get('alias'):
+    # The shared settings of a multi-appliance config have no host
+    if not oneview_config.get('alias') and oneview_config.get('host'):
         oneview_config['alias'] = os.environ.get('OV_ALIAS_NAME', '{}-{}'.format("HPEOneview", oneview_config["host"]))
 
     if not oneview_config.get('route'):
         oneview_config['route'] = os.environ.get('OV_SCMB_ROUTE', CONFIG_DEFAULTS['route'])
 
+    if not oneview_config.get('scmb_mode'):
+        oneview_config['scmb_mode'] = os.environ.get('OV_SCMB_MODE', CONFIG_DEFAULTS['scmb_mode'])
+
+    if not oneview_config.get('scmb_prefetch'):
+        oneview_config['scmb_prefetch'] = os.environ.get('OV_SCMB_PREFETCH', CONFIG_DEFAULTS['scmb_prefetch'])
+    oneview_config['scmb_prefetch'] = int(oneview_config['scmb_prefetch'])
+
+    if not oneview_config.get('scmb_workers'):
+        oneview_config['scmb_workers'] = os.environ.get('OV_SCMB_WORKERS', CONFIG_DEFAULTS['scmb_workers'])
+    oneview_config['scmb_workers'] = int(oneview_config['scmb_workers'])
+
+    if not oneview_config.get('scmb_queue'):
+        oneview_config['scmb_queue'] = os.environ.get('OV_SCMB_QUEUE', CONFIG_DEFAULTS['scmb_queue'])
+
     if not oneview_config.get('alert_type'):
         oneview_config['alert_type'] = os.environ.get('OV_ALERT_TYPE', CONFIG_DEFAULTS['alert_type'])
 
@@ -111,6 +204,76 @@ def fillMissingVars(inputConfig):
 
     if not oneview_config.get('refresh_interval'):
         oneview_config['refresh_interval'] = os.environ.get('OV_REFRESH_INTERVAL', CONFIG_DEFAULTS['refresh_interval'])
+    oneview_config['refresh_interval'] = int(oneview_config['refresh_interval'])
+
+    if not oneview_config.get('ov_max_inflight'):
+        oneview_config['ov_max_inflight'] = os.environ.get('OV_MAX_INFLIGHT', CONFIG_DEFAULTS['ov_max_inflight'])
+    oneview_config['ov_max_inflight'] = int(oneview_config['ov_max_inflight'])
+
+    if not oneview_config.get('ov_api_rate'):
+        oneview_config['ov_api_rate'] = os.environ.get('OV_API_RATE', CONFIG_DEFAULTS['ov_api_rate'])
+    oneview_config['ov_api_rate'] = float(oneview_config['ov_api_rate'])
+
+    if not oneview_config.get('ov_api_burst'):
+        oneview_config['ov_api_burst'] = os.environ.get('OV_API_BURST', CONFIG_DEFAULTS['ov_api_burst'])
+    oneview_config['ov_api_burst'] = int(oneview_config['ov_api_burst'])
+
+    if not oneview_config.get('ov_pool_size'):
+        oneview_config['ov_pool_size'] = os.environ.get('OV_POOL_SIZE', CONFIG_DEFAULTS['ov_pool_size'])
+    oneview_config['ov_pool_size'] = int(oneview_config['ov_pool_size'])
+
+    if not oneview_config.get('ov_connection_pool'):
+        oneview_config['ov_connection_pool'] = os.environ.get('OV_CONNECTION_POOL', CONFIG_DEFAULTS['ov_connection_pool'])
+    oneview_config['ov_connection_pool'] = int(oneview_config['ov_connection_pool'])
+
+    if not oneview_config.get('inventory_capacity'):
+        oneview_config['inventory_capacity'] = os.environ.get('OV_INVENTORY_CAPACITY', CONFIG_DEFAULTS['inventory_capacity'])
+    oneview_config['inventory_capacity'] = int(oneview_config['inventory_capacity'])
+
+    if not oneview_config.get('inventory_reconcile_interval'):
+        oneview_config['inventory_reconcile_interval'] = os.environ.get('OV_INVENTORY_RECONCILE_INTERVAL', CONFIG_DEFAULTS['inventory_reconcile_interval'])
+    oneview_config['inventory_reconcile_interval'] = int(oneview_config['inventory_reconcile_interval'])
+
+    if not oneview_config.get('nodestats_mode'):
+        oneview_config['nodestats_mode'] = os.environ.get('OV_NODESTATS_MODE', CONFIG_DEFAULTS['nodestats_mode'])
+
+    if oneview_config.get('nodestats_heartbeat') in (None, ""):
+        oneview_config['nodestats_heartbeat'] = os.environ.get('OV_NODESTATS_HEARTBEAT', CONFIG_DEFAULTS['nodestats_heartbeat'])
+    oneview_config['nodestats_heartbeat'] = int(oneview_config['nodestats_heartbeat'])
+
+    if not oneview_config.get('snapshot_capacity'):
+        oneview_config['snapshot_capacity'] = os.environ.get('OV_SNAPSHOT_CAPACITY', CONFIG_DEFAULTS['snapshot_capacity'])
+    oneview_config['snapshot_capacity'] = int(oneview_config['snapshot_capacity'])
+
+    if oneview_config.get('port_util_threshold') in (None, ""):
+        oneview_config['port_util_threshold'] = os.environ.get('OV_PORT_UTIL_THRESHOLD', CONFIG_DEFAULTS['port_util_threshold'])
+    oneview_config['port_util_threshold'] = float(oneview_config['port_util_threshold'])
+
+    if oneview_config.get('stats_interval') in (None, ""):
+        oneview_config['stats_interval'] = os.environ.get('OV_STATS_INTERVAL', CONFIG_DEFAULTS['stats_interval'])
+    oneview_config['stats_interval'] = float(oneview_config['stats_interval'])
+
+    if not oneview_config.get('metrics_port'):
+        oneview_config['metrics_port'] = os.environ.get('OV_METRICS_PORT', CONFIG_DEFAULTS['metrics_port'])
+    oneview_config['metrics_port'] = int(oneview_config['metrics_port'])
+
+    if not oneview_config.get('metrics_address'):
+        oneview_config['metrics_address'] = os.environ.get('OV_METRICS_ADDRESS', CONFIG_DEFAULTS['metrics_address'])
+
+    if not oneview_config.get('timeseries_dir'):
+        oneview_config['timeseries_dir'] = os.environ.get('OV_TIMESERIES_DIR', CONFIG_DEFAULTS['timeseries_dir'])
+
+    if not oneview_config.get('timeseries_retention'):
+        oneview_config['timeseries_retention'] = os.environ.get('OV_TIMESERIES_RETENTION', CONFIG_DEFAULTS['timeseries_retention'])
+    oneview_config['timeseries_retention'] = int(oneview_config['timeseries_retention'])
+
+    if not oneview_config.get('timeseries_downsample_after'):
+        oneview_config['timeseries_downsample_after'] = os.environ.get('OV_TIMESERIES_DOWNSAMPLE_AFTER', CONFIG_DEFAULTS['timeseries_downsample_after'])
+    oneview_config['timeseries_downsample_after'] = int(oneview_config['timeseries_downsample_after'])
+
+    if not oneview_config.get('timeseries_downsample_step'):
+        oneview_config['timeseries_downsample_step'] = os.environ.get('OV_TIMESERIES_DOWNSAMPLE_STEP', CONFIG_DEFAULTS['timeseries_downsample_step'])
+    oneview_config['timeseries_downsample_step'] = int(oneview_config['timeseries_downsample_step'])
 
     if not oneview_config.get('syslogDir'):
         oneview_config['syslogDir'] = os.environ.get('OV_SYSLOG_FILEPATH', CONFIG_DEFAULTS['syslog_dir'])
@@ -118,6 +281,42 @@ def fillMissingVars(inputConfig):
     if not oneview_config.get('syslog'):
         oneview_config['syslog'] = os.environ.get('OV_SYSLOG_FILE', CONFIG_DEFAULTS['syslog_file'])
 
+    if not oneview_config.get('syslog_flush_lines'):
+        oneview_config['syslog_flush_lines'] = os.environ.get('OV_SYSLOG_FLUSH_LINES', CONFIG_DEFAULTS['syslog_flush_lines'])
+    oneview_config['syslog_flush_lines'] = int(oneview_config['syslog_flush_lines'])
+
+    if not oneview_config.get('syslog_flush_interval'):
+        oneview_config['syslog_flush_interval'] = os.environ.get('OV_SYSLOG_FLUSH_INTERVAL', CONFIG_DEFAULTS['syslog_flush_interval'])
+    oneview_config['syslog_flush_interval'] = float(oneview_config['syslog_flush_interval'])
+
+    if not oneview_config.get('syslog_fsync'):
+        oneview_config['syslog_fsync'] = os.environ.get('OV_SYSLOG_FSYNC', CONFIG_DEFAULTS['syslog_fsync'])
+
+    if not oneview_config.get('syslog_format'):
+        oneview_config['syslog_format'] = os.environ.get('OV_SYSLOG_FORMAT', CONFIG_DEFAULTS['syslog_format'])
+
+    if not oneview_config.get('syslog_sinks'):
+        oneview_config['syslog_sinks'] = os.environ.get('OV_SYSLOG_SINKS', CONFIG_DEFAULTS['syslog_sinks'])
+
+    if oneview_config.get('syslog_retry_lines') in (None, ""):
+        oneview_config['syslog_retry_lines'] = os.environ.get('OV_SYSLOG_RETRY_LINES', CONFIG_DEFAULTS['syslog_retry_lines'])
+    oneview_config['syslog_retry_lines'] = int(oneview_config['syslog_retry_lines'])
+
+    if not oneview_config.get('checkpoint_flush_ms'):
+        oneview_config['checkpoint_flush_ms'] = os.environ.get('OV_CHECKPOINT_FLUSH_MS', CONFIG_DEFAULTS['checkpoint_flush_ms'])
+    oneview_config['checkpoint_flush_ms'] = int(oneview_config['checkpoint_flush_ms'])
+
+    if not oneview_config.get('checkpoint_flush_messages'):
+        oneview_config['checkpoint_flush_messages'] = os.environ.get('OV_CHECKPOINT_FLUSH_MESSAGES', CONFIG_DEFAULTS['checkpoint_flush_messages'])
+    oneview_config['checkpoint_flush_messages'] = int(oneview_config['checkpoint_flush_messages'])
+
+    if not oneview_config.get('servicenow_pipeline'):
+        oneview_config['servicenow_pipeline'] = os.environ.get('OV_SERVICENOW_PIPELINE', CONFIG_DEFAULTS['servicenow_pipeline'])
+
+    if oneview_config.get('servicenow_audit_syslog') in (None, ""):
+        oneview_config['servicenow_audit_syslog'] = os.environ.get('OV_SERVICENOW_AUDIT_SYSLOG', CONFIG_DEFAULTS['servicenow_audit_syslog'])
+    oneview_config['servicenow_audit_syslog'] = str(oneview_config['servicenow_audit_syslog']).lower() == "true"
+
     if not inputConfig.get('logging_level'):
         inputConfig["logging_level"] = os.environ.get('OV_LOGGING_LEVEL', CONFIG_DEFAULTS['logging_level'])
 
@@ -137,13 +336,38 @@ def getInputConfig(configFile):
         print("Config file un-specified. Checking environment variables")
         inputConfig = importReqVars()
 
-    if not inputConfig.get("oneview_config"):
+    if not inputConfig.get("oneview_config") and not inputConfig.get("oneview_appliances"):
         err = "Missing oneview information. Check the config file or export the OV_* variables"
         logging.error(err)
-        raise Exception(e)
+        raise Exception(err)
 
+    sharedConfig = dict(inputConfig.setdefault("oneview_config", {}))
     inputConfig = fillMissingVars(inputConfig)
+    inputConfig["appliances"] = getAppliances(inputConfig, sharedConfig)
     return inputConfig
+
+
+##################################################################
+# List of the appliances to monitor, with the shared settings and
+# the defaults filled in. A single appliance config is a list of one.
+##################################################################
+def getAppliances(inputConfig, sharedConfig):
+    if not inputConfig.get("oneview_appliances"):
+        return [inputConfig["oneview_config"]]
+
+    appliances = []
+    for appliance in inputConfig["oneview_appliances"]:
+        oneview_config = dict(sharedConfig)
+        oneview_config.update(appliance)
+        appliances.append(fillMissingVars({'oneview_config': oneview_config})['oneview_config'])
+
+    hosts = [appliance.get('host') for appliance in appliances]
+    if len(set(hosts)) != len(hosts):
+        err = "Duplicate appliances in oneview_appliances : {}".format(hosts)
+        logging.error(err)
+        raise Exception(err)
+
+    return appliances
     
 
 ##################################################################
@@ -152,8 +376,12 @@ def getInputConfig(configFile):
 ##################################################################
 def validate_input(oneViewDetails):
     validate_oneview_details(oneViewDetails)
+    validate_scmb_mode(oneViewDetails)
+    validate_nodestats_mode(oneViewDetails)
+    validate_port_util_threshold(oneViewDetails)
     validate_hardware_category(oneViewDetails)
     validate_alert_types(oneViewDetails)
+    validate_timeseries_downsample_step(oneViewDetails)
 
     logging.info("Successfully validated input file")
 
@@ -171,6 +399,36 @@ def validate_oneview_details(oneViewDetails):
         raise Exception(err)
 
 
+##################################################################
+# Validate the SCMB consumer mode
+##################################################################
+def validate_scmb_mode(oneViewDetails):
+    if oneViewDetails["scmb_mode"] not in ('async', 'legacy'):
+        err = "SCMB mode - \"{}\" is not permissible. Valid modes - ['async', 'legacy']".format(oneViewDetails["scmb_mode"])
+        logging.error(err)
+        raise Exception(err)
+
+
+##################################################################
+# Validate the NodeStats mode
+##################################################################
+def validate_nodestats_mode(oneViewDetails):
+    if oneViewDetails["nodestats_mode"] not in ('full', 'changes'):
+        err = "NodeStats mode - \"{}\" is not permissible. Valid modes - ['full', 'changes']".format(oneViewDetails["nodestats_mode"])
+        logging.error(err)
+        raise Exception(err)
+
+
+##################################################################
+# Validate the utilization threshold of the congested ports
+##################################################################
+def validate_port_util_threshold(oneViewDetails):
+    if not 0 <= oneViewDetails["port_util_threshold"] <= 100:
+        err = "Port utilization threshold - \"{}\" is not permissible. Should be between 0 and 100".format(oneViewDetails["port_util_threshold"])
+        logging.error(err)
+        raise Exception(err)
+
+
 ##################################################################
 # Validate hardware types give in input file
 # Function needs to be added with new parameters when updated in Json
@@ -218,3 +476,13 @@ def validate_alert_types(oneViewDetails):
             raise Exception(err)
 
 
+##################################################################
+# Validate the downsampling step of the time-series store. The
+# segments are downsampled one by one, the step has to divide them.
+##################################################################
+def validate_timeseries_downsample_step(oneViewDetails):
+    step = oneViewDetails["timeseries_downsample_step"]
+    if step <= 0 or SEGMENT_SECONDS % step:
+        err = "Time-series downsample step - \"{}\" is not permissible. Should divide {} seconds".format(step, SEGMENT_SECONDS)
+        logging.error(err)
+        raise Exception(err)
@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import logging
+import signal
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds (sec) of the latency buckets, 100 usec to ~105 sec
+LATENCY_BOUNDS = [0.0001 * 2 ** exponent for exponent in range(21)]
+
+
+##################################################################
+# Latency histogram with fixed, doubling buckets. Percentiles are
+# the upper bound of the bucket they fall in (within a factor 2).
+##################################################################
+class Histogram(object):
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, percent):
+        rank = self.count * percent / 100.0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {'count': self.count, 'avg': self.total / self.count if self.count else 0.0,
+                    'p50': self.percentile(50), 'p99': self.percentile(99), 'max': self.max}
+
+    def summary(self):
+        with self._lock:
+            if not self.count:
+                return "count = 0"
+            return "count = {}, avg = {:.4f} sec, p50 <= {:.4f} sec, p99 <= {:.4f} sec, max = {:.4f} sec".format(
+                self.count, self.total / self.count, self.percentile(50), self.percentile(99), self.max)
+
+
+class Counter(object):
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def add(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+##################################################################
+# Named histograms and counters of the extractor.
+##################################################################
+class Registry(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._started = time.time()
+        # Counter values at the previous summary, for the rates
+        self._lastSummary = self._started
+        self._lastValues = {}
+
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def counter(self, name):
+        counter = self._counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(name, Counter())
+        return counter
+
+    ##################################################################
+    # {'histograms': {name: snapshot}, 'counters': {name: value}}
+    ##################################################################
+    def snapshot(self):
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = list(self._counters.items())
+        return {'histograms': dict((name, histogram.snapshot()) for name, histogram in histograms),
+                'counters': dict((name, counter.value) for name, counter in counters)}
+
+    ##################################################################
+    # One line per histogram and counter, the counters with their
+    # rate since the previous summary.
+    ##################################################################
+    def summary(self):
+        # Histograms and counters are added by other threads meanwhile
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = list(self._counters.items())
+            now = time.time()
+            elapsed = max(now - self._lastSummary, 1e-6)
+            lastValues = self._lastValues
+            values = dict((name, counter.value) for name, counter in counters)
+            self._lastValues = values
+            self._lastSummary = now
+
+        lines = ["Stats over {:.0f} sec (uptime {:.0f} sec)".format(elapsed, now - self._started)]
+        for name, histogram in histograms:
+            lines.append("  {}: {}".format(name, histogram.summary()))
+        for name, value in sorted(values.items()):
+            lines.append("  {}: total = {}, {:.1f}/sec".format(
+                name, value, (value - lastValues.get(name, 0)) / elapsed))
+        return "\n".join(lines)
+
+
+stats = Registry()
+
+_dumpRequested = threading.Event()
+_reporter = None
+
+
+def observe(name, value):
+    stats.histogram(name).observe(value)
+
+
+def count(name, amount=1):
+    stats.counter(name).add(amount)
+
+
+def log_summary():
+    # At the configured level at least, so the summary always reaches activity.log
+    logging.log(max(logging.INFO, logging.getLogger().getEffectiveLevel()), stats.summary())
+
+
+##################################################################
+# Log the stats summary every 'interval' seconds (0 for none) and
+# on SIGUSR1. The signal handler only wakes the reporter thread, so
+# nothing is logged from inside the handler. Call from the main
+# thread.
+##################################################################
+def start_reporting(interval=300, signum=getattr(signal, 'SIGUSR1', None)):
+    global _reporter
+    if _reporter is not None:
+        return
+
+    if signum is not None:
+        signal.signal(signum, lambda signalNumber, frame: _dumpRequested.set())
+
+    def run():
+        while True:
+            _dumpRequested.wait(interval or None)
+            _dumpRequested.clear()
+            try:
+                log_summary()
+            except Exception as e:
+                logging.error("Error in logging the stats : {}".format(e))
+
+    _reporter = threading.Thread(target=run, name="stats-reporter")
+    _reporter.daemon = True
+    _reporter.start()
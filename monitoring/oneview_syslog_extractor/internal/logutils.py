@@ -16,44 +16,222 @@
 ###
 
 import logging
-import json
 import os
+import time
 import multiprocessing as mp
-from datetime import datetime
+
+import internal.instrumentation as instrumentation
+from internal.syslog_writer import SyslogWriter
+from internal.syslog_sinks import create_sinks
+from internal.checkpoint import CheckpointManager
+from internal.server_inventory import ServerInventory
+from internal.snapshot_store import SnapshotStore
+from internal.timeseries_store import TimeSeriesStore, seriesKey
+from internal.port_rates import PortRateTracker, parseSpeed
+from internal.metrics_exporter import MetricsExporter, UTILIZATION_FAMILIES
+from internal.syslog_formatter import SyslogFormatter
+from internal.snow_pipeline import SnowPipeline, alert_to_tokens
 
 # Multiprocessing lock for writing to syslog
 lock = mp.Lock()
 
+# Single writer stage for the syslog file. Started by initialize_logging()
+syslogWriter = None
+
+# Formatter of the syslog records. Set by initialize_logging()
+syslogFormatter = SyslogFormatter()
+
+# In-process pipeline to the ServiceNow forwarder. Set by initialize_pipeline()
+alertPipeline = None
+auditSyslog = True
+
+# Alert checkpoints. One manager per process, created on first use
+checkpointSettings = {'flushInterval': 1.0, 'flushMessages': 100}
+checkpointManager = None
+checkpointPid = None
+
 # No mapping available for UNKNOWN (Assuming the priority of Notice as UNKNOWN)
 syslogStatusMap = {'CRITICAL':2, 'ERROR': 3, 'WARNING':4, 'UNKNOWN': 5, 'OK':6, 'DEBUG':7}
 EXECUTION_LOG = "activity.log"
-OV_ALERT_PARAMS = {"activeAlerts": ["alertState", "Active", ".timestamp"], "hpeOVRSAlerts": ["serviceEventSource", "true", ".serviceInfoTimestamp"]}
+# Checkpoint files of the alert classes are in internal/checkpoint.py
+OV_ALERT_PARAMS = {"activeAlerts": ["alertState", "Active"], "hpeOVRSAlerts": ["serviceEventSource", "true"]}
+
+# Server hardware index (uuid -> S/N and OS hostname) shared by all the
+# processes. Created by initialize_inventory() before the pool is forked.
+serverInventory = None
+
+# Last status/state of the polled resources, shared by all the processes.
+# Created by initialize_snapshots() before the pool is forked.
+snapshotStore = None
+
+# Local store of every polled utilization sample and port counter.
+# Created by initialize_timeseries() when a directory is configured.
+timeseriesStore = None
+
+# Last octet counters of the linked ports, for their rates.
+# Created by initialize_port_rates().
+portRates = None
+
+# Prometheus endpoint of the polled statistics.
+# Created by initialize_metrics_exporter() when a port is configured.
+metricsExporter = None
+
+
+##################################################################
+# Create the shared server hardware index.
+##################################################################
+def initialize_inventory(capacity=8192):
+    global serverInventory
+    serverInventory = ServerInventory(capacity)
+    return serverInventory
+
+
+##################################################################
+# Create the shared snapshot store of the polled resources.
+##################################################################
+def initialize_snapshots(capacity=16384):
+    global snapshotStore
+    snapshotStore = SnapshotStore(capacity)
+    return snapshotStore
+
+
+##################################################################
+# Create the time-series store of the polled statistics and start
+# its retention/downsampling.
+##################################################################
+def initialize_timeseries(directory, retention=30 * 86400, downsampleAfter=86400, downsampleStep=300):
+    global timeseriesStore
+    timeseriesStore = TimeSeriesStore(directory, retention=retention,
+                                      downsampleAfter=downsampleAfter, downsampleStep=downsampleStep)
+    timeseriesStore.startMaintenance()
+    logging.info("Time-series store : {}, retention = {} sec, downsampling after {} sec to {} sec".format(
+        directory, retention, downsampleAfter, downsampleStep))
+    return timeseriesStore
+
+
+##################################################################
+# Create the rate tracker of the linked ports. Ports at or above
+# 'threshold' percent of their speed are flagged as congested.
+##################################################################
+def initialize_port_rates(threshold=80.0):
+    global portRates
+    portRates = PortRateTracker(threshold)
+    return portRates
+
+
+##################################################################
+# Serve the polled statistics on http://address:port/metrics
+##################################################################
+def initialize_metrics_exporter(port, address=""):
+    global metricsExporter
+    metricsExporter = MetricsExporter(port, address)
+    metricsExporter.start()
+    return metricsExporter
+
+
+##################################################################
+# Exporter samples of the newest values of a utilization response
+# (metricList) of a 'server' or 'enclosure'. Empty when the exporter
+# is off.
+##################################################################
+def utilizationSamples(resource, resourceName, metricList):
+    if metricsExporter is None:
+        return []
+    samples = []
+    for metrics in metricList:
+        family = UTILIZATION_FAMILIES.get((resource, metrics["metricName"]))
+        if family and metrics.get("metricSamples"):
+            samples.append((family, ((resource, resourceName),), metrics["metricSamples"][0][1]))
+    return samples
+
+
+##################################################################
+# Exporter samples of a linked port, from its members and its
+# rates (None before the second poll).
+##################################################################
+def portSamples(interconnectName, portName, members, rates=None):
+    if metricsExporter is None:
+        return []
+    labels = (('interconnect', interconnectName), ('port', portName))
+    samples = [('oneview_port_receive_octets_total', labels, members["IfInOctets"]),
+               ('oneview_port_transmit_octets_total', labels, members["IfOutOctets"]),
+               ('oneview_port_speed_bits_per_second', labels, parseSpeed(members["Speed"]))]
+    if rates:
+        samples += [('oneview_port_receive_bits_per_second', labels, rates['inBps']),
+                    ('oneview_port_transmit_bits_per_second', labels, rates['outBps']),
+                    ('oneview_port_receive_utilization_percent', labels, rates['inUtilization']),
+                    ('oneview_port_transmit_utilization_percent', labels, rates['outUtilization']),
+                    ('oneview_port_congested', labels, int(rates['congested']))]
+    return samples
+
+
+##################################################################
+# Replace the exported samples of a collector of an appliance.
+##################################################################
+def publishMetrics(oneviewHost, group, samples):
+    if metricsExporter is not None:
+        metricsExporter.publish(oneviewHost, group, samples)
+
+
+##################################################################
+# Store all the samples of a utilization response (metricList).
+# No-op when the time-series store is off.
+##################################################################
+def recordUtilization(oneviewHost, resourceType, resourceName, metricList):
+    if timeseriesStore is None:
+        return
+    for metrics in metricList:
+        key = seriesKey(oneviewHost, resourceType, resourceName, metrics["metricName"])
+        timeseriesStore.append(key, metrics.get("metricSamples") or [])
+
+
+##################################################################
+# Store one sample of each of the 'values' {metric: value} of a
+# resource, taken at 'timestamp' (ms).
+##################################################################
+def recordSamples(oneviewHost, resourceType, resourceName, timestamp, values):
+    if timeseriesStore is None:
+        return
+    for metric, value in values.items():
+        timeseriesStore.append(seriesKey(oneviewHost, resourceType, resourceName, metric), [(timestamp, value)])
 
-serverMap = {}
 
 ##################################################################
 # Create a server map with S/N and OS hostname. Add this info in
 # the syslog message if alert is from server-hardware.
+#
+# Called at startup and periodically afterwards to reconcile the
+# index with the full listing of the appliance.
 ##################################################################
 def create_server_map(oneview_client):
-    global serverMap
+    if serverInventory is None:
+        initialize_inventory()
+
     logging.info("Getting hardware info..")
+    host = oneview_client.connection.get_host()
     serverHardwareAll = oneview_client.server_hardware.get_all()
     print("Num servers = {}".format(len(serverHardwareAll)))
     if serverHardwareAll:
-        for server in serverHardwareAll:
-            temp = {}
-            temp['serverSerialNum'] = server['serialNumber']
-            #print(json.dumps(server, indent=4))
-            temp['serverName'] = server['serverName']
-            serverMap[server['uuid']] = temp
+        updated, removed = serverInventory.reconcile(host, serverHardwareAll)
+        logging.info("Server inventory of {} reconciled. {} servers, {} removed. Total = {}".format(
+            host, updated, removed, len(serverInventory)))
     else:
         logging.warning("No server hardware present. Re check once. Global server map not updated.")
 
-    logging.debug("Following are teh S/N and hostnames of server-hardware in system.")
-    logging.debug(json.dumps(serverMap, indent=4, sort_keys=True))
 
-    #print(json.dumps(serverMap, sort_keys=True, indent=4))
+##################################################################
+# Apply a scmb.server-hardware.# change message to the server index
+##################################################################
+def update_server_map(oneviewHost, changeType, resource):
+    if serverInventory is None or not resource.get('uuid'):
+        return
+
+    if changeType == 'Deleted':
+        serverInventory.remove(resource['uuid'])
+        logging.info("Server {} removed from the inventory".format(resource['uuid']))
+    elif changeType in ('Created', 'Updated'):
+        serverInventory.put(resource['uuid'], oneviewHost,
+                            resource.get('serialNumber'), resource.get('serverName'))
 
 
 
@@ -62,8 +240,12 @@ def create_server_map(oneview_client):
 # Initialize for the logging.
 #
 ##################################################################
-def initialize_logging(syslogDir, syslogFile):
+def initialize_logging(syslogDir, syslogFile, flushLines=500, flushInterval=1.0, fsyncPolicy='batch',
+                       checkpointFlushMs=1000, checkpointFlushMessages=100, syslogFormat='bracket',
+                       syslogSinks='file', retryLines=100000):
     global syslog_file
+    global syslogWriter
+    global syslogFormatter
 
     # Initialize the log file path, log format and log level
     #logfiledir = os.getcwd() + os.sep + "oneview_logs"
@@ -88,11 +270,116 @@ def initialize_logging(syslogDir, syslogFile):
                         datefmt='%d-%m-%Y:%H:%M:%S',
                         level=logging.WARNING)
 
+    syslogFormatter = SyslogFormatter(syslogFormat)
+
+    # Start the writer before any worker process is forked so that all
+    # of them push their messages to the same queue.
+    sinks = create_sinks(syslogSinks, syslog_file, fsyncPolicy=fsyncPolicy)
+    syslogWriter = SyslogWriter(syslog_file, flushLines=flushLines,
+                                flushInterval=flushInterval, sinks=sinks,
+                                retryLines=retryLines)
+    syslogWriter.start()
+
+    checkpointSettings['flushInterval'] = checkpointFlushMs / 1000.0
+    checkpointSettings['flushMessages'] = checkpointFlushMessages
+
+
+##################################################################
+# Drain the pending syslog messages to the file. Called on exit.
+#
+##################################################################
+def shutdown_logging():
+    global alertPipeline
+    if alertPipeline and alertPipeline.ownerPid == os.getpid():
+        alertPipeline.stop()
+        alertPipeline = None
+
+    if syslogWriter:
+        syslogWriter.stop()
+
+    if timeseriesStore is not None:
+        timeseriesStore.close()
+
+    if metricsExporter is not None:
+        metricsExporter.stop()
+
+    # After the writer is drained, so the checkpoint never gets ahead of the syslog file
+    if checkpointManager and checkpointPid == os.getpid():
+        checkpointManager.close()
+
+
+##################################################################
+# Hand the alerts straight to the ServiceNow forwarder. With 'audit'
+# off they are no longer written to the syslog sinks.
+##################################################################
+def initialize_pipeline(servicenowDir, audit=True):
+    global alertPipeline
+    global auditSyslog
+
+    try:
+        alertPipeline = SnowPipeline(servicenowDir)
+    except Exception as e:
+        err = "ServiceNow pipeline could not be started : {}".format(e)
+        logging.error(err)
+        raise Exception(err)
+    auditSyslog = audit
+    print("Alerts are sent to ServiceNow in-process. Syslog audit = {}".format(audit))
+
+
+##################################################################
+# Checkpoint manager of the current process. The flusher thread does
+# not survive a fork, so every process gets its own manager.
+##################################################################
+def getCheckpoints():
+    global checkpointManager
+    global checkpointPid
+
+    if checkpointManager is None or checkpointPid != os.getpid():
+        checkpointManager = CheckpointManager(**checkpointSettings)
+        checkpointPid = os.getpid()
+    return checkpointManager
+
+
+##################################################################
+# Ask to be told when the messages written so far by this process
+# are durable in the syslog file. Returns a token for syslogSynced().
+##################################################################
+def requestSyslogSync():
+    if syslogWriter:
+        return syslogWriter.requestSync()
+    # Without the writer stage every message is written synchronously
+    return None
+
+
+def syslogSynced(token):
+    return token is None or syslogWriter.isSynced(token)
+
+
+def waitSyslogSynced(token, timeout=None):
+    return token is None or syslogWriter.waitSynced(token, timeout)
+
+# Time and size of the writeToSyslog calls, for the stats summary
+_writeLatency = instrumentation.stats.histogram("writeToSyslog")
+_writeBytes = instrumentation.stats.counter("writeToSyslog bytes")
+
 ###########################################################################################
 # Function to write message to a log file
 #
 ###########################################################################################
 def writeToSyslog(message):
+    startTime = time.perf_counter()
+    try:
+        _writeToSyslog(message)
+    finally:
+        _writeLatency.observe(time.perf_counter() - startTime)
+        _writeBytes.add(len(message) + 1)
+
+
+def _writeToSyslog(message):
+    if syslogWriter:
+        syslogWriter.write(message)
+        return
+
     lock.acquire()
     try:
         with open(syslog_file, 'a+')  as logFile:
@@ -105,7 +392,6 @@ def writeToSyslog(message):
 
 
 def createSyslog(alertObj, oneviewHost):
-    global serverMap
     created_date = alertObj['created']
     severity = alertObj['severity'].upper()
     alertId = alertObj['uri'].split('/')[-1]
@@ -113,52 +399,39 @@ def createSyslog(alertObj, oneviewHost):
     #print (alertObj)
     resource_type = alertObj['physicalResourceType']
     resource_name = alertObj['associatedResource']['resourceName']
-    serviceEventInfo = alertObj['serviceEventDetails']
 
     # If alert happens from server-hardware, logging S/N and OS hostname
     resourceDetails = ""
     try:
         if resource_type == "server-hardware":
             serverUid = alertObj['associatedResource']['resourceUri'].split('/')[-1]
-            #resourceDetails = resource_name + '*' + serverMap[serverUid]["serverSerialNum"]
-            resourceDetails = serverMap[serverUid]["serverName"] + ';' + serverMap[serverUid]["serverSerialNum"]
+            server = serverInventory.get(serverUid)
+            resourceDetails = server["serverName"] + ';' + server["serverSerialNum"]
             print("resourceDetails - {}".format(resourceDetails))
     except Exception as e:
         logging.warning("Unable to get server S/N and OS hostname. Sending only server details.")
         resourceDetails = resource_name
 
-    if alertObj['serviceEventSource']:
-       serviceEventInfo = "{}|{}|{}".format(serviceEventInfo['caseId'],
-                                              serviceEventInfo['primaryContact'],
-                                              str(serviceEventInfo['remoteSupportState']))
-       serviceEventInfo = "{" + serviceEventInfo + "}"
-
-    alert_info = "{}|{}|{}|{}|{}".format(alertId, alertObj['healthCategory'],
-                                         alertObj['alertState'],
-                                         alertObj['assignedToUser'],
-                                         serviceEventInfo)
+    serviceEvent = alertObj['serviceEventDetails'] if alertObj['serviceEventSource'] else None
 
     childEvents = []
     if alertObj['childAlerts']:
-        for element in alertObj['childAlerts']:
-            #print(element)
-            tempChildId = int(element.split('/')[-1])
-            childEvents.append(tempChildId)
-
-    alert_info = "{}|{}|{}|{}|{}|{}".format(alertId,
-                                         alertObj['healthCategory'],
-                                         alertObj['alertState'],
-                                         alertObj['assignedToUser'],
-                                         serviceEventInfo,
-                                         childEvents)
-
+        childEvents = [int(element.split('/')[-1]) for element in alertObj['childAlerts']]
 
     if alertObj['correctiveAction']:
         desc = alertObj['description'] + alertObj['correctiveAction']
     else:
         desc = alertObj['description']
 
-    msg = "<{status}> {timestamp} {oneviewHost} oneview {resource_type} [{resourceDetails}] [{alert_info}] [{msg_info}]".format(timestamp=created_date, status=syslogStatusMap[severity], resource_type=resource_type, resourceDetails=resourceDetails, alert_info=alert_info, msg_info=desc, oneviewHost=oneviewHost)
+    if alertPipeline:
+        alertPipeline.submit(alert_to_tokens(alertObj, oneviewHost, resourceDetails, desc))
+        if not auditSyslog:
+            return
+
+    msg = syslogFormatter.alert(syslogStatusMap[severity], created_date, oneviewHost,
+                                resource_type, resourceDetails, alertId,
+                                alertObj['healthCategory'], alertObj['alertState'],
+                                alertObj['assignedToUser'], serviceEvent, childEvents, desc)
 
     writeToSyslog(msg)
 
@@ -167,39 +440,71 @@ def createSyslog(alertObj, oneviewHost):
 # Function to log active alerts triggered/updated after the
 # the last logged time
 #
+# The alerts are filtered on the appliance ('modified' after the
+# checkpoint) and read page by page in 'modified' order. Paging is
+# keyed on the last 'modified' timestamp logged rather than on an
+# offset, as alerts keep changing while we read. Alerts sharing the
+# boundary timestamp are de-duplicated by URI. The checkpoint moves
+# forward only once the page is durable in the syslog file.
 ##################################################################
-def logAlerts(oneview_client, alertIdentifier):
+def logAlerts(oneview_client, alertIdentifier, pageSize=500):
 
     alertParams = OV_ALERT_PARAMS[alertIdentifier]
-    activeAlerts = oneview_client.alerts.get_by(alertParams[0], alertParams[1])
-    lastTimestamp = None
-    newTimestamp = None
+    host = oneview_client.connection.get_host()
+    checkpoints = getCheckpoints()
 
-    try:
-        with open(alertParams[2], 'r') as timestampFile:
-            lastTimestamp = timestampFile.readlines()
-            if lastTimestamp:
-                lastTimestamp = datetime.strptime(lastTimestamp[0], '%Y-%m-%dT%H:%M:%S.%fZ')
-    except IOError as error:
+    lastTimestamp = checkpoints.get(host, alertIdentifier)
+    if not lastTimestamp:
         print("File not present, collecting all the running {} alerts".format(alertIdentifier))
 
-    for alert in activeAlerts:
-        alertModTime = datetime.strptime(alert['modified'], '%Y-%m-%dT%H:%M:%S.%fZ')
-        if lastTimestamp and (alertModTime >= lastTimestamp):
-            continue
-
-        newTimestamp = alert['modified']
-        createSyslog(alert, oneview_client.connection.get_host())
-
-    if newTimestamp:
-        writeTimestamp(newTimestamp, alertParams[2])
+    boundaryUris = set()    # Alerts logged with modified == lastTimestamp
+    start = 0
+    numAlerts = 0
+
+    while True:
+        filters = ["{}='{}'".format(alertParams[0], alertParams[1])]
+        if lastTimestamp:
+            # '>' from the checkpoint, '>=' within the run to get the
+            # rest of the alerts sharing the boundary timestamp
+            operator = '>=' if boundaryUris else '>'
+            filters.append("modified{}'{}'".format(operator, lastTimestamp))
+
+        page = oneview_client.alerts.get_all(start, pageSize, filters, '', 'modified:ascending')
+
+        newAlerts = [alert for alert in page
+                     if alert['modified'] != lastTimestamp or alert['uri'] not in boundaryUris]
+        for alert in newAlerts:
+            createSyslog(alert, host)
+        numAlerts += len(newAlerts)
+
+        advanced = False
+        if newAlerts:
+            newest = newAlerts[-1]['modified']
+            if newest != lastTimestamp:
+                boundaryUris = set()
+                lastTimestamp = newest
+                advanced = True
+            boundaryUris.update(alert['uri'] for alert in newAlerts if alert['modified'] == newest)
+
+            if not waitSyslogSynced(requestSyslogSync(), timeout=60):
+                raise Exception("Syslog writer did not sync the {} alerts within 60 sec".format(alertIdentifier))
+            checkpoints.update(host, alertIdentifier, lastTimestamp)
+            checkpoints.flush()
+
+        if len(page) < pageSize:
+            break
+
+        # A page full of alerts with the boundary timestamp does not move
+        # the key forward, step over it with the offset
+        start = 0 if advanced else start + pageSize
+
+    logging.info("Logged {} {} alerts of {}".format(numAlerts, alertIdentifier, host))
 
 ##################################################################
-# Function to update the timestamp file from the last received
+# Function to update the timestamp checkpoint from the last received
 # message from SCMB
 #
 ##################################################################
-def writeTimestamp(timestamp, fileName):
-    with open(fileName, 'w') as timestampFile:
-        timestampFile.write(timestamp)
+def writeTimestamp(timestamp, host, alertIdentifier="activeAlerts"):
+    getCheckpoints().update(host, alertIdentifier, timestamp)
 
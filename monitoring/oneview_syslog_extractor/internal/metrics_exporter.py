@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import logging
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Type and help of the exported families
+METRIC_FAMILIES = {
+    'oneview_server_ambient_temperature_celsius': ('gauge', "Ambient temperature of the server hardware"),
+    'oneview_server_average_power_watts': ('gauge', "Average power of the server hardware"),
+    'oneview_server_peak_power_watts': ('gauge', "Peak power of the server hardware"),
+    'oneview_server_power_cap_watts': ('gauge', "Power cap of the server hardware"),
+    'oneview_server_cpu_average_freq_hertz': ('gauge', "Average CPU frequency of the server hardware"),
+    'oneview_server_cpu_utilization_percent': ('gauge', "CPU utilization of the server hardware"),
+    'oneview_enclosure_ambient_temperature_celsius': ('gauge', "Ambient temperature of the enclosure"),
+    'oneview_enclosure_average_power_watts': ('gauge', "Average power of the enclosure"),
+    'oneview_enclosure_peak_power_watts': ('gauge', "Peak power of the enclosure"),
+    'oneview_port_receive_octets_total': ('counter', "Octets received on the linked port (rfc1213IfInOctets)"),
+    'oneview_port_transmit_octets_total': ('counter', "Octets sent on the linked port (rfc1213IfOutOctets)"),
+    'oneview_port_speed_bits_per_second': ('gauge', "Operational speed of the linked port"),
+    'oneview_port_receive_bits_per_second': ('gauge', "Receive rate of the linked port over the last poll"),
+    'oneview_port_transmit_bits_per_second': ('gauge', "Transmit rate of the linked port over the last poll"),
+    'oneview_port_receive_utilization_percent': ('gauge', "Receive utilization of the linked port"),
+    'oneview_port_transmit_utilization_percent': ('gauge', "Transmit utilization of the linked port"),
+    'oneview_port_congested': ('gauge', "1 when the linked port is above the utilization threshold"),
+}
+
+# Family of the utilization metrics, by resource and OneView metricName
+UTILIZATION_FAMILIES = {
+    ('server', 'AmbientTemperature'): 'oneview_server_ambient_temperature_celsius',
+    ('server', 'AveragePower'): 'oneview_server_average_power_watts',
+    ('server', 'PeakPower'): 'oneview_server_peak_power_watts',
+    ('server', 'PowerCap'): 'oneview_server_power_cap_watts',
+    ('server', 'CpuAverageFreq'): 'oneview_server_cpu_average_freq_hertz',
+    ('server', 'CpuUtilization'): 'oneview_server_cpu_utilization_percent',
+    ('enclosure', 'AmbientTemperature'): 'oneview_enclosure_ambient_temperature_celsius',
+    ('enclosure', 'AveragePower'): 'oneview_enclosure_average_power_watts',
+    ('enclosure', 'PeakPower'): 'oneview_enclosure_peak_power_watts',
+}
+
+_LABEL_ESCAPE = re.compile(r'[\\"\n]')
+_LABEL_ESCAPES = {'\\': '\\\\', '"': '\\"', '\n': '\\n'}
+
+
+def _labels(labels):
+    return ",".join('{}="{}"'.format(name, _LABEL_ESCAPE.sub(lambda match: _LABEL_ESCAPES[match.group()], str(value)))
+                    for name, value in labels)
+
+
+##################################################################
+# Prometheus text exposition of the polled statistics.
+#
+# Each collector publishes all its samples of an appliance at once
+# (a group), replacing its previous ones so that removed resources go
+# away. The exposition is rendered on the first scrape after a
+# publish and served from the cache until the next one, so a scrape
+# never waits on OneView.
+##################################################################
+class MetricsExporter(object):
+
+    def __init__(self, port, address=""):
+        self.port = port
+        self.address = address
+        self._lock = threading.Lock()
+        self._groups = {}        # (host, group) -> [(family, labels, value)]
+        self._generation = 0
+        self._rendered = b""
+        self._renderedGeneration = -1
+        self._server = None
+        self._thread = None
+
+    ##################################################################
+    # Replace the samples [(family, ((label, value), ..), value), ..]
+    # of a collector ('group') of an appliance.
+    ##################################################################
+    def publish(self, host, group, samples):
+        numeric = []
+        for family, labels, value in samples:
+            try:
+                numeric.append((family, labels, float(value)))
+            except (TypeError, ValueError):
+                # Missing counters, PowerCap of 'None', ...
+                continue
+        with self._lock:
+            self._groups[(host, group)] = numeric
+            self._generation += 1
+
+    def render(self):
+        with self._lock:
+            if self._renderedGeneration == self._generation:
+                return self._rendered
+            families = {}
+            for host, group in sorted(self._groups):
+                for family, labels, value in self._groups[(host, group)]:
+                    families.setdefault(family, []).append(
+                        "{}{{{}}} {}".format(family, _labels((('appliance', host),) + labels), value))
+
+            lines = []
+            for family in sorted(families):
+                metricType, description = METRIC_FAMILIES.get(family, ('gauge', family))
+                lines.append("# HELP {} {}".format(family, description))
+                lines.append("# TYPE {} {}".format(family, metricType))
+                lines.extend(families[family])
+            self._rendered = ("\n".join(lines) + "\n").encode('utf-8') if lines else b""
+            self._renderedGeneration = self._generation
+            return self._rendered
+
+    ##################################################################
+    # Serve GET /metrics from a background thread.
+    ##################################################################
+    def start(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exporter.render()
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug("Metrics endpoint: " + format, *args)
+
+        self._server = ThreadingHTTPServer((self.address, self.port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-exporter")
+        self._thread.daemon = True
+        self._thread.start()
+        logging.info("Metrics endpoint listening on {}:{}/metrics".format(self.address or "*", self._server.server_port))
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
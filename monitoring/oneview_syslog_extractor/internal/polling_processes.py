@@ -16,105 +16,193 @@
 ###
 
 #from common.utils import *
-import multiprocessing as mp
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from time import sleep
 
 import internal.logutils as ovlog
 from ov_client.oneview_client import *
 
+# URI prefixes of the resources listed by each NodeStats category
+HOST_STATUS_URIS = {
+    'server-hardware': ['/rest/server-hardware/'],
+    'enclosures': ['/rest/enclosures/'],
+    'interconnects': ['/rest/interconnects/', '/rest/sas-interconnects/', '/rest/logical-interconnects/']
+}
+
 ###########################################################################################
-# Function which uses multiprocessing for updating hosts status, interconnects ports status
-# and enclosure power stats
+# Function which uses a thread pool for updating hosts status, interconnects ports status
+# and enclosure power stats. The collectors share the pooled connection of the appliance.
+#
+# In supervisor mode the pool is shared by all the appliances and 'stopEvent' ends the loop
+#
+# In 'changes' NodeStats mode only the status/state transitions of the resources are
+# logged, with a full listing every 'heartbeat' seconds
 ###########################################################################################
-def process_threads(oneview_client, hardwareCategory, refreshDuration=600):
-    threadPool = mp.Pool(6)
+def process_threads(oneview_client, hardwareCategory, refreshDuration=600, maxInFlight=8,
+                    threadPool=None, stopEvent=None, nodestatsMode='full', heartbeat=3600):
+    ownPool = threadPool is None
+    if ownPool:
+        threadPool = ThreadPoolExecutor(max_workers=6)
 
     # Filtering interested hardwares for status update.
+    if isinstance(hardwareCategory, str):
+        hardwareCategory = hardwareCategory.split(':')
     hardwareCategory = [hardware for hardware in hardwareCategory if hardware not in ('sas-interconnects','logical-interconnects')]
-    while True:
+    while not (stopEvent and stopEvent.is_set()):
         logging.info("Calling update enclosure in thread")
-        threadPool.apply_async(update_enclosures_stats, args=(oneview_client,))
+        _submit(threadPool, update_enclosures_stats, oneview_client, maxInFlight)
 
         logging.info("Calling update ports status in thread.")
-        threadPool.apply_async(update_ports_status, args=(oneview_client,))
+        _submit(threadPool, update_ports_status, oneview_client, maxInFlight)
 
         logging.info("Calling update server stats in thread.")
-        threadPool.apply_async(update_server_stats, args=(oneview_client,))
+        _submit(threadPool, update_server_stats, oneview_client, maxInFlight)
 
         for hardware in hardwareCategory:
             logging.info("Calling update {} status in thread.".format(hardware))
-            threadPool.apply_async(update_all_hosts_status, args=(oneview_client, hardware))
+            _submit(threadPool, update_all_hosts_status, oneview_client, hardware, nodestatsMode == 'changes', heartbeat)
 
-        sleep(refreshDuration)
+        if stopEvent:
+            stopEvent.wait(refreshDuration)
+        else:
+            sleep(refreshDuration)
 
-    threadPool.close()
-    threadPool.join()
+    if ownPool:
+        threadPool.shutdown()
 
 
 ###########################################################################################
-# Function which uses multiprocessing for updating hosts status, interconnects ports status
-# and enclosure power stats
+# Run a collector on the pool and log its failure
 ###########################################################################################
-def collect_hpeov_service_info(oneview_client, refreshDuration=120):
-    threadPool = mp.Pool(6)
+def _submit(threadPool, collector, *args):
+    def done(future):
+        if future.exception():
+            logging.error("Error in {} : {}".format(collector.__name__, future.exception()))
 
-    while True:
+    threadPool.submit(collector, *args).add_done_callback(done)
+
+
+###########################################################################################
+# Function to log the HPE OneView remote support (service) alerts periodically
+###########################################################################################
+def collect_hpeov_service_info(oneview_client, refreshDuration=120, stopEvent=None):
+    while not (stopEvent and stopEvent.is_set()):
         ovlog.logAlerts(oneview_client, "hpeOVRSAlerts")
-        sleep(refreshDuration)
+        if stopEvent:
+            stopEvent.wait(refreshDuration)
+        else:
+            sleep(refreshDuration)
+
+###########################################################################################
+# Function to reconcile the server index with the full server hardware listing periodically.
+# The SCMB server-hardware messages keep it up to date in between.
+###########################################################################################
+def reconcile_server_map(oneview_client, refreshDuration=3600, stopEvent=None):
+    while not stopEvent.wait(refreshDuration):
+        try:
+            ovlog.create_server_map(oneview_client)
+        except Exception as e:
+            logging.error("Error in reconciling the server inventory : {}".format(e))
 
-    threadPool.close()
-    threadPool.join()
 
 ###########################################################################################
 # Function to update all ports status
 #
+# With the port rate tracker installed, the in/out rates and utilization computed from the
+# counters of the previous cycle are logged with the raw counters, one PortRates record per
+# port. The ports at or above the utilization threshold are logged as warnings.
 ###########################################################################################
-def update_ports_status(oneview_client):
-    allPortStats = get_port_statistics(oneview_client)
+def update_ports_status(oneview_client, maxInFlight=8):
+    allPortStats = get_port_statistics(oneview_client, maxInFlight)
 
     logging.info("Updating all ports status in logfile.")
-    data = {}
+    oneview_ip = oneview_client.connection.get_host()
+    now = time.time()
+    timestamp = int(now * 1000)
+    metricSamples = []
     for interconnect in allPortStats:
-        data['name'] = interconnect["interconnectName"]
+        rates = {}
+        if ovlog.portRates is not None:
+            rates = update_port_rates(oneview_ip, interconnect, now)
 
         for port in interconnect['linkedPorts']:
-            data['timestamp'] = datetime.now().isoformat()[:-3] + "Z"
-            data['portName']  = port["portName"]
-            data['status'] = port["members"]["Status"]
-            data['speed']  = port["members"]["Speed"]
-            data['adapterPort'] = port["members"]["adopterPort"]
-            data['recv_octets'] = port["members"]["IfInOctets"]
-            data['transmit_octets'] = port["members"]["IfOutOctets"]
-
-            msg = "<{status}> {timestamp} {oneview_ip} oneview PortStats [{interconnect}] [{port}|Transmit={transmit}|Receive={receive}|Speed={speed}|AdaptorPort={adapter}]\n".format(
-                timestamp=data["timestamp"], status=ovlog.syslogStatusMap[data["status"].upper()], interconnect=data['name'], port=data['portName'],
-                transmit=data["transmit_octets"], receive=data["recv_octets"], speed=data['speed'], adapter=data['adapterPort'], oneview_ip=oneview_client.connection.get_host())
+            members = port["members"]
+            ovlog.recordSamples(oneview_ip, "interconnects", interconnect["interconnectName"] + "/" + port["portName"],
+                                timestamp, {"IfInOctets": members["IfInOctets"], "IfOutOctets": members["IfOutOctets"]})
+            msg = ovlog.syslogFormatter.portStats(ovlog.syslogStatusMap[members["Status"].upper()],
+                                                  datetime.now().isoformat()[:-3] + "Z", oneview_ip,
+                                                  interconnect["interconnectName"], port["portName"],
+                                                  members["IfOutOctets"], members["IfInOctets"],
+                                                  members["Speed"], members["adopterPort"])
             ovlog.writeToSyslog(msg)
-            sleep(0.3)
+            metricSamples.extend(ovlog.portSamples(interconnect["interconnectName"], port["portName"],
+                                                   members, rates.get(port["portName"])))
+
+    if ovlog.portRates is not None:
+        ovlog.portRates.retain(oneview_ip, set(interconnect["interconnectName"] for interconnect in allPortStats))
+    ovlog.publishMetrics(oneview_ip, "ports", metricSamples)
+
+
+###########################################################################################
+# Function to log the rates of the linked ports of an interconnect. Returns them by port.
+#
+###########################################################################################
+def update_port_rates(oneview_ip, interconnect, now):
+    linkedPorts = interconnect['linkedPorts']
+    rates = ovlog.portRates.update(oneview_ip, interconnect["interconnectName"], now,
+                                   [(port["portName"], port["members"]["IfInOctets"], port["members"]["IfOutOctets"],
+                                     port["members"]["Speed"]) for port in linkedPorts])
+    congested = 0
+    for port in linkedPorts:
+        portRates = rates.get(port["portName"])
+        if not portRates:
+            continue
+        if portRates['congested']:
+            congested += 1
+        msg = ovlog.syslogFormatter.portRates(ovlog.syslogStatusMap['WARNING' if portRates['congested'] else 'OK'],
+                                              datetime.now().isoformat()[:-3] + "Z", oneview_ip,
+                                              interconnect["interconnectName"], port["portName"],
+                                              portRates['inBps'], portRates['outBps'],
+                                              portRates['inUtilization'], portRates['outUtilization'],
+                                              port["members"]["Speed"], portRates['congested'])
+        ovlog.writeToSyslog(msg)
+
+    if congested:
+        logging.warning("{} congested port(s) on interconnect {}".format(congested, interconnect["interconnectName"]))
+    return rates
 
 
 ###########################################################################################
 # Function to update stats of all enclosures.
 #
 ###########################################################################################
-def update_enclosures_stats(oneview_client):
+def update_enclosures_stats(oneview_client, maxInFlight=8):
     # Get all enclosures
     enclosures = oneview_client.enclosures.get_all()
 
+    # Get the utilization of all enclosures within the OneView API budget
+    allEnclPowerStats = get_utilizations(oneview_client.enclosures, "enclosures.get_utilization",
+                                         [enclosure["uri"] for enclosure in enclosures], maxInFlight)
+
     # Update stats of each enclosure
     logging.info('Updating enclosure powerstats. ')
-    for enclosure in enclosures:
-        process_enclosure_stats(enclosure["name"], enclosure["uri"], oneview_client)
-        sleep(0.3)
+    metricSamples = []
+    for enclosure, enclPowerStats in zip(enclosures, allEnclPowerStats):
+        if enclPowerStats:
+            process_enclosure_stats(enclosure["name"], enclPowerStats, oneview_client)
+            metricSamples.extend(ovlog.utilizationSamples("enclosure", enclosure["name"], enclPowerStats["metricList"]))
+    ovlog.publishMetrics(oneview_client.connection.get_host(), "enclosures", metricSamples)
 
 ###########################################################################################
 # Function to get and proceess enclosure stats
 #
 ###########################################################################################
-def process_enclosure_stats(enclName, URI, oneview_client):
-    enclPowerStats = oneview_client.enclosures.get_utilization(URI)
+def process_enclosure_stats(enclName, enclPowerStats, oneview_client):
     fullMetrics = enclPowerStats["metricList"]
+    # The syslog line has the newest sample, the store keeps them all
+    ovlog.recordUtilization(oneview_client.connection.get_host(), "enclosures", enclName, fullMetrics)
     allEnclosuresStats = []
     encStats = {}
     for metrics in fullMetrics:
@@ -126,30 +214,54 @@ def process_enclosure_stats(enclName, URI, oneview_client):
         encStats = {}
 
     if allEnclosuresStats:
-        status = "<6> {timestamp} {hostname} oneview EnclosureStats [{encName}] [AmbientTemperature={ambTemp} dec C|AveragePower={avgPower} watts|PeakPower={peakPower} watts]\n"\
-            .format(timestamp = allEnclosuresStats[0]["timeStamp"],
-                                hostname  = oneview_client.connection.get_host(),
-                                encName   = enclName,
-                                ambTemp   = allEnclosuresStats[0]["value"],
-                                avgPower  = allEnclosuresStats[1]["value"],
-                                peakPower = allEnclosuresStats[2]["value"])
+        status = ovlog.syslogFormatter.enclosureStats(allEnclosuresStats[0]["timeStamp"],
+                                                      oneview_client.connection.get_host(),
+                                                      enclName,
+                                                      allEnclosuresStats[0]["value"],
+                                                      allEnclosuresStats[1]["value"],
+                                                      allEnclosuresStats[2]["value"])
         ovlog.writeToSyslog(status)
 
 
 ###########################################################################################
 # Function to update all hosts status.
 #
+# In changes-only mode the resources are compared with their snapshot and only the new
+# ones and the status/state transitions are logged. Only the resources modified since the
+# last listing are requested, except for the periodic full listing (heartbeat) which logs
+# every resource and drops the removed ones from the snapshots.
 ###########################################################################################
-def update_all_hosts_status(oneview_client, hardwareCategory):
+def update_all_hosts_status(oneview_client, hardwareCategory, changesOnly=False, heartbeat=3600):
     logging.info('Updating {} status in logfile.'.format(hardwareCategory))
-    response = get_hosts_status(oneview_client,hardwareCategory)
-    if response:
-        for entity in response:
-            hostname = entity['hostname']
-            status = entity['status']
-            corrAction = entity['state']
-            description = entity['model']
-            update_host_status(hostname,status,corrAction,description)
+    oneviewHost = oneview_client.connection.get_host()
+    store = ovlog.snapshotStore if changesOnly else None
+
+    full = True
+    if store is not None:
+        watermark, lastFull = store.getWatermark(oneviewHost, hardwareCategory)
+        full = not watermark or (heartbeat and time.time() - lastFull >= heartbeat)
+
+    response = get_hosts_status(oneview_client, hardwareCategory, None if full else watermark)
+    if not response:
+        return
+
+    numLogged = 0
+    for entity in response:
+        changed = store.observe(oneviewHost, entity['uri'], entity['version'],
+                                entity['status'], entity['state']) if store is not None else True
+        if full or changed:
+            update_host_status(oneviewHost, entity['hostname'], entity['status'], entity['state'], entity['model'])
+            numLogged += 1
+
+    if store is not None:
+        newest = max([entity['modified'] for entity in response] + [watermark])
+        if full:
+            dropped = store.retain(oneviewHost, HOST_STATUS_URIS[hardwareCategory], [entity['uri'] for entity in response])
+            store.setWatermark(oneviewHost, hardwareCategory, newest, time.time())
+            logging.info("Full {} listing: {} resources logged, {} removed".format(hardwareCategory, numLogged, dropped))
+        else:
+            store.setWatermark(oneviewHost, hardwareCategory, newest, lastFull)
+            logging.info("{} changed {} resources out of {} listed".format(hardwareCategory, numLogged, len(response)))
 
 
 ###########################################################################################
@@ -157,7 +269,7 @@ def update_all_hosts_status(oneview_client, hardwareCategory):
 # Called by update_all_hosts_status()
 #
 ###########################################################################################
-def update_host_status(hostName, status,description='Updating status in logfile.',corrAction='None'):
+def update_host_status(oneviewHost, hostName, status,description='Updating status in logfile.',corrAction='None'):
 
     # Empty JSON to hold all relevant information
     data = {}
@@ -166,7 +278,7 @@ def update_host_status(hostName, status,description='Updating status in logfile.
     data["resource_name"] = hostName
     data["correctiveAction"] = corrAction
 
-    if status in nodeStatusMap:
+    if status in ovlog.syslogStatusMap:
         data["description"] = description
         data["status"] = status
     else:
@@ -176,9 +288,9 @@ def update_host_status(hostName, status,description='Updating status in logfile.
         # Node unreachable
         data["status"] = "UNKNOWN"
 
-    msg = "<{status}> {timestamp} {oneview_ip} oneview NodeStats [{hostname}] [{action}|{model}|None]\n".format(
-            timestamp=data["timestamp"], status=ovlog.syslogStatusMap[data["status"].upper()], hostname=hostName,
-            model=data["description"], action=data["correctiveAction"], oneview_ip=oneview_client.connection.get_host())
+    msg = ovlog.syslogFormatter.nodeStats(ovlog.syslogStatusMap[data["status"].upper()], data["timestamp"],
+                                          oneviewHost, hostName,
+                                          data["correctiveAction"], data["description"])
 
     ovlog.writeToSyslog(msg)
 
@@ -187,11 +299,20 @@ def update_host_status(hostName, status,description='Updating status in logfile.
 # Function to update server stats.
 #
 ###########################################################################################
-def update_server_stats(oneview_client):
+def update_server_stats(oneview_client, maxInFlight=8):
     servers = oneview_client.server_hardware.get_all()
-    for server in servers:
-        serverStatsResponse = oneview_client.server_hardware.get_utilization(server["uri"])
+
+    # Get the utilization of all servers within the OneView API budget
+    allServerStats = get_utilizations(oneview_client.server_hardware, "server_hardware.get_utilization",
+                                      [server["uri"] for server in servers], maxInFlight)
+
+    metricSamples = []
+    for server, serverStatsResponse in zip(servers, allServerStats):
+        if not serverStatsResponse:
+            continue
         fullMetrics = serverStatsResponse["metricList"]
+        ovlog.recordUtilization(oneview_client.connection.get_host(), "server-hardware", server["serverName"], fullMetrics)
+        metricSamples.extend(ovlog.utilizationSamples("server", server["serverName"], fullMetrics))
         serverAllStats = []
         serverStats = {}
         for metrics in fullMetrics:
@@ -199,14 +320,18 @@ def update_server_stats(oneview_client):
             epochTimeStamp = metrics["metricSamples"][0][0]/1000 # Timestamp is in millisec.
             serverStats["timeStamp"] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.localtime(epochTimeStamp))
             serverStats["value"] = metrics["metricSamples"][0][1]
-            sleep(3)
             serverAllStats.append(serverStats)
             serverStats = {}
 
         if serverAllStats:
-            status = "<6> {timestamp} {ipAddr} oneview ServerStats [{serverName}] [AmbientTemperature={ambTemp} dec C|AveragePower={avgPower} watts|CpuAverageFreq={cpuAvgFreq} Hz|CpuUtilization={cpuUtil} %|PeakPower={peakPower} watts|PowerCap={powerCap}]\n"\
-            .format(timestamp = serverAllStats[0]["timeStamp"], ipAddr = oneview_client.connection.get_host(), serverName = server["serverName"], ambTemp = serverAllStats[0]["value"], avgPower = serverAllStats[1]["value"], cpuAvgFreq = serverAllStats[2]["value"], cpuUtil = serverAllStats[3]["value"], peakPower = serverAllStats[4]["value"], powerCap = serverAllStats[5]["value"] )
+            status = ovlog.syslogFormatter.serverStats(serverAllStats[0]["timeStamp"], oneview_client.connection.get_host(),
+                                                       server["serverName"], serverAllStats[0]["value"],
+                                                       serverAllStats[1]["value"], serverAllStats[2]["value"],
+                                                       serverAllStats[3]["value"], serverAllStats[4]["value"],
+                                                       serverAllStats[5]["value"])
             ovlog.writeToSyslog(status)
 
+    ovlog.publishMetrics(oneview_client.connection.get_host(), "servers", metricSamples)
+
 
 
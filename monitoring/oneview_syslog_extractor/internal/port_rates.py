@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import re
+import threading
+from array import array
+
+COUNTER32 = 2 ** 32
+
+# operationalSpeed of the ports, e.g. Speed10G, Speed2_5G, Speed100M
+_SPEED = re.compile(r'^Speed(\d+)(?:_(\d+))?([MG])$')
+_SPEED_UNITS = {'M': 10 ** 6, 'G': 10 ** 9}
+
+
+##################################################################
+# Line rate in bits/sec of an operationalSpeed, None when unknown
+# (Auto, Unknown, None).
+##################################################################
+def parseSpeed(speed):
+    match = _SPEED.match(speed or "")
+    if not match:
+        return None
+    whole, fraction, unit = match.groups()
+    return float(whole + "." + (fraction or "0")) * _SPEED_UNITS[unit]
+
+
+def _counter(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+##################################################################
+# Octets sent between two readings of a counter. A counter going down
+# wrapped if it is a 32-bit one and the wrapped delta fits the line
+# rate, otherwise it was reset and the delta is unknown (None). Without
+# a known line rate a wrap can not be told from a reset, so it is
+# taken as a reset.
+##################################################################
+def _delta(new, old, elapsed, lineRate):
+    if new is None or old is None:
+        return None
+    if new >= old:
+        return new - old
+    if old < COUNTER32 and lineRate is not None:
+        wrapped = new + COUNTER32 - old
+        if wrapped * 8 / elapsed <= lineRate:
+            return wrapped
+    return None
+
+
+##################################################################
+# Rates of the linked ports computed from their cumulative octet
+# counters (rfc1213IfInOctets/rfc1213IfOutOctets).
+#
+# The last counters of each interconnect are kept in memory as
+# columns (arrays) indexed by port, and all the ports of an
+# interconnect are computed in one pass over the columns. A port
+# gets its rates from its second reading on; ports whose counters
+# were reset start over from the new reading.
+#
+# Ports at or above 'threshold' percent of their line rate, in
+# either direction, are flagged as congested (0 turns it off).
+##################################################################
+class PortRateTracker(object):
+
+    def __init__(self, threshold=80.0):
+        self.threshold = float(threshold)
+        self._lock = threading.Lock()
+        self._last = {}  # (host, interconnect) -> (timestamp, {port: index}, inOctets, outOctets)
+
+    ##################################################################
+    # 'ports' is a list of (portName, IfInOctets, IfOutOctets,
+    # operationalSpeed) of one interconnect read at 'timestamp' (sec).
+    # Returns {portName: rates} of the ports with a previous reading,
+    # rates being a dict of inBps, outBps, inUtilization,
+    # outUtilization (percent, None when the speed is unknown) and
+    # congested.
+    ##################################################################
+    def update(self, host, interconnect, timestamp, ports):
+        names = [port[0] for port in ports]
+        inCounters = [_counter(port[1]) for port in ports]
+        outCounters = [_counter(port[2]) for port in ports]
+        # Ports without counters are kept out of the next deltas
+        valid = [inCounter is not None and outCounter is not None
+                 for inCounter, outCounter in zip(inCounters, outCounters)]
+        inOctets = array('d', [counter or 0.0 for counter in inCounters])
+        outOctets = array('d', [counter or 0.0 for counter in outCounters])
+        lineRates = [parseSpeed(port[3]) for port in ports]
+
+        with self._lock:
+            previous = self._last.get((host, interconnect))
+            self._last[(host, interconnect)] = (timestamp, {name: index for index, name in enumerate(names) if valid[index]},
+                                                inOctets, outOctets)
+        if previous is None or timestamp <= previous[0]:
+            return {}
+
+        lastTimestamp, lastIndex, lastIn, lastOut = previous
+        elapsed = timestamp - lastTimestamp
+        indexes = [lastIndex.get(name) if valid[position] else None for position, name in enumerate(names)]
+        inDeltas = [_delta(new, lastIn[index], elapsed, lineRate) if index is not None else None
+                    for new, index, lineRate in zip(inOctets, indexes, lineRates)]
+        outDeltas = [_delta(new, lastOut[index], elapsed, lineRate) if index is not None else None
+                     for new, index, lineRate in zip(outOctets, indexes, lineRates)]
+
+        rates = {}
+        for name, inDelta, outDelta, lineRate in zip(names, inDeltas, outDeltas, lineRates):
+            if inDelta is None or outDelta is None:
+                continue
+            inBps = inDelta * 8 / elapsed
+            outBps = outDelta * 8 / elapsed
+            inUtilization = outUtilization = None
+            congested = False
+            if lineRate:
+                inUtilization = round(inBps * 100 / lineRate, 2)
+                outUtilization = round(outBps * 100 / lineRate, 2)
+                congested = bool(self.threshold) and max(inUtilization, outUtilization) >= self.threshold
+            rates[name] = {'inBps': int(inBps), 'outBps': int(outBps), 'inUtilization': inUtilization,
+                           'outUtilization': outUtilization, 'congested': congested}
+        return rates
+
+    ##################################################################
+    # Forget the interconnects not in 'interconnects' (names) of an
+    # appliance.
+    ##################################################################
+    def retain(self, host, interconnects):
+        with self._lock:
+            for key in [key for key in self._last if key[0] == host and key[1] not in interconnects]:
+                del self._last[key]
@@ -0,0 +1,264 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import logging
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import internal.instrumentation as instrumentation
+import internal.logutils as ovlog
+import internal.scmb_utils as ovscmb
+
+EXCHANGE_NAME = 'scmb'
+
+
+##################################################################
+# Asynchronous SCMB consumer.
+#
+# Messages are received with a QoS prefetch window and processed on a
+# pool of worker threads. A message is acked only once it has been
+# processed and the syslog lines it produced are durable, so nothing
+# is lost if the extractor crashes. A dropped connection is re-opened
+# with exponential backoff and the queue is re-declared and re-bound.
+# The alert checkpoint moves with the acks, so with the default server
+# named queue the alerts lost with the connection are logged again
+# from the checkpoint when the extractor restarts.
+#
+# amqplib channels are not thread safe, so only the consumer thread
+# talks to the broker; the workers just report completed deliveries.
+##################################################################
+class ScmbConsumer(object):
+
+    def __init__(self, host, route, prefetch=100, workers=4, queueName='',
+                 ackInterval=0.5, reconnectMin=1, reconnectMax=60,
+                 maxReconnects=None, connect=None, handler=None):
+        self.host = host
+        self.routes = route.split(';')
+        self.prefetch = prefetch
+        self.queueName = queueName
+        self.ackInterval = ackInterval
+        self.reconnectMin = reconnectMin
+        self.reconnectMax = reconnectMax
+        # Consecutive failed connections before giving up, None to retry forever
+        self.maxReconnects = maxReconnects
+
+        # Hooks to run against a stand-in broker or a different handler
+        self.connect = connect or ovscmb.connectSCMB
+        self.handler = handler or ovscmb.processMessage
+
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.lock = threading.Lock()
+        self.running = False
+        self.connected = False
+
+        # Delivery tracking, reset on every (re)connection
+        self.generation = 0
+        self.nextAck = 1          # lowest delivery tag not yet acked
+        self.completed = {}       # processed tags >= nextAck -> 'modified' of the logged alert
+        self.pendingAcks = []     # (sync token, highest tag, newest 'modified') waiting for the syslog writer
+        self.lastAcked = 0        # highest delivery tag acked
+
+        # Counters
+        self.received = 0
+        self.processed = 0
+        self.acked = 0
+        self.failed = 0
+        self.reconnects = 0
+
+    ##################################################################
+    # Consume until stop() is called. Reconnects on any error, and
+    # gives up after 'maxReconnects' consecutive failed connections.
+    ##################################################################
+    def run(self):
+        self.running = True
+        backoff = self.reconnectMin
+        failures = 0
+
+        while self.running:
+            self.connected = False
+            try:
+                self._consume()
+            except Exception as e:
+                if not self.running:
+                    break
+                # A connection that got to consuming starts the count over
+                if self.connected:
+                    backoff = self.reconnectMin
+                    failures = 0
+                failures += 1
+                if self.maxReconnects is not None and failures > self.maxReconnects:
+                    self.executor.shutdown(wait=True)
+                    raise Exception("SCMB connection to {} failed {} times : {}".format(self.host, failures, e))
+                self.reconnects += 1
+                logging.error("SCMB connection to {} lost : {}. Reconnecting in {} sec".format(self.host, e, backoff))
+                print("SCMB connection to {} lost. Reconnecting in {} sec".format(self.host, backoff))
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.reconnectMax)
+
+        self.executor.shutdown(wait=True)
+        logging.info("SCMB consumer for {} stopped. {}".format(self.host, self.statsSummary()))
+
+    def stop(self):
+        self.running = False
+
+    def statsSummary(self):
+        return "received = {}, processed = {}, acked = {}, failed = {}, reconnects = {}".format(
+            self.received, self.processed, self.acked, self.failed, self.reconnects)
+
+    def _consume(self):
+        conn = self.connect(self.host)
+        try:
+            ch = conn.channel()
+            ch.basic_qos(0, self.prefetch, False)
+
+            if self.queueName:
+                # Named durable queue keeps the alerts raised while disconnected
+                qname, _, _ = ch.queue_declare(queue=self.queueName, durable=True,
+                                               exclusive=False, auto_delete=False)
+            else:
+                qname, _, _ = ch.queue_declare()
+
+            for route in self.routes:
+                logging.info("SCMB bind to " + route)
+                ch.queue_bind(qname, EXCHANGE_NAME, route)
+
+            # Delivery tags restart at 1 on a new channel. Unacked messages
+            # of the previous connection are redelivered by the broker.
+            with self.lock:
+                self.generation += 1
+                self.nextAck = 1
+                self.completed = {}
+                self.pendingAcks = []
+                self.lastAcked = 0
+            generation = self.generation
+
+            ch.basic_consume(qname, no_ack=False,
+                             callback=lambda msg: self._onMessage(generation, msg))
+            print("\nConnection established to SCMB {} (prefetch = {}). Listening for alerts...\n".format(
+                self.host, self.prefetch))
+            self.connected = True
+
+            lastReport = time.time()
+            lastProcessed = self.processed
+            while self.running:
+                self._wait(conn, ch)
+                self._sendAcks(ch)
+
+                now = time.time()
+                if now - lastReport >= 60:
+                    logging.info("SCMB {} : {:.1f} msgs/sec. {}".format(
+                        self.host, (self.processed - lastProcessed) / (now - lastReport), self.statsSummary()))
+                    lastReport = now
+                    lastProcessed = self.processed
+
+            # Ack what is already durable before leaving
+            self._sendAcks(ch, drain=True)
+            ch.close()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    ##################################################################
+    # Wait for the next frame, at most ackInterval seconds so that the
+    # acks of the completed messages go out even when the queue is idle.
+    ##################################################################
+    def _wait(self, conn, ch):
+        transport = getattr(conn, 'transport', None)
+        sock = getattr(transport, 'sslobj', None) or getattr(transport, 'sock', None)
+        if sock is not None:
+            sock.settimeout(self.ackInterval)
+        try:
+            ch.wait()
+        except socket.timeout:
+            pass
+        except ssl.SSLError as e:
+            if 'timed out' not in str(e):
+                raise
+        finally:
+            if sock is not None:
+                sock.settimeout(None)
+
+    def _onMessage(self, generation, msg):
+        with self.lock:
+            self.received += 1
+        self.executor.submit(self._process, generation, msg.delivery_tag, msg.body, time.perf_counter())
+
+    def _process(self, generation, deliveryTag, body, received=None):
+        modified = None
+        failed = False
+        try:
+            modified = self.handler(self.host, body)
+            # From the delivery to the syslog lines handed to the writer
+            if received is not None:
+                instrumentation.observe("scmb receive-to-write", time.perf_counter() - received)
+        except Exception as e:
+            # Acked anyway, a message that cannot be processed would
+            # otherwise be redelivered forever. The checkpoint does not
+            # move for it.
+            failed = True
+            logging.error("Error in processing SCMB message {} : {}".format(deliveryTag, e))
+
+        with self.lock:
+            if failed:
+                self.failed += 1
+            else:
+                self.processed += 1
+            if generation == self.generation:
+                self.completed[deliveryTag] = modified
+
+    ##################################################################
+    # Ack, with 'multiple', every delivery up to the highest tag for
+    # which all the earlier deliveries are processed and durable. The
+    # alert checkpoint is advanced at the same time, never past an
+    # alert whose syslog line is only queued.
+    ##################################################################
+    def _sendAcks(self, ch, drain=False):
+        with self.lock:
+            highest = self.nextAck - 1
+            newest = None
+            while self.nextAck in self.completed:
+                modified = self.completed.pop(self.nextAck)
+                if modified and (newest is None or modified > newest):
+                    newest = modified
+                self.nextAck += 1
+
+            if self.nextAck - 1 > highest:
+                # The workers' syslog lines are queued, wait for them to be durable
+                self.pendingAcks.append((ovlog.requestSyslogSync(), self.nextAck - 1, newest))
+
+        if drain and self.pendingAcks:
+            ovlog.waitSyslogSynced(self.pendingAcks[-1][0], timeout=10)
+
+        ackUpTo = 0
+        checkpoint = None
+        while self.pendingAcks and ovlog.syslogSynced(self.pendingAcks[0][0]):
+            _, ackUpTo, modified = self.pendingAcks.pop(0)
+            if modified and (checkpoint is None or modified > checkpoint):
+                checkpoint = modified
+
+        if ackUpTo:
+            ch.basic_ack(ackUpTo, multiple=True)
+            # Running count, the tags restart on every connection
+            self.acked += ackUpTo - self.lastAcked
+            self.lastAcked = ackUpTo
+        if checkpoint:
+            ovlog.writeTimestamp(checkpoint, self.host)
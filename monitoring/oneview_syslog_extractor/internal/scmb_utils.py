@@ -23,7 +23,7 @@ import amqplib.client_0_8 as amqp
 from functools import partial
 import internal.logutils as ovlog
 
-import requests
+from ov_client.connection_manager import OneViewConnection
 
 ##################################################################
 # Initialize certs dir.
@@ -61,43 +61,23 @@ def getCertCa_old(oneview_client, host):
     ca.close()
 
 
-def getCertCa(oneview_client, oneViewDetails):
+def getCertCa(oneview_client, oneViewDetails, connection=None):
         #logger.info('getCertCa')
         cert = oneview_client.certificate_authority.get()
 
         if oneview_client.api_version == 600:
                 logging.info("Processing cert requests for API version 600.")
                 print("Processing cert requests for API version 600.")
-                # Using requests module as the URI contains spaces which is rejected by OneView api
+                # Raw REST call as the URI contains spaces which is rejected by OneView api
                 #
-                loginURI = 'https://{}/rest/login-sessions'.format(oneViewDetails['host'])
-
-                headers = {
-                        'X-Api-Version':'600',
-                        'Content-Type':'application/json'
-                }
-
-                body = {
-                        'authLoginDomain':'local',
-                        'password':oneViewDetails['passwd'],
-                        'userName':oneViewDetails['user'],
-                        'loginMsgAck':'true'
-                }
-
-                response = requests.post(loginURI, headers=headers, data=json.dumps(body), verify=False)
-                authID = response.json()['sessionID']
-                print(authID)
-
-                headers = {
-                        'X-Api-Version':'600',
-                        'Content-Type':'application/json',
-                        'auth' : authID
-                }
-
-                URI = 'https://{}/rest/certificates/ca/Infrastructure Management Certificate Authority-internalroot'.format(oneViewDetails['host'])
+                if connection is None:
+                        connection = OneViewConnection(oneViewDetails['host'], oneViewDetails['user'],
+                                                       oneViewDetails['passwd'],
+                                                       oneViewDetails.get('authLoginDomain', 'LOCAL'))
+
+                URI = '/rest/certificates/ca/Infrastructure Management Certificate Authority-internalroot'
                 #URI = 'https://172.168.100.50/rest/certificates/ca'
-                response = requests.get(URI, headers=headers, verify=False)
-                cert = response.json()
+                cert = connection.get(URI, "certificates.get_ca")
                 print("\n\n\nAPI version = 600")
                 print(cert['certificateDetails']['base64Data'])
 
@@ -152,16 +132,43 @@ def getRabbitKp(oneview_client, host):
 ##################################################################
 # Setup RabbitMQ
 ##################################################################
-def setupAmqpCerts(oneview_client, ovDetails):
+def setupAmqpCerts(oneview_client, ovDetails, connection=None):
     # Create certs directory for storing the OV certificates
     initialize_certs()
 
     # Download the certificates
     logging.debug("Attempting to establish connection with OV SCMB")
-    getCertCa(oneview_client, ovDetails)
+    getCertCa(oneview_client, ovDetails, connection)
     getRabbitKp(oneview_client, ovDetails["host"])
 
 
+##################################################################
+# SSL options to connect to the SCMB of an appliance with the
+# certificates downloaded by setupAmqpCerts()
+##################################################################
+def amqpSslOptions(host):
+    return ({'ca_certs': 'certs/' + host + '-caroot.pem',
+             'certfile': 'certs/' + host + '-client.pem',
+             'keyfile': 'certs/' + host + '-key.pem',
+             'cert_reqs': ssl.CERT_REQUIRED,
+             'ssl_version' : ssl.PROTOCOL_TLSv1_1,
+             'server_side': False})
+
+
+##################################################################
+# Open an AMQP connection to the SCMB of an appliance.
+##################################################################
+def connectSCMB(host):
+    dest = host + ':5671'
+
+    # Setup our ssl options
+    ssl_options = amqpSslOptions(host)
+    logging.info(ssl_options)
+
+    # Connect to RabbitMQ
+    return amqp.Connection(dest, login_method='EXTERNAL', ssl=ssl_options)
+
+
 ##################################################################
 # Function to stop SCMB.
 # This code written based on info provided by https://www.rabbitmq.com/consumer-cancel.html
@@ -170,20 +177,9 @@ def stopSCMB(host):
     logging.info("stopSCMB: stopping SCMB")
 
     EXCHANGE_NAME = 'scmb'
-    dest = host + ':5671'
-
-    # Setup our ssl options
-    ssl_options = ({'ca_certs': 'certs/' + host + '-caroot.pem',
-                    'certfile': 'certs/' + host + '-client.pem',
-                    'keyfile': 'certs/' + host + '-key.pem',
-                    'cert_reqs': ssl.CERT_REQUIRED,
-                    'ssl_version' : ssl.PROTOCOL_TLSv1_1,
-                    'server_side': False})
-
-    logging.info(ssl_options)
 
     # Connect to RabbitMQ
-    conn = amqp.Connection(dest, login_method='EXTERNAL', ssl=ssl_options)
+    conn = connectSCMB(host)
 
     ch = conn.channel()
     qname, _, _ = ch.queue_declare()
@@ -203,20 +199,9 @@ def recv(host, route):
 
     # Create and bind to queue
     EXCHANGE_NAME = 'scmb'
-    dest = host + ':5671'
-
-    # Setup our ssl options
-    ssl_options = ({'ca_certs': 'certs/' + host + '-caroot.pem',
-                    'certfile': 'certs/' + host + '-client.pem',
-                    'keyfile': 'certs/' + host + '-key.pem',
-                    'cert_reqs': ssl.CERT_REQUIRED,
-                    'ssl_version' : ssl.PROTOCOL_TLSv1_1,
-                    'server_side': False})
-
-    logging.info(ssl_options)
 
     # Connect to RabbitMQ
-    conn = amqp.Connection(dest, login_method='EXTERNAL', ssl=ssl_options)
+    conn = connectSCMB(host)
 
     ch = conn.channel()
     qname, _, _ = ch.queue_declare()
@@ -247,8 +232,32 @@ def callback(channel, hostname, msg):
     # ACK receipt of message
     channel.basic_ack(msg.delivery_tag)
 
+    try:
+        modified = processMessage(hostname, msg.body)
+    except Exception as e:
+        print("Error in logging the alert : " + str(e))
+        modified = None
+
+    # The checkpoint only moves past the alert once its line is durable
+    if modified:
+        if ovlog.waitSyslogSynced(ovlog.requestSyslogSync(), timeout=10):
+            ovlog.writeTimestamp(modified, hostname)
+
+    # Cancel this callback
+    if msg.body == 'quit':
+        channel.basic_cancel(msg.consumer_tag)
+
+
+##################################################################
+# Log an SCMB alert message to syslog.
+# Shared by the callback above and the asynchronous consumer.
+# Returns the 'modified' timestamp of a logged alert, for the caller
+# to advance the checkpoint once the syslog line is durable. Errors
+# are raised to the caller, which decides whether to ack.
+##################################################################
+def processMessage(hostname, body):
     # Convert from json into a Python dictionary
-    content = json.loads(msg.body)
+    content = json.loads(body)
 
     # Add a new attribute so that the server side can recognize from which appliance it is this message comes from.
     content['messageHost'] = hostname
@@ -259,23 +268,20 @@ def callback(channel, hostname, msg):
     #create_syslog(content["resource"])
 
     resource = content['resource']
+
+    # Server hardware changes keep the server index up to date
+    if resource.get('category') == 'server-hardware':
+        ovlog.update_server_map(hostname, content.get('changeType'), resource)
+        return
+
     #print("Alert state = " + resource['alertState'] + ". Severity = " + resource['severity'])
     if(('alertState' in resource) and ('severity' in resource)):
         if((('Active' == resource['alertState']) or ('Cleared' == resource['alertState'])) and
         (('Critical' == resource['severity']) or ('Warning' == resource['severity']) or ('OK' == resource['severity'])) ):
             #print(resource)
-            try:
-                print("\nCritical Created!")
-                ovlog.createSyslog(resource, content['messageHost'])
-                ovlog.writeTimestamp(resource['modified'], ".timestamp")
-            except Exception as e:
-                print("Error in logging the alert : " + str(e))
+            print("\nCritical Created!")
+            ovlog.createSyslog(resource, content['messageHost'])
+            return resource['modified']
 
         else:
             print("Alert state = " + resource['alertState'] + ". Ignoring")
-
-    # Cancel this callback
-    if msg.body == 'quit':
-        channel.basic_cancel(msg.consumer_tag)
-
-
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import logging
+import struct
+
+from internal.shared_table import SharedTable
+
+# state, uuid, appliance, serial number, server name
+RECORD = struct.Struct('<B39s64s32s127s')
+
+
+##################################################################
+# Server hardware index, uuid -> serial number and server name,
+# in a table shared by all the processes.
+#
+# Each record also keeps the appliance of the server, so that the
+# full listing of an appliance can be reconciled with its entries.
+##################################################################
+class ServerInventory(SharedTable):
+
+    def __init__(self, capacity=8192):
+        super(ServerInventory, self).__init__(capacity, RECORD)
+
+    ##################################################################
+    # Add or update a server.
+    ##################################################################
+    def put(self, uuid, host, serialNumber, serverName):
+        key = self._encode(uuid, 39)
+        with self._lock:
+            slot, found = self._find(key)
+            if slot < 0:
+                logging.error("Server inventory is full ({} servers). Not adding {}".format(self._count.value, uuid))
+                return False
+            self._store(slot, found, key, self._encode(host, 64),
+                        self._encode(serialNumber, 32), self._encode(serverName, 127))
+            return True
+
+    ##################################################################
+    # Remove a server.
+    ##################################################################
+    def remove(self, uuid):
+        return self._remove(self._encode(uuid, 39))
+
+    ##################################################################
+    # {'serverSerialNum': .., 'serverName': ..} of a server or None.
+    ##################################################################
+    def get(self, uuid):
+        key = self._encode(uuid, 39)
+        with self._lock:
+            slot, found = self._find(key)
+            if not found:
+                return None
+            _, _, _, serial, name = self._read(slot)
+        return {'serverSerialNum': serial.rstrip(b'\0').decode('utf-8', 'replace'),
+                'serverName': name.rstrip(b'\0').decode('utf-8', 'replace')}
+
+    ##################################################################
+    # Make the entries of an appliance match its full listing of the
+    # server hardware. Returns the number of (added or updated, removed)
+    # servers.
+    ##################################################################
+    def reconcile(self, host, servers):
+        listed = set()
+        for server in servers:
+            self.put(server['uuid'], host, server['serialNumber'], server['serverName'])
+            listed.add(self._encode(server['uuid'], 39))
+
+        hostKey = self._encode(host, 64)
+        stale = self._select(lambda record: record[2].rstrip(b'\0') == hostKey and
+                             record[1].rstrip(b'\0') not in listed)
+        for uuid in stale:
+            self._remove(uuid)
+
+        self._compactIfNeeded()
+        return len(listed), len(stale)
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import mmap
+import struct
+import zlib
+import multiprocessing as mp
+
+# Slot states
+EMPTY = 0
+USED = 1
+DELETED = 2
+
+
+##################################################################
+# Fixed size records in an open addressing hash table stored in an
+# anonymous shared mmap. Created before the pool workers are forked,
+# every process reads the same pages instead of its own copy of a
+# dict. Writers and readers take a multiprocessing lock, so a record
+# is never read half written.
+#
+# 'record' is the struct of a record. Its first two fields are the
+# slot state ('B') and the key ('<n>s').
+##################################################################
+class SharedTable(object):
+
+    def __init__(self, capacity, record):
+        # Keep the load factor under 1/2 for short probe sequences
+        self.capacity = max(16, int(capacity)) * 2
+        self.record = record
+        self._head = struct.Struct(record.format[:record.format.index('s') + 1])
+        self.keySize = self._head.size - 1
+        self._map = mmap.mmap(-1, self.capacity * record.size)
+        self._lock = mp.Lock()
+        self._count = mp.Value('i', 0, lock=False)
+        self._deleted = mp.Value('i', 0, lock=False)
+
+    def __len__(self):
+        return self._count.value
+
+    def _read(self, slot):
+        return self.record.unpack_from(self._map, slot * self.record.size)
+
+    def _write(self, slot, *fields):
+        self.record.pack_into(self._map, slot * self.record.size, *fields)
+
+    def _clear(self, slot):
+        self._map[slot * self.record.size:(slot + 1) * self.record.size] = bytes(self.record.size)
+        struct.pack_into('<B', self._map, slot * self.record.size, DELETED)
+
+    ##################################################################
+    # Slot of 'key', or the first free slot on its probe sequence
+    # if it is not in the table. -1 if the table is full.
+    # Called with the lock held.
+    ##################################################################
+    def _find(self, key):
+        slot = zlib.crc32(key) % self.capacity
+        free = -1
+        for _ in range(self.capacity):
+            state, slotKey = self._head.unpack_from(self._map, slot * self.record.size)
+            if state == EMPTY:
+                return slot if free < 0 else free, False
+            if state == DELETED:
+                if free < 0:
+                    free = slot
+            elif slotKey.rstrip(b'\0') == key:
+                return slot, True
+            slot = (slot + 1) % self.capacity
+        return free, False
+
+    @staticmethod
+    def _encode(value, size):
+        return (value or '').encode('utf-8')[:size]
+
+    ##################################################################
+    # Write the record of 'key' at 'slot' returned by _find().
+    # Called with the lock held.
+    ##################################################################
+    def _store(self, slot, found, key, *fields):
+        if not found:
+            if self._read(slot)[0] == DELETED:
+                self._deleted.value -= 1
+            self._count.value += 1
+        self._write(slot, USED, key, *fields)
+
+    ##################################################################
+    # Remove the record of 'key'. Returns True if it was present.
+    ##################################################################
+    def _remove(self, key):
+        with self._lock:
+            slot, found = self._find(key)
+            if found:
+                # Tombstone to keep the probe sequences of the other records
+                self._clear(slot)
+                self._count.value -= 1
+                self._deleted.value += 1
+            return found
+
+    ##################################################################
+    # Keys of the records matching 'predicate'.
+    ##################################################################
+    def _select(self, predicate):
+        with self._lock:
+            return [record[1].rstrip(b'\0') for record in (self._read(slot) for slot in range(self.capacity))
+                    if record[0] == USED and predicate(record)]
+
+    ##################################################################
+    # Re-insert the records to clear the tombstones once they are more
+    # than a quarter of the table.
+    ##################################################################
+    def _compactIfNeeded(self):
+        if self._deleted.value <= self.capacity // 4:
+            return
+        with self._lock:
+            records = [self._read(slot) for slot in range(self.capacity)]
+            self._map[:] = bytes(len(self._map))
+            self._deleted.value = 0
+            for record in records:
+                if record[0] != USED:
+                    continue
+                slot, _ = self._find(record[1].rstrip(b'\0'))
+                self._write(slot, *record)
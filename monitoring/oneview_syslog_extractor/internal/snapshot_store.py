@@ -0,0 +1,105 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import logging
+import struct
+import time
+
+from internal.shared_table import SharedTable
+
+# state, appliance|uri, version (eTag or modified), status, state, time
+RECORD = struct.Struct('<B191s64s16s32sd')
+
+# Keys of the per category watermarks, next to the resource URIs
+WATERMARK_KEY = "{}|#{}"
+
+
+##################################################################
+# Last known state of the polled resources, in a table shared by
+# all the processes.
+#
+# Each resource is recorded with its version (eTag, or the 'modified'
+# timestamp), status and state. In changes-only mode the pollers
+# only log a resource when its status or state differs from the
+# snapshot, and list only the resources modified since the last
+# listing of their category (the category watermark).
+##################################################################
+class SnapshotStore(SharedTable):
+
+    def __init__(self, capacity=16384):
+        super(SnapshotStore, self).__init__(capacity, RECORD)
+
+    def _key(self, host, uri):
+        return self._encode("{}|{}".format(host, uri), 191)
+
+    ##################################################################
+    # Record a resource of a listing. Returns True if it is new or its
+    # status or state changed since the last observation.
+    ##################################################################
+    def observe(self, host, uri, version, status, state):
+        key = self._key(host, uri)
+        version = self._encode(version, 64)
+        status = self._encode(status, 16)
+        state = self._encode(state, 32)
+        with self._lock:
+            slot, found = self._find(key)
+            if slot < 0:
+                logging.error("Snapshot store is full ({} resources). Not adding {}".format(self._count.value, uri))
+                return True
+            if found:
+                _, _, lastVersion, lastStatus, lastState, _ = self._read(slot)
+                if version and lastVersion.rstrip(b'\0') == version:
+                    return False
+                changed = (lastStatus.rstrip(b'\0'), lastState.rstrip(b'\0')) != (status, state)
+            else:
+                changed = True
+            self._store(slot, found, key, version, status, state, time.time())
+            return changed
+
+    ##################################################################
+    # Drop the resources of a category of an appliance which are not
+    # in its full listing. Returns the number of resources dropped.
+    ##################################################################
+    def retain(self, host, uriPrefixes, uris):
+        listed = set(self._key(host, uri) for uri in uris)
+        prefixes = tuple(self._key(host, prefix) for prefix in uriPrefixes)
+        stale = self._select(lambda record: record[1].startswith(prefixes) and
+                             record[1].rstrip(b'\0') not in listed)
+        for key in stale:
+            self._remove(key)
+        self._compactIfNeeded()
+        return len(stale)
+
+    ##################################################################
+    # (newest 'modified' listed, time of the last full listing) of a
+    # category of an appliance. ('', 0) before its first listing.
+    ##################################################################
+    def getWatermark(self, host, category):
+        key = self._encode(WATERMARK_KEY.format(host, category), 191)
+        with self._lock:
+            slot, found = self._find(key)
+            if not found:
+                return '', 0
+            _, _, modified, _, _, lastFull = self._read(slot)
+        return modified.rstrip(b'\0').decode('utf-8'), lastFull
+
+    def setWatermark(self, host, category, modified, lastFull):
+        key = self._encode(WATERMARK_KEY.format(host, category), 191)
+        with self._lock:
+            slot, found = self._find(key)
+            if slot >= 0:
+                self._store(slot, found, key, self._encode(modified, 64), b'', b'', lastFull)
@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import logging
+import os
+import sys
+
+
+##################################################################
+# Tokens of an alert, as the ServiceNow forwarder's parser would
+# extract them from the syslog record of the alert.
+##################################################################
+def alert_to_tokens(alertObj, oneviewHost, resourceDetails, description):
+    alertCategory = alertObj['physicalResourceType']
+    alertResource = resourceDetails.strip()
+    if alertCategory == 'server-hardware':
+        serialNumber = alertResource.split(';')[-1]
+        alertResource = alertResource.split(';')[0]
+    else:
+        serialNumber = "NA"
+
+    tokens = {
+        'severity': alertObj['severity'].upper(),
+        'eventTimeStamp': alertObj['created'],
+        'oneviewIp': oneviewHost,
+        'alertCategory': alertCategory,
+        'alertResource': alertResource,
+        'serialNumber': serialNumber,
+        'alertId': alertObj['uri'].split('/')[-1],
+        'alertType': alertObj['healthCategory'],
+        'alertStatus': alertObj['alertState'],
+        'caseId': "", 'caseStatus': "", 'caseContactDetails': "",
+        'childEvents': [int(element.split('/')[-1]) for element in alertObj['childAlerts'] or []],
+        'alertMessage': description
+    }
+
+    serviceEvent = alertObj['serviceEventDetails'] if alertObj['serviceEventSource'] else None
+    if serviceEvent:
+        tokens['caseId'] = str(serviceEvent['caseId'])
+        tokens['caseContactDetails'] = str(serviceEvent['primaryContact'])
+        tokens['caseStatus'] = str(serviceEvent['remoteSupportState'])
+
+    return tokens
+
+
+##################################################################
+# In-process pipeline to the ServiceNow forwarder.
+#
+# The alerts are handed to the forwarder's dispatcher as tokens,
+# without going through the syslog file. The dispatcher queues are
+# the in-memory queue between the two. The forwarder is imported
+# from its directory (module_servicenow) with its properties file.
+##################################################################
+class SnowPipeline(object):
+
+    def __init__(self, servicenowDir, propertiesFile=None):
+        servicenowDir = os.path.abspath(servicenowDir)
+        if not os.path.isdir(servicenowDir):
+            raise Exception("ServiceNow forwarder directory {} not found".format(servicenowDir))
+        # Ahead of the standard library, which has a parser module up to Python 3.9
+        if sys.path[:1] != [servicenowDir]:
+            sys.path.insert(0, servicenowDir)
+
+        import create_incident_with_syslog as forwarder
+        from snow_dispatcher import event_key
+
+        self.forwarder = forwarder
+        self.eventKey = event_key
+        self.properties = forwarder.read_properties(propertiesFile or os.path.join(servicenowDir, 'properties.json'))
+        self.dispatcher = forwarder.start_forwarder(self.properties)
+        self.submitted = 0
+        # The dispatcher threads only run in this process
+        self.ownerPid = os.getpid()
+        logging.info("ServiceNow pipeline started from {}".format(servicenowDir))
+
+    def submit(self, tokens):
+        self.dispatcher.submit(self.eventKey(tokens), tokens)
+        self.submitted += 1
+
+    def stop(self):
+        self.forwarder.stop_forwarder(self.dispatcher)
+        logging.info("ServiceNow pipeline stopped. {} alerts submitted".format(self.submitted))
@@ -0,0 +1,190 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import logging
+import threading
+import time
+
+from hpOneView.oneview_client import OneViewClient
+from ov_client.oneview_client import acceptEULA
+from ov_client.connection_manager import OneViewConnection, OneViewRestClient
+
+import internal.polling_processes as polling
+import internal.logutils as ovlog
+import internal.scmb_utils as ovscmb
+from internal.scmb_consumer import ScmbConsumer
+
+SERVER_HARDWARE_ROUTE = "scmb.server-hardware.#"
+
+
+##################################################################
+# Supervisor of one OneView appliance.
+#
+# Runs the whole pipeline of an appliance in this process: login,
+# server map, SCMB certificates, active alerts, pollers and the SCMB
+# consumer. Any failure tears the appliance down and restarts it with
+# exponential backoff, without affecting the other appliances.
+#
+# The pollers and alert collectors of the appliance share one pooled
+# REST connection. The syslog writer, the API rate limiter and the
+# thread pool of the pollers are shared by all the appliances.
+##################################################################
+class ApplianceSupervisor(threading.Thread):
+
+    def __init__(self, oneviewDetails, threadPool, restartMin=5, restartMax=300):
+        threading.Thread.__init__(self, name="appliance-{}".format(oneviewDetails["host"]))
+        self.daemon = True
+        self.details = oneviewDetails
+        self.host = oneviewDetails["host"]
+        self.threadPool = threadPool
+        self.restartMin = restartMin
+        self.restartMax = restartMax
+
+        self.running = True
+        self.restarts = 0
+        self.consumer = None
+        self.stopEvent = None
+        self.connection = None
+
+    def run(self):
+        backoff = self.restartMin
+
+        while self.running:
+            started = time.time()
+            self.stopEvent = threading.Event()
+            try:
+                self._runAppliance()
+            except Exception as e:
+                logging.error("Appliance {} failed : {}".format(self.host, e))
+                print("Appliance {} failed : {}".format(self.host, e))
+            finally:
+                # Stop the pollers of this run before starting over
+                self.stopEvent.set()
+                if self.connection:
+                    self.connection.close()
+                    self.connection = None
+
+            if not self.running:
+                break
+
+            # A run that stayed up for a while starts the backoff over
+            if time.time() - started > self.restartMax:
+                backoff = self.restartMin
+
+            self.restarts += 1
+            logging.warning("Restarting appliance {} in {} sec (restart #{})".format(self.host, backoff, self.restarts))
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.restartMax)
+
+    def stop(self):
+        self.running = False
+        if self.stopEvent:
+            self.stopEvent.set()
+        if self.consumer:
+            self.consumer.stop()
+
+    def _connect(self):
+        ovConfig = {
+            "ip": self.host,
+            "credentials": {
+                "userName": self.details["user"],
+                "password": self.details["passwd"],
+                "authLoginDomain": self.details['authLoginDomain']
+            },
+            'api_version': 600
+        }
+
+        try:
+            oneview_client = OneViewClient(ovConfig)
+            acceptEULA(oneview_client)
+            logging.info("Connected to OneView appliance : {}".format(self.host))
+        except Exception as e:
+            err = "Error connecting to appliance: {}\n Check for oneview details in the input file".format(e)
+            logging.error(e)
+            raise Exception(err)
+
+        print("Connected to OneView appliance : {}".format(self.host))
+        return oneview_client
+
+    ##################################################################
+    # Pooled REST connection of the appliance, logged in, and the
+    # client of the pollers on top of it.
+    ##################################################################
+    def _restClient(self):
+        self.connection = OneViewConnection(self.host, self.details["user"], self.details["passwd"],
+                                            authLoginDomain=self.details['authLoginDomain'],
+                                            poolSize=self.details['ov_connection_pool'])
+        self.connection.login()
+        return OneViewRestClient(self.connection)
+
+    def _startThread(self, name, target, args):
+        thread = threading.Thread(target=target, args=args, name="{}-{}".format(name, self.host))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _runAppliance(self):
+        details = self.details
+
+        # Logging input details.
+        logging.info('OneView args: host = %s, alias = %s, route = %s', \
+            self.host, details["alias"], details["route"])
+
+        oneview_client = self._connect()
+        restClient = self._restClient()
+        ovlog.create_server_map(restClient)
+
+        # Create certs directory for storing the OV certificates
+        ovscmb.setupAmqpCerts(oneview_client, details, self.connection)
+
+        if details['collect_stats']:
+            self._startThread("poller", polling.process_threads,
+                              (restClient,
+                               details['alert_hardware_category'],
+                               details['refresh_interval'],
+                               details['ov_max_inflight'],
+                               self.threadPool,
+                               self.stopEvent,
+                               details['nodestats_mode'],
+                               details['nodestats_heartbeat']))
+
+        self._startThread("inventory", polling.reconcile_server_map,
+                          (restClient, details['inventory_reconcile_interval'], self.stopEvent))
+
+        if details['collect_hpeov_service_info']:
+            self._startThread("hpeov-service", polling.collect_hpeov_service_info,
+                              (restClient, 120, self.stopEvent))
+
+        # Logging all active alerts to syslog
+        ovlog.logAlerts(restClient, "activeAlerts")
+
+        # Server hardware changes are applied to the server index
+        route = details["route"] + ";" + SERVER_HARDWARE_ROUTE
+
+        # Start listening for messages. After repeated connection failures
+        # the consumer gives up and the appliance is set up again from the
+        # login, so expired certificates are downloaded again.
+        if details['scmb_mode'] == 'legacy':
+            ovscmb.recv(self.host, route)
+        else:
+            self.consumer = ScmbConsumer(self.host, route,
+                                         prefetch=details['scmb_prefetch'],
+                                         workers=details['scmb_workers'],
+                                         queueName=details['scmb_queue'],
+                                         maxReconnects=5)
+            if self.running:
+                self.consumer.run()
@@ -0,0 +1,150 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import json
+
+# Output formats of the syslog records
+#   bracket - "<sev> timestamp host oneview Type [resource] [fields] ..." (default)
+#   rfc5424 - RFC 5424 syslog with the fields as structured data
+#   jsonl   - one JSON object per line
+SYSLOG_FORMATS = ('bracket', 'rfc5424', 'jsonl')
+
+RFC5424_FACILITY = 16           # local0
+RFC5424_APP_NAME = 'oneview'
+RFC5424_SD_ID = 'oneview@11'    # Private enterprise number of HPE
+
+_jsonEncode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+
+# Pre-compiled templates of the bracket format, one per record type
+_BRACKET_ALERT = "<{}> {} {} oneview {} [{}] [{}|{}|{}|{}|{}|{}] [{}]".format
+_BRACKET_PORT_STATS = "<{}> {} {} oneview PortStats [{}] [{}|Transmit={}|Receive={}|Speed={}|AdaptorPort={}]".format
+_BRACKET_PORT_RATES = "<{}> {} {} oneview PortRates [{}] [{}|InRate={} bps|OutRate={} bps|InUtilization={} %|OutUtilization={} %|Speed={}|Congested={}]".format
+_BRACKET_ENCLOSURE_STATS = "<{}> {} {} oneview EnclosureStats [{}] [AmbientTemperature={} dec C|AveragePower={} watts|PeakPower={} watts]".format
+_BRACKET_SERVER_STATS = "<{}> {} {} oneview ServerStats [{}] [AmbientTemperature={} dec C|AveragePower={} watts|CpuAverageFreq={} Hz|CpuUtilization={} %|PeakPower={} watts|PowerCap={}]".format
+_BRACKET_NODE_STATS = "<{}> {} {} oneview NodeStats [{}] [{}|{}|None]".format
+_BRACKET_SERVICE_EVENT = "{{{}|{}|{}}}".format
+
+_RFC5424 = ("<{}>1 {} {} " + RFC5424_APP_NAME + " - {} [" + RFC5424_SD_ID + "{}]").format
+_SD_PARAM = ' {}="{}"'.format
+
+
+def _sdEscape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(']', '\\]')
+
+
+##################################################################
+# Formats the syslog records of the extractor.
+#
+# Each record type has one method. The fields are collected once and
+# rendered by the template of the selected format.
+##################################################################
+class SyslogFormatter(object):
+
+    def __init__(self, syslogFormat='bracket'):
+        if syslogFormat not in SYSLOG_FORMATS:
+            raise Exception("Invalid syslog format - \"{}\". Valid formats - {}".format(syslogFormat, SYSLOG_FORMATS))
+        self.syslogFormat = syslogFormat
+
+    ##################################################################
+    # Structured renderings, shared by all the record types.
+    # 'params' is a list of (name, value) pairs.
+    ##################################################################
+    def _structured(self, recordType, severity, timestamp, host, resource, params, message):
+        if self.syslogFormat == 'jsonl':
+            record = {'type': recordType, 'severity': severity, 'timestamp': timestamp,
+                      'host': host, 'resource': resource}
+            record.update(params)
+            record['message'] = message
+            return _jsonEncode(record)
+
+        # Lists (the child alerts) as comma separated values
+        sd = "".join(_SD_PARAM(name, _sdEscape(",".join(map(str, value)) if isinstance(value, list) else value))
+                     for name, value in params if not isinstance(value, dict))
+        record = _RFC5424(RFC5424_FACILITY * 8 + severity, timestamp, host, recordType,
+                          _SD_PARAM('resource', _sdEscape(resource)) + sd)
+        return record + " " + message if message else record
+
+    def alert(self, severity, timestamp, host, resourceType, resourceDetails,
+              alertId, healthCategory, alertState, assignedToUser, serviceEvent,
+              childAlerts, description):
+        if self.syslogFormat == 'bracket':
+            if serviceEvent:
+                serviceEventInfo = _BRACKET_SERVICE_EVENT(serviceEvent['caseId'],
+                                                          serviceEvent['primaryContact'],
+                                                          serviceEvent['remoteSupportState'])
+            else:
+                serviceEventInfo = None
+            return _BRACKET_ALERT(severity, timestamp, host, resourceType, resourceDetails,
+                                  alertId, healthCategory, alertState, assignedToUser,
+                                  serviceEventInfo, childAlerts, description)
+
+        params = [('category', resourceType), ('alertId', alertId),
+                  ('healthCategory', healthCategory), ('alertState', alertState),
+                  ('assignedToUser', assignedToUser)]
+        if serviceEvent:
+            params += [('caseId', serviceEvent['caseId']),
+                       ('primaryContact', serviceEvent['primaryContact']),
+                       ('remoteSupportState', serviceEvent['remoteSupportState'])]
+        params.append(('childAlerts', childAlerts))
+        return self._structured('Alert', severity, timestamp, host, resourceDetails, params, description)
+
+    def portStats(self, severity, timestamp, host, interconnect, port, transmit, receive, speed, adapterPort):
+        if self.syslogFormat == 'bracket':
+            return _BRACKET_PORT_STATS(severity, timestamp, host, interconnect, port,
+                                       transmit, receive, speed, adapterPort)
+
+        params = [('port', port), ('transmit', transmit), ('receive', receive),
+                  ('speed', speed), ('adapterPort', adapterPort)]
+        return self._structured('PortStats', severity, timestamp, host, interconnect, params, "")
+
+    def portRates(self, severity, timestamp, host, interconnect, port, inBps, outBps,
+                  inUtilization, outUtilization, speed, congested):
+        if self.syslogFormat == 'bracket':
+            return _BRACKET_PORT_RATES(severity, timestamp, host, interconnect, port, inBps, outBps,
+                                       inUtilization, outUtilization, speed, congested)
+
+        params = [('port', port), ('inRate', inBps), ('outRate', outBps),
+                  ('inUtilization', inUtilization), ('outUtilization', outUtilization),
+                  ('speed', speed), ('congested', congested)]
+        return self._structured('PortRates', severity, timestamp, host, interconnect, params, "")
+
+    def enclosureStats(self, timestamp, host, enclosure, ambientTemperature, averagePower, peakPower):
+        if self.syslogFormat == 'bracket':
+            return _BRACKET_ENCLOSURE_STATS(6, timestamp, host, enclosure,
+                                            ambientTemperature, averagePower, peakPower)
+
+        params = [('ambientTemperature', ambientTemperature), ('averagePower', averagePower),
+                  ('peakPower', peakPower)]
+        return self._structured('EnclosureStats', 6, timestamp, host, enclosure, params, "")
+
+    def serverStats(self, timestamp, host, server, ambientTemperature, averagePower,
+                    cpuAverageFreq, cpuUtilization, peakPower, powerCap):
+        if self.syslogFormat == 'bracket':
+            return _BRACKET_SERVER_STATS(6, timestamp, host, server, ambientTemperature, averagePower,
+                                         cpuAverageFreq, cpuUtilization, peakPower, powerCap)
+
+        params = [('ambientTemperature', ambientTemperature), ('averagePower', averagePower),
+                  ('cpuAverageFreq', cpuAverageFreq), ('cpuUtilization', cpuUtilization),
+                  ('peakPower', peakPower), ('powerCap', powerCap)]
+        return self._structured('ServerStats', 6, timestamp, host, server, params, "")
+
+    def nodeStats(self, severity, timestamp, host, node, correctiveAction, description):
+        if self.syslogFormat == 'bracket':
+            return _BRACKET_NODE_STATS(severity, timestamp, host, node, correctiveAction, description)
+
+        params = [('correctiveAction', correctiveAction), ('model', description)]
+        return self._structured('NodeStats', severity, timestamp, host, node, params, "")
@@ -0,0 +1,225 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import logging
+import os
+import socket
+import time
+
+# fsync policies of the file sink
+#   never    - leave it to the OS to write back the page cache
+#   batch    - fsync after every batch written to the file
+#   interval - fsync at most once every 'fsyncInterval' seconds
+FSYNC_POLICIES = ('never', 'batch', 'interval')
+
+
+##################################################################
+# Outputs of the syslog writer. The writer thread hands each sink
+# the batches of records (without the line ends) with write().
+# 'sync' is set when a producer waits for the records to be durable.
+##################################################################
+class FileSink(object):
+
+    def __init__(self, fileName, fsyncPolicy='batch', fsyncInterval=5.0):
+        if fsyncPolicy not in FSYNC_POLICIES:
+            raise Exception("Invalid syslog fsync policy - \"{}\". Valid policies - {}".format(fsyncPolicy, FSYNC_POLICIES))
+
+        self.fileName = fileName
+        self.fsyncPolicy = fsyncPolicy
+        self.fsyncInterval = float(fsyncInterval)
+        self._file = None
+        self._inode = None
+        self._lastFsync = 0
+
+    def __str__(self):
+        return "file:{}".format(self.fileName)
+
+    def open(self):
+        self._file = open(self.fileName, 'a+')
+        self._inode = os.fstat(self._file.fileno()).st_ino
+
+    ##################################################################
+    # Re-open the syslog file if it was rotated (renamed or removed)
+    # under the writer.
+    ##################################################################
+    def _reopenIfRotated(self):
+        try:
+            rotated = os.stat(self.fileName).st_ino != self._inode
+        except OSError:
+            rotated = True
+
+        if rotated:
+            logging.info("Syslog file {} rotated. Re-opening.".format(self.fileName))
+            self._file.close()
+            self.open()
+
+    def write(self, records, sync=False):
+        self._reopenIfRotated()
+        if records:
+            self._file.write("\n".join(records) + "\n")
+        self._file.flush()
+
+        now = time.time()
+        if self.fsyncPolicy == 'batch' or \
+           (self.fsyncPolicy == 'interval' and (sync or now - self._lastFsync >= self.fsyncInterval)):
+            os.fsync(self._file.fileno())
+            self._lastFsync = now
+
+    def close(self):
+        if self._file:
+            self._file.flush()
+            if self.fsyncPolicy != 'never':
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
+##################################################################
+# Syslog over UDP, one record per datagram (RFC 5426).
+##################################################################
+class UdpSink(object):
+
+    # Larger records are truncated, as a syslog relay would do
+    MAX_DATAGRAM = 65000
+
+    def __init__(self, host, port):
+        self.address = (host, int(port))
+        self._sock = None
+
+    def __str__(self):
+        return "udp://{}:{}".format(*self.address)
+
+    def open(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write(self, records, sync=False):
+        for record in records:
+            self._sock.sendto(record.encode('utf-8')[:self.MAX_DATAGRAM], self.address)
+
+    def close(self):
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+
+
+##################################################################
+# Syslog over a stream socket with octet-counting framing
+# ("<length> <record>", RFC 6587), so that records with line breaks
+# in their description stay in one piece.
+#
+# The connection is kept open and reused. A batch goes out in one
+# send. On a send error the connection is re-opened and the batch is
+# sent again once. If that fails too the error is raised and the
+# writer keeps the batch to retry it later.
+##################################################################
+class StreamSink(object):
+
+    def __init__(self, family, address, reconnectInterval=5.0):
+        self.family = family
+        self.address = address
+        self.reconnectInterval = reconnectInterval
+        self._sock = None
+        self._lastConnect = 0
+
+    def __str__(self):
+        if self.family == socket.AF_UNIX:
+            return "unix://{}".format(self.address)
+        return "tcp://{}:{}".format(*self.address)
+
+    def open(self):
+        try:
+            self._connect()
+        except socket.error as e:
+            # The receiver may start later, connect on the first write
+            logging.warning("Syslog sink {} not connected yet : {}".format(self, e))
+
+    def _connect(self):
+        self.close()
+        self._lastConnect = time.time()
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        sock.settimeout(10)
+        sock.connect(self.address)
+        self._sock = sock
+        logging.info("Syslog sink {} connected".format(self))
+
+    @staticmethod
+    def _frame(records):
+        frames = []
+        for record in records:
+            data = record.encode('utf-8')
+            frames.append(str(len(data)).encode('ascii') + b' ' + data)
+        return b''.join(frames)
+
+    def write(self, records, sync=False):
+        if not records:
+            return
+        data = self._frame(records)
+
+        # Do not hold the writer on a receiver which is down
+        if self._sock is None and time.time() - self._lastConnect < self.reconnectInterval:
+            raise Exception("Syslog sink {} unavailable".format(self))
+
+        for attempt in range(2):
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(data)
+                return
+            except socket.error as e:
+                logging.warning("Syslog sink {} send failed : {}".format(self, e))
+                self.close()
+
+        raise Exception("Syslog sink {} unavailable".format(self))
+
+    def close(self):
+        if self._sock:
+            try:
+                self._sock.close()
+            except socket.error:
+                pass
+            self._sock = None
+
+
+##################################################################
+# Create the sinks of a comma separated list of specs:
+#   file                  - the syslog file
+#   udp://host:port       - syslog over UDP
+#   tcp://host:port       - syslog over TCP, octet-counting framing
+#   unix:///path/to/sock  - local stream socket, octet-counting framing
+##################################################################
+def create_sinks(specs, fileName, fsyncPolicy='batch', fsyncInterval=5.0):
+    if isinstance(specs, str):
+        specs = specs.split(',')
+
+    sinks = []
+    for spec in [spec.strip() for spec in specs if spec.strip()]:
+        if spec == 'file':
+            sinks.append(FileSink(fileName, fsyncPolicy, fsyncInterval))
+        elif spec.startswith('udp://'):
+            host, _, port = spec[len('udp://'):].rpartition(':')
+            sinks.append(UdpSink(host, port))
+        elif spec.startswith('tcp://'):
+            host, _, port = spec[len('tcp://'):].rpartition(':')
+            sinks.append(StreamSink(socket.AF_INET, (host, int(port))))
+        elif spec.startswith('unix://'):
+            sinks.append(StreamSink(socket.AF_UNIX, spec[len('unix://'):]))
+        else:
+            raise Exception("Invalid syslog sink - \"{}\". Valid sinks - file, udp://host:port, tcp://host:port, unix:///path".format(spec))
+
+    if not sinks:
+        raise Exception("No syslog sink configured")
+    return sinks
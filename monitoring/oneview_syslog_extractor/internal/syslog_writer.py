@@ -0,0 +1,258 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import logging
+import os
+import queue
+import threading
+import time
+import multiprocessing as mp
+from collections import deque
+
+from internal.syslog_sinks import FileSink
+
+# Marker pushed on the queue to stop the writer thread
+_STOP = None
+
+
+##################################################################
+# Single writer for the syslog file.
+#
+# Producers (SCMB callback, polling processes, logAlerts) only push
+# messages on a multiprocessing queue. One thread in the process that
+# started the writer owns the sinks (the syslog file by default),
+# keeps them open and writes the messages in batches.
+#
+# Producers in the writer's process can ask to be told when their
+# messages are durable with requestSync()/isSynced(). A sync marker
+# follows the messages through the queue and forces a flush of the
+# sinks (and an fsync of the file unless the policy is 'never') when
+# the writer reaches it.
+#
+# A batch a sink fails to take is kept in a retry buffer of that sink
+# and sent again, in order, before any newer batch. A sync token is
+# only reported synced once every batch before it is delivered to all
+# the sinks. The retry buffers are bounded by 'retryLines' records,
+# past which the oldest batches are dropped.
+##################################################################
+class SyslogWriter(object):
+
+    def __init__(self, fileName, flushLines=500, flushInterval=1.0,
+                 fsyncPolicy='batch', fsyncInterval=5.0, queueSize=100000, sinks=None,
+                 retryLines=100000):
+        self.fileName = fileName
+        self.flushLines = max(1, int(flushLines))
+        self.flushInterval = float(flushInterval)
+        self.retryLines = max(0, int(retryLines))
+        self.sinks = sinks or [FileSink(fileName, fsyncPolicy, fsyncInterval)]
+
+        # Per sink: (batch number, records) not delivered yet, and their record count
+        self._retry = [deque() for _ in self.sinks]
+        self._retryCount = [0] * len(self.sinks)
+        self.dropped = [0] * len(self.sinks)
+        self._failing = [False] * len(self.sinks)
+        self._batchNumber = 0
+        # (batch number, token) of the sync markers not reported yet
+        self._pendingSyncs = deque()
+
+        # Created before any fork so that child processes inherit it
+        self.queue = mp.Queue(queueSize)
+
+        self._thread = None
+        self._ownerPid = None
+
+        # Sync markers are integers, messages are strings
+        self._syncLock = threading.Condition()
+        self._lastSyncToken = 0
+        self._syncedToken = 0
+
+    ##################################################################
+    # Start the writer thread in the current process.
+    ##################################################################
+    def start(self):
+        if self._thread is not None:
+            return
+
+        for sink in self.sinks:
+            sink.open()
+        self._ownerPid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="syslog-writer")
+        self._thread.daemon = True
+        self._thread.start()
+        logging.info("Syslog writer started. sinks = %s, flushLines = %s, flushInterval = %s",
+                     ", ".join(str(sink) for sink in self.sinks), self.flushLines, self.flushInterval)
+
+    ##################################################################
+    # Queue a message. Safe to call from any process forked after
+    # the writer was created.
+    ##################################################################
+    def write(self, message):
+        self.queue.put(message)
+
+    ##################################################################
+    # Queue a sync marker behind the messages already written by this
+    # process. Returns a token for isSynced()/waitSynced().
+    ##################################################################
+    def requestSync(self):
+        with self._syncLock:
+            self._lastSyncToken += 1
+            token = self._lastSyncToken
+        self.queue.put(token)
+        return token
+
+    ##################################################################
+    # True once all the messages queued before the marker 'token' are
+    # written (and fsync'ed, depending on the policy).
+    ##################################################################
+    def isSynced(self, token):
+        return self._syncedToken >= token
+
+    def waitSynced(self, token, timeout=None):
+        with self._syncLock:
+            return self._syncLock.wait_for(lambda: self._syncedToken >= token, timeout)
+
+    def _markSynced(self, token):
+        with self._syncLock:
+            self._syncedToken = max(self._syncedToken, token)
+            self._syncLock.notify_all()
+
+    ##################################################################
+    # Stop the writer and drain all the queued messages to the file.
+    # Only the process that started the writer owns the file, so this
+    # is a no-op in the forked workers.
+    ##################################################################
+    def stop(self, timeout=10):
+        if self._thread is None or self._ownerPid != os.getpid():
+            return
+
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logging.warning("Syslog writer did not drain within {} seconds.".format(timeout))
+        self._thread = None
+
+    ##################################################################
+    # Write a batch to all the sinks, after the batches each sink still
+    # has to retry. A failing sink does not stop the others, it keeps
+    # the batch in its retry buffer. Then report the sync tokens whose
+    # earlier batches are now delivered everywhere.
+    ##################################################################
+    def _flush(self, batch, syncToken=0):
+        self._batchNumber += 1
+        if syncToken:
+            self._pendingSyncs.append((self._batchNumber, syncToken))
+
+        for idx, sink in enumerate(self.sinks):
+            retry = self._retry[idx]
+            if batch or syncToken:
+                retry.append((self._batchNumber, batch))
+                self._retryCount[idx] += len(batch)
+            try:
+                while retry:
+                    sink.write(retry[0][1], bool(syncToken))
+                    self._retryCount[idx] -= len(retry.popleft()[1])
+                if self._failing[idx]:
+                    logging.info("Syslog sink {} delivering again".format(sink))
+                    self._failing[idx] = False
+            except Exception as e:
+                # Logged once per outage, the batches are retried every flushInterval
+                if not self._failing[idx]:
+                    logging.error("Error in writing to syslog sink {} : {}. Retrying".format(sink, e))
+                    self._failing[idx] = True
+                self._trimRetry(idx)
+
+        # Everything before the oldest batch still to retry is delivered
+        undelivered = min([retry[0][0] for retry in self._retry if retry] or [self._batchNumber + 1])
+        synced = 0
+        while self._pendingSyncs and self._pendingSyncs[0][0] < undelivered:
+            synced = self._pendingSyncs.popleft()[1]
+        if synced:
+            self._markSynced(synced)
+
+    def _trimRetry(self, idx):
+        retry = self._retry[idx]
+        while self._retryCount[idx] > self.retryLines and len(retry) > 1:
+            records = retry.popleft()[1]
+            self._retryCount[idx] -= len(records)
+            self.dropped[idx] += len(records)
+            logging.error("Syslog sink {} retry buffer full. {} records dropped so far".format(
+                self.sinks[idx], self.dropped[idx]))
+
+    def _retrying(self):
+        return any(self._retry)
+
+    def _run(self):
+        batch = []
+        lastFlush = time.time()
+        stopping = False
+
+        while not stopping:
+            timeout = max(0, lastFlush + self.flushInterval - time.time())
+            try:
+                item = self.queue.get(timeout=timeout if batch else self.flushInterval)
+            except queue.Empty:
+                item = ""
+
+            # Pick up whatever else is already queued, up to a full batch
+            # or up to a sync marker
+            syncToken = 0
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                if isinstance(item, int):
+                    syncToken = item
+                    break
+                if item:
+                    batch.append(item)
+                if len(batch) >= self.flushLines:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            due = stopping or time.time() - lastFlush >= self.flushInterval
+            if syncToken or (batch and (due or len(batch) >= self.flushLines)) or \
+               (due and self._retrying()):
+                self._flush(batch, syncToken)
+                batch = []
+                lastFlush = time.time()
+
+        # Drain-on-shutdown: messages queued after the stop marker
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, int):
+                continue
+            if item:
+                batch.append(item)
+
+        if batch or self._retrying():
+            self._flush(batch)
+        for idx, sink in enumerate(self.sinks):
+            if self._retry[idx]:
+                logging.error("Syslog sink {} stopped with {} records not delivered".format(
+                    sink, self._retryCount[idx]))
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                logging.error("Error in closing syslog sink {} : {}".format(sink, e))
+        logging.info("Syslog writer stopped.")
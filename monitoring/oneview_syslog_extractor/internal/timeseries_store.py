@@ -0,0 +1,467 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import argparse
+import bisect
+import fnmatch
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+# Samples of the open time windows: series id, timestamp (ms), value
+RECORD = struct.Struct('<Iqd')
+# Closed segments: magic and number of series, then per series its id,
+# sample count and the offset of its chunk. A chunk is the timestamps
+# (int64) of the series followed by its values (float64).
+SEGMENT_HEADER = struct.Struct('<4sI')
+CHUNK_ENTRY = struct.Struct('<IIQ')
+SEGMENT_MAGIC = b'TSC1'
+SERIES_INDEX = "series.idx"
+OPEN_SEGMENT = ".log"
+RAW_SEGMENT = ".seg"
+DOWNSAMPLED_SEGMENT = ".ds"
+# Samples come in roughly in time order, the two newest windows stay open
+OPEN_WINDOWS = 2
+# Default length of the time windows, one segment file each
+SEGMENT_SECONDS = 3600
+
+
+##################################################################
+# Key of a series: appliance, resource type, resource and metric.
+##################################################################
+def seriesKey(host, resourceType, resource, metric):
+    return "{}|{}|{}|{}".format(host, resourceType, resource, metric)
+
+
+def _toBytes(column):
+    if sys.byteorder != 'little':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _fromBytes(typecode, data):
+    column = array(typecode)
+    column.frombytes(data)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column
+
+
+##################################################################
+# Local time-series store of the polled statistics.
+#
+# The samples of a time window ('segmentSeconds' long) are appended to
+# the log of the window as fixed size records, and kept in memory as
+# timestamp and value columns (arrays) per series while the window is
+# open. When a newer window opens, the oldest one is closed: its
+# columns are written to a segment file as one chunk per series, with
+# an index of the chunks at the start. A query reads the index (kept
+# in a small cache) and then only the chunk of its own series, and
+# picks the samples in range by bisection.
+#
+# The logs left by a crash are read back on start. maintain() deletes
+# the segments older than the retention, and replaces the segments
+# older than 'downsampleAfter' seconds by their averages over
+# 'downsampleStep' seconds.
+#
+# Used from several threads of one process.
+##################################################################
+class TimeSeriesStore(object):
+
+    def __init__(self, directory, segmentSeconds=SEGMENT_SECONDS, retention=30 * 86400,
+                 downsampleAfter=86400, downsampleStep=300, cacheSegments=256):
+        self.directory = directory
+        self.segmentMs = int(segmentSeconds * 1000)
+        self.retentionMs = int(retention * 1000)
+        self.downsampleAfterMs = int(downsampleAfter * 1000)
+        self.downsampleStepMs = int(downsampleStep * 1000)
+        # The segments are downsampled one by one, a step across two of
+        # them would give two samples with the same timestamp
+        if self.downsampleStepMs <= 0 or self.segmentMs % self.downsampleStepMs:
+            raise Exception("Downsample step of {} sec does not divide the segments of {} sec".format(
+                downsampleStep, segmentSeconds))
+        self.cacheSegments = cacheSegments
+
+        self._lock = threading.RLock()
+        self._ids = {}              # key -> series id
+        self._keys = []             # series id -> key
+        self._lastTimestamp = {}    # series id -> newest timestamp stored
+        self._windows = {}          # window start -> (log file, {series id: (timestamps, values)})
+        self._cache = OrderedDict() # segment file -> {series id: (count, offset)}
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._index = open(os.path.join(directory, SERIES_INDEX), 'a+')
+        self._loadIndex()
+
+    ##################################################################
+    # Series ids, the windows still open when the store was last
+    # closed, and the newest sample of each series from the last
+    # windows so that samples already stored are not appended again.
+    ##################################################################
+    def _loadIndex(self):
+        self._index.seek(0)
+        for line in self._index:
+            sid, key = line.rstrip('\n').split('\t', 1)
+            self._ids[key] = int(sid)
+            self._keys.append(key)
+
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(OPEN_SEGMENT):
+                window = int(name.split('.')[0])
+                columns = self._readLog(os.path.join(self.directory, name))
+                self._windows[window] = (open(os.path.join(self.directory, name), 'ab'), columns)
+        self._closeOldWindows()
+
+        for path in self._segmentFiles()[-OPEN_WINDOWS:]:
+            self._updateLastTimestamps(self._readSegment(path))
+        for _, columns in self._windows.values():
+            self._updateLastTimestamps(columns)
+
+    def _updateLastTimestamps(self, columns):
+        for sid, (timestamps, _) in columns.items():
+            if timestamps:
+                self._lastTimestamp[sid] = max(self._lastTimestamp.get(sid, 0), timestamps[-1])
+
+    def _path(self, window, suffix):
+        return os.path.join(self.directory, "{}{}".format(window, suffix))
+
+    def _segmentFiles(self, suffixes=(RAW_SEGMENT, DOWNSAMPLED_SEGMENT)):
+        names = [name for name in os.listdir(self.directory) if name.endswith(suffixes)]
+        return [os.path.join(self.directory, name) for name in sorted(names, key=lambda name: int(name.split('.')[0]))]
+
+    @staticmethod
+    def _segmentStart(path):
+        return int(os.path.basename(path).split('.')[0])
+
+    def _seriesId(self, key):
+        sid = self._ids.get(key)
+        if sid is None:
+            sid = len(self._keys)
+            self._ids[key] = sid
+            self._keys.append(key)
+            self._index.write("{}\t{}\n".format(sid, key))
+            self._index.flush()
+        return sid
+
+    ##################################################################
+    # Store the samples [(timestamp ms, value), ..] of a series. The
+    # samples at or before the newest one already stored are skipped,
+    # so overlapping sample windows can be appended as they come.
+    ##################################################################
+    def append(self, key, samples):
+        with self._lock:
+            sid = self._seriesId(key)
+            last = self._lastTimestamp.get(sid, 0)
+            added = 0
+            for timestamp, value in sorted(samples):
+                if timestamp <= last or value is None:
+                    continue
+                window = timestamp - timestamp % self.segmentMs
+                opened = self._windows.get(window) or self._openWindow(window)
+                if opened is None:
+                    continue
+                logFile, columns = opened
+                timestamp, value = int(timestamp), float(value)
+                logFile.write(RECORD.pack(sid, timestamp, value))
+                column = columns.get(sid)
+                if column is None:
+                    column = columns[sid] = (array('q'), array('d'))
+                column[0].append(timestamp)
+                column[1].append(value)
+                last = timestamp
+                added += 1
+            self._lastTimestamp[sid] = last
+            self._closeOldWindows()
+            return added
+
+    def _openWindow(self, window):
+        # Late samples of a window already averaged are not stored
+        if os.path.exists(self._path(window, DOWNSAMPLED_SEGMENT)):
+            return None
+        opened = (open(self._path(window, OPEN_SEGMENT), 'ab'), {})
+        self._windows[window] = opened
+        return opened
+
+    ##################################################################
+    # Write the columns of the windows older than the newest ones to
+    # their segment files. A window opened again by late samples is
+    # merged with its segment.
+    ##################################################################
+    def _closeOldWindows(self):
+        for window in sorted(self._windows)[:-OPEN_WINDOWS]:
+            logFile, columns = self._windows.pop(window)
+            logFile.close()
+            path = self._path(window, RAW_SEGMENT)
+            if os.path.exists(path):
+                merged = self._readSegment(path)
+                for sid, (timestamps, values) in columns.items():
+                    column = merged.setdefault(sid, (array('q'), array('d')))
+                    column[0].extend(timestamps)
+                    column[1].extend(values)
+                columns = merged
+            self._writeSegment(path, columns)
+            self._cache.pop(path, None)
+            os.remove(self._path(window, OPEN_SEGMENT))
+
+    def flush(self):
+        with self._lock:
+            for logFile, _ in self._windows.values():
+                logFile.flush()
+
+    ##################################################################
+    # {series id: (timestamps, values)} of the log of an open window
+    ##################################################################
+    def _readLog(self, path):
+        columns = {}
+        with open(path, 'rb') as logFile:
+            data = logFile.read()
+        # Ignore a record cut short by a crash
+        data = data[:len(data) - len(data) % RECORD.size]
+        for sid, timestamp, value in RECORD.iter_unpack(data):
+            column = columns.get(sid)
+            if column is None:
+                column = columns[sid] = (array('q'), array('d'))
+            column[0].append(timestamp)
+            column[1].append(value)
+        return columns
+
+    def _writeSegment(self, path, columns):
+        sids = sorted(sid for sid in columns if columns[sid][0])
+        offset = SEGMENT_HEADER.size + CHUNK_ENTRY.size * len(sids)
+        with open(path + ".tmp", 'wb') as out:
+            out.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, len(sids)))
+            for sid in sids:
+                count = len(columns[sid][0])
+                out.write(CHUNK_ENTRY.pack(sid, count, offset))
+                offset += count * (8 + 8)
+            for sid in sids:
+                timestamps, values = columns[sid]
+                out.write(_toBytes(timestamps))
+                out.write(_toBytes(values))
+            out.flush()
+            os.fsync(out.fileno())
+        os.rename(path + ".tmp", path)
+
+    ##################################################################
+    # {series id: (count, offset)} of the chunks of a segment file
+    ##################################################################
+    def _chunks(self, path):
+        chunks = self._cache.get(path)
+        if chunks is not None:
+            self._cache.move_to_end(path)
+            return chunks
+
+        chunks = {}
+        with open(path, 'rb') as segmentFile:
+            magic, count = SEGMENT_HEADER.unpack(segmentFile.read(SEGMENT_HEADER.size))
+            if magic != SEGMENT_MAGIC:
+                logging.warning("Time-series segment {} has an unknown format, ignored".format(path))
+            else:
+                entries = segmentFile.read(CHUNK_ENTRY.size * count)
+                for sid, samples, offset in CHUNK_ENTRY.iter_unpack(entries):
+                    chunks[sid] = (samples, offset)
+
+        self._cache[path] = chunks
+        while len(self._cache) > self.cacheSegments:
+            self._cache.popitem(last=False)
+        return chunks
+
+    def _readChunk(self, segmentFile, count, offset):
+        segmentFile.seek(offset)
+        data = segmentFile.read(count * (8 + 8))
+        return _fromBytes('q', data[:count * 8]), _fromBytes('d', data[count * 8:])
+
+    def _readSegment(self, path):
+        columns = {}
+        with open(path, 'rb') as segmentFile:
+            for sid, (count, offset) in self._chunks(path).items():
+                columns[sid] = self._readChunk(segmentFile, count, offset)
+        return columns
+
+    @staticmethod
+    def _slice(column, start, end):
+        timestamps, values = column
+        low = bisect.bisect_left(timestamps, start)
+        high = bisect.bisect_right(timestamps, end)
+        return zip(timestamps[low:high], values[low:high])
+
+    ##################################################################
+    # Keys of the series matching a shell-style pattern.
+    ##################################################################
+    def keys(self, pattern='*'):
+        with self._lock:
+            return [key for key in self._keys if fnmatch.fnmatchcase(key, pattern)]
+
+    ##################################################################
+    # Samples [(timestamp ms, value), ..] of a series between 'start'
+    # and 'end' (ms, inclusive), oldest first.
+    ##################################################################
+    def range(self, key, start=0, end=None):
+        end = end if end is not None else int(time.time() * 1000)
+        with self._lock:
+            sid = self._ids.get(key)
+            if sid is None:
+                return []
+            samples = []
+            for path in self._segmentFiles():
+                segment = self._segmentStart(path)
+                if segment + self.segmentMs <= start or segment > end:
+                    continue
+                chunk = self._chunks(path).get(sid)
+                if chunk:
+                    with open(path, 'rb') as segmentFile:
+                        samples.extend(self._slice(self._readChunk(segmentFile, *chunk), start, end))
+            for window, (_, columns) in self._windows.items():
+                if window + self.segmentMs <= start or window > end:
+                    continue
+                column = columns.get(sid)
+                if column:
+                    samples.extend(self._slice(column, start, end))
+        samples.sort()
+        return samples
+
+    ##################################################################
+    # Per second rate of a counter series [(timestamp ms, rate), ..].
+    # A counter going down (reset) starts over from the next sample.
+    ##################################################################
+    def rate(self, key, start=0, end=None):
+        samples = self.range(key, start, end)
+        rates = []
+        for (t0, v0), (t1, v1) in zip(samples, samples[1:]):
+            if t1 > t0 and v1 >= v0:
+                rates.append((t1, (v1 - v0) * 1000.0 / (t1 - t0)))
+        return rates
+
+    ##################################################################
+    # Nearest-rank percentile (0-100) of the values of a series.
+    ##################################################################
+    def percentile(self, key, percent, start=0, end=None):
+        values = sorted(value for _, value in self.range(key, start, end))
+        if not values:
+            return None
+        rank = max(0, min(len(values) - 1, int(-(-percent * len(values) // 100)) - 1))
+        return values[rank]
+
+    ##################################################################
+    # Apply the retention and downsampling to the closed segments.
+    ##################################################################
+    def maintain(self, now=None):
+        now = now if now is not None else int(time.time() * 1000)
+        removed = downsampled = 0
+        with self._lock:
+            for path in self._segmentFiles():
+                segment = self._segmentStart(path)
+                if segment in self._windows:
+                    continue
+                if segment + self.segmentMs < now - self.retentionMs:
+                    os.remove(path)
+                    removed += 1
+                elif path.endswith(RAW_SEGMENT) and segment + self.segmentMs < now - self.downsampleAfterMs:
+                    self._downsample(path)
+                    downsampled += 1
+                else:
+                    continue
+                self._cache.pop(path, None)
+        if removed or downsampled:
+            logging.info("Time-series store: {} segments removed, {} downsampled".format(removed, downsampled))
+        return removed, downsampled
+
+    def _downsample(self, path):
+        averaged = {}
+        for sid, (timestamps, values) in self._readSegment(path).items():
+            buckets = OrderedDict()
+            for timestamp, value in zip(timestamps, values):
+                bucket = buckets.setdefault(timestamp - timestamp % self.downsampleStepMs, [0.0, 0])
+                bucket[0] += value
+                bucket[1] += 1
+            averaged[sid] = (array('q', buckets.keys()),
+                             array('d', [total / count for total, count in buckets.values()]))
+        self._writeSegment(path[:-len(RAW_SEGMENT)] + DOWNSAMPLED_SEGMENT, averaged)
+        os.remove(path)
+
+    ##################################################################
+    # Run maintain() every 'interval' seconds in a background thread.
+    ##################################################################
+    def startMaintenance(self, interval=600):
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stopEvent.wait(interval):
+                try:
+                    self.maintain()
+                except Exception as e:
+                    logging.error("Error in maintaining the time-series store : {}".format(e))
+
+        self._thread = threading.Thread(target=run, name="timeseries-maintenance")
+        self._thread.daemon = True
+        self._thread.start()
+
+    ##################################################################
+    # The open windows stay in their logs, read back on the next start.
+    ##################################################################
+    def close(self):
+        self._stopEvent.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            for logFile, _ in self._windows.values():
+                logFile.close()
+            self._windows = {}
+            self._index.close()
+
+
+##################################################################
+# Query the store from the command line, e.g. the 95th percentile of
+# the CPU utilization of the servers over the last week:
+#
+#   python -m internal.timeseries_store logs/timeseries \
+#       --keys '*|server-hardware|*|CpuUtilization' --percentile 95 --since 604800
+##################################################################
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query the time-series store")
+    parser.add_argument('directory')
+    parser.add_argument('--keys', default='*', help="pattern of the series keys")
+    parser.add_argument('--since', type=float, default=86400, help="seconds back from now")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--percentile', type=float)
+    group.add_argument('--rate', action='store_true')
+    args = parser.parse_args()
+
+    store = TimeSeriesStore(args.directory)
+    end = int(time.time() * 1000)
+    start = end - int(args.since * 1000)
+    result = {}
+    for key in store.keys(args.keys):
+        if args.percentile is not None:
+            result[key] = store.percentile(key, args.percentile, start, end)
+        elif args.rate:
+            result[key] = store.rate(key, start, end)
+        else:
+            result[key] = store.range(key, start, end)
+    print(json.dumps(result, indent=2))
@@ -29,17 +29,16 @@ import logging
 import signal
 import base64
 
-import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from os import environ
 
-from hpOneView.oneview_client import OneViewClient
-from ov_client.oneview_client import acceptEULA
+import ov_client.rate_limiter as ratelimit
 
 import internal.config as conf
-import internal.polling_processes as polling
+import internal.instrumentation as instrumentation
 import internal.logutils as ovlog
-import internal.scmb_utils as ovscmb
+from internal.supervisor import ApplianceSupervisor
 
 ##################################################################
 # Registering the signal handler for CTRL+C
@@ -49,6 +48,7 @@ import internal.scmb_utils as ovscmb
 def signal_handler(signal, frame):
     # print('You pressed Ctrl+C! Exiting.')
     logging.info('You pressed Ctrl+C! Exiting.')
+    ovlog.shutdown_logging()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
@@ -67,7 +67,15 @@ def main():
 
     # Initialize logging
     ovlog.initialize_logging(syslogDir=oneviewDetails.get('syslogDir'),
-                             syslogFile=oneviewDetails.get('syslog'))
+                             syslogFile=oneviewDetails.get('syslog'),
+                             flushLines=oneviewDetails['syslog_flush_lines'],
+                             flushInterval=oneviewDetails['syslog_flush_interval'],
+                             fsyncPolicy=oneviewDetails['syslog_fsync'],
+                             checkpointFlushMs=oneviewDetails['checkpoint_flush_ms'],
+                             checkpointFlushMessages=oneviewDetails['checkpoint_flush_messages'],
+                             syslogFormat=oneviewDetails['syslog_format'],
+                             syslogSinks=oneviewDetails['syslog_sinks'],
+                             retryLines=oneviewDetails['syslog_retry_lines'])
 
 
     # get the logging level
@@ -75,7 +83,68 @@ def main():
         logLevel = logging.getLevelName(inputConfig["logging_level"].upper())
         logging.getLogger().setLevel(logLevel)
 
-    # Get OneView Password
+    appliances = inputConfig["appliances"]
+    for appliance in appliances:
+        getPassword(appliance)
+        conf.validate_input(appliance)
+
+    # Latency histograms and counters, in activity.log periodically and on SIGUSR1
+    instrumentation.start_reporting(oneviewDetails['stats_interval'])
+
+    # OneView API budget of each appliance, shared by its pollers
+    for appliance in appliances:
+        ratelimit.install(appliance['host'], appliance['ov_api_rate'], appliance['ov_api_burst'])
+
+    # Server index shared with the pollers
+    ovlog.initialize_inventory(oneviewDetails['inventory_capacity'])
+
+    # Last state of the polled resources, for the changes-only NodeStats
+    if any(appliance['nodestats_mode'] == 'changes' for appliance in appliances):
+        ovlog.initialize_snapshots(oneviewDetails['snapshot_capacity'])
+
+    # Rates of the linked ports from their octet counters
+    ovlog.initialize_port_rates(oneviewDetails['port_util_threshold'])
+
+    # Prometheus endpoint fed by the collectors
+    if oneviewDetails['metrics_port']:
+        ovlog.initialize_metrics_exporter(oneviewDetails['metrics_port'], oneviewDetails['metrics_address'])
+
+    # Every utilization sample and port counter, for local capacity queries
+    if oneviewDetails['timeseries_dir']:
+        ovlog.initialize_timeseries(oneviewDetails['timeseries_dir'],
+                                    retention=oneviewDetails['timeseries_retention'],
+                                    downsampleAfter=oneviewDetails['timeseries_downsample_after'],
+                                    downsampleStep=oneviewDetails['timeseries_downsample_step'])
+
+    # Poller threads shared by all the appliances
+    threadPool = ThreadPoolExecutor(max_workers=oneviewDetails['ov_pool_size'])
+
+    # Alerts straight to ServiceNow
+    if oneviewDetails['servicenow_pipeline']:
+        ovlog.initialize_pipeline(oneviewDetails['servicenow_pipeline'],
+                                  audit=oneviewDetails['servicenow_audit_syslog'])
+
+    supervisors = [ApplianceSupervisor(appliance, threadPool) for appliance in appliances]
+    for supervisor in supervisors:
+        supervisor.start()
+
+    # Wait in short steps so that Ctrl+C is handled by the main thread
+    while any(supervisor.is_alive() for supervisor in supervisors):
+        for supervisor in supervisors:
+            supervisor.join(1)
+
+    threadPool.shutdown()
+    instrumentation.log_summary()
+
+    # Flush whatever is still queued for the syslog file
+    ovlog.shutdown_logging()
+
+
+##################################################################
+# Get the OneView password of an appliance, from the input file
+# (base64 encoded) or from OV_PASSWORD.
+##################################################################
+def getPassword(oneviewDetails):
     if not oneviewDetails.get('passwd'):
         if "OV_PASSWORD" in environ:
             oneviewDetails["passwd"] = environ["OV_PASSWORD"]
@@ -87,60 +156,6 @@ def main():
         password = base64.b64decode(oneviewDetails['passwd'].encode('utf-8'))
         oneviewDetails['passwd'] = password.decode('utf-8')
 
-    conf.validate_input(oneviewDetails)
-
-    # Logging input details.
-    logging.info('OneView args: host = %s, alias = %s, route = %s', \
-        oneviewDetails["host"], oneviewDetails["alias"], oneviewDetails["route"])
-
-    ovConfig = {
-        "ip": oneviewDetails["host"],
-        "credentials": {
-            "userName": oneviewDetails["user"],
-            "password": oneviewDetails["passwd"],
-            "authLoginDomain": oneviewDetails['authLoginDomain']
-        },
-        'api_version': 600
-    }
-
-    try:
-        oneview_client = OneViewClient(ovConfig)
-        acceptEULA(oneview_client)
-        logging.info("Connected to OneView appliance : {}".format(oneviewDetails["host"]))
-    except Exception as e:
-        err = "Error connecting to appliance: {}\n Check for oneview details in the input file".format(e)
-        logging.error(e)
-        raise Exception(err)
-
-    print("Connected to OneView appliance : {}".format(oneviewDetails["host"]))
-    ovlog.create_server_map(oneview_client)
-
-     # Create certs directory for storing the OV certificates
-    #ovscmb.setupAmqpCerts(oneview_client, oneviewDetails["host"])
-    ovscmb.setupAmqpCerts(oneview_client, oneviewDetails)
-
-
-    if oneviewDetails['collect_stats']:
-        # Creating new process for polling processes
-        #pollProcess = mp.Process(target=process_threads, args=(oneview_client, conf['alertHardwareTypes'], int(refreshDuration), ))
-        pollProcess = mp.Process(target=polling.process_threads,
-                                 args=(oneview_client,
-                                       oneviewDetails['alert_hardware_category'],
-                                       oneviewDetails['refresh_interval'], ))
-        pollProcess.start()
-
-    if oneviewDetails['collect_hpeov_service_info']:
-        # Creating new process for polling HPE OV Service tickets
-        hpeTicketProcess = mp.Process(target=polling.collect_hpeov_service_info,
-                                      args=(oneview_client, ))
-        hpeTicketProcess.start()
-
-    # Logging all active alerts to syslog
-    ovlog.logAlerts(oneview_client, "activeAlerts")
-
-    # Start listening for messages.
-    ovscmb.recv(oneviewDetails["host"], oneviewDetails["route"])
-    
 ##################################################################
 # Code execution flow to main() routine from here.
 #
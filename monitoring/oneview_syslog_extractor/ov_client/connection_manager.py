@@ -0,0 +1,204 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import json
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import internal.instrumentation as instrumentation
+import ov_client.rate_limiter as ratelimit
+
+LOGIN_URI = '/rest/login-sessions'
+DEFAULT_API_VERSION = 600
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TIMEOUT = 60
+
+
+##################################################################
+# Connection to the REST API of one OneView appliance.
+#
+# Owns a pool of keep-alive HTTPS connections and the session token
+# of the appliance. Safe to use from any number of threads: a token
+# rejected with 401 is refreshed once by the first thread seeing it
+# and the request is sent again.
+#
+# Every request waits for the API budget of the appliance, and its
+# latency is recorded per endpoint in the instrumentation histograms.
+##################################################################
+class OneViewConnection(object):
+
+    def __init__(self, host, user, passwd, authLoginDomain='LOCAL', apiVersion=DEFAULT_API_VERSION,
+                 poolSize=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, verify=False):
+        self.host = host
+        self.apiVersion = apiVersion
+        self.timeout = timeout
+        self._credentials = {'userName': user, 'password': passwd,
+                             'authLoginDomain': authLoginDomain, 'loginMsgAck': 'true'}
+
+        self.verify = verify
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, int(poolSize)))
+        self.session.mount('https://', adapter)
+
+        self._authLock = threading.Lock()
+        self._token = None
+        self._tokenGeneration = 0
+
+    def get_host(self):
+        return self.host
+
+    def _url(self, path):
+        return path if path.startswith('https://') else 'https://{}{}'.format(self.host, path)
+
+    ##################################################################
+    # Log in and keep the session token. Only logs in again if the
+    # token of 'generation' is still the current one, so concurrent
+    # threads rejected with the same token refresh it only once.
+    ##################################################################
+    def login(self, generation=None):
+        with self._authLock:
+            if generation is not None and generation != self._tokenGeneration:
+                return
+            startTime = time.time()
+            response = self.session.post(self._url(LOGIN_URI), data=json.dumps(self._credentials),
+                                         headers={'X-Api-Version': str(self.apiVersion),
+                                                  'Content-Type': 'application/json'},
+                                         timeout=self.timeout, verify=self.verify)
+            self._record("login", time.time() - startTime, response.status_code >= 400)
+            if response.status_code >= 400:
+                raise Exception("Login to OneView {} failed with status {}".format(self.host, response.status_code))
+            self._token = response.json()['sessionID']
+            self._tokenGeneration += 1
+            logging.info("Logged in to OneView {} (session #{})".format(self.host, self._tokenGeneration))
+
+    ##################################################################
+    # Send a request and return its decoded JSON body. 'endpoint' names
+    # the call in the latency statistics.
+    ##################################################################
+    def request(self, method, path, endpoint=None, params=None, body=None):
+        endpoint = endpoint or "{} {}".format(method, path.split('?')[0])
+        if self._token is None:
+            self.login(self._tokenGeneration)
+
+        for attempt in range(2):
+            generation = self._tokenGeneration
+            headers = {'X-Api-Version': str(self.apiVersion), 'Content-Type': 'application/json',
+                       'auth': self._token}
+            ratelimit.acquire(self.host)
+            startTime = time.time()
+            try:
+                response = self.session.request(method, self._url(path), params=params, headers=headers,
+                                                data=json.dumps(body) if body is not None else None,
+                                                timeout=self.timeout, verify=self.verify)
+            except Exception:
+                self._record(endpoint, time.time() - startTime, True)
+                raise
+            self._record(endpoint, time.time() - startTime, response.status_code >= 400)
+
+            if response.status_code == 401 and attempt == 0:
+                # Session expired or logged out, log in again
+                self.login(generation)
+                continue
+            if response.status_code >= 400:
+                raise Exception("OneView {} {} failed with status {}: {}".format(
+                    method, path, response.status_code, response.text[:200]))
+            return response.json() if response.content else None
+
+    def get(self, path, endpoint=None, params=None):
+        return self.request('GET', path, endpoint, params)
+
+    ##################################################################
+    # Members of a collection. All the pages when count is -1, else
+    # the single page of 'count' members from 'start'.
+    ##################################################################
+    def get_all(self, path, endpoint=None, start=0, count=-1, filter='', query='', sort=''):
+        params = {'start': start}
+        if count != -1:
+            params['count'] = count
+        if filter:
+            params['filter'] = filter
+        if query:
+            params['query'] = query
+        if sort:
+            params['sort'] = sort
+
+        # Like hpOneView, follow the next pages until 'count' members are
+        # read (all of them for -1), the appliance may return smaller pages
+        page = self.get(path, endpoint, params)
+        members = list(page.get('members', []))
+        while (count == -1 or len(members) < count) and page.get('nextPageUri') and page.get('members'):
+            page = self.get(page['nextPageUri'], endpoint)
+            members.extend(page.get('members', []))
+        return members if count == -1 else members[:count]
+
+    def _record(self, endpoint, elapsed, failed):
+        instrumentation.observe("oneview " + endpoint, elapsed)
+        if failed:
+            instrumentation.count("oneview errors")
+
+    def close(self):
+        self.session.close()
+
+
+##################################################################
+# REST resource of the appliance, with the calls of the hpOneView
+# resource clients used by the pollers.
+##################################################################
+class OneViewResource(object):
+
+    def __init__(self, connection, name, uri):
+        self.connection = connection
+        self.name = name
+        self.uri = uri
+
+    def get_all(self, start=0, count=-1, filter='', query='', sort=''):
+        return self.connection.get_all(self.uri, "{}.get_all".format(self.name),
+                                       start, count, filter, query, sort)
+
+    def get(self, uri):
+        return self.connection.get(uri, "{}.get".format(self.name))
+
+    def get_utilization(self, uri):
+        return self.connection.get(uri + '/utilization', "{}.get_utilization".format(self.name))
+
+    def get_ports(self, uri):
+        return self.connection.get_all(uri + '/ports', "{}.get_ports".format(self.name))
+
+    def get_statistics(self, uri, portName=''):
+        return self.connection.get(uri + '/statistics/' + portName, "{}.get_statistics".format(self.name))
+
+
+##################################################################
+# Client of the pollers and alert collectors of an appliance. Drop-in
+# for the hpOneView OneViewClient attributes they use, sharing the
+# pooled connection of the appliance between all the threads.
+##################################################################
+class OneViewRestClient(object):
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.api_version = connection.apiVersion
+        self.alerts = OneViewResource(connection, "alerts", '/rest/alerts')
+        self.enclosures = OneViewResource(connection, "enclosures", '/rest/enclosures')
+        self.server_hardware = OneViewResource(connection, "server_hardware", '/rest/server-hardware')
+        self.interconnects = OneViewResource(connection, "interconnects", '/rest/interconnects')
+        self.sas_interconnects = OneViewResource(connection, "sas_interconnects", '/rest/sas-interconnects')
+        self.logical_interconnects = OneViewResource(connection, "logical_interconnects", '/rest/logical-interconnects')
@@ -16,8 +16,7 @@
 ###
 
 import logging
-from time import sleep
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 ##################################################################
 # Accept OneView Eula.
@@ -35,76 +34,131 @@ def acceptEULA(oneview_client):
         logging.error(e)
 
 
+##################################################################
+# Get the utilization of each resource in 'uris' in parallel, with
+# at most maxInFlight calls outstanding. The results are returned in
+# the order of 'uris'. A failed call returns None for that resource.
+# The connection records the latency of each call.
+##################################################################
+def get_utilizations(resourceClient, endpoint, uris, maxInFlight=8):
+    def fetch(uri):
+        try:
+            return resourceClient.get_utilization(uri)
+        except Exception as e:
+            logging.error("{} failed for {} : {}".format(endpoint, uri, e))
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, maxInFlight)) as executor:
+        return list(executor.map(fetch, uris))
+
+
+##################################################################
+# Build the members of a linked port from the port and its stats.
+#
+##################################################################
+def _port_members(port, advanced_stats):
+    members = {}
+    members['Status'] = port['status']
+    if port['operationalSpeed']:
+        members['Speed'] = port['operationalSpeed']
+    else:
+        members['Speed'] = None
+    if port['neighbor']:
+        if port['neighbor']['remotePortId']:
+            members['adopterPort'] = port['neighbor']['remotePortId']
+        else:
+            members['adopterPort'] = None
+        if port['neighbor']['remoteMgmtAddress']:
+            members['macAddress'] = port['neighbor']['remoteMgmtAddress']
+        else:
+            members['macAddress'] = None
+    else:
+         members['adopterPort'] = None
+         members['macAddress'] = None
+
+    if advanced_stats and advanced_stats['commonStatistics']:
+        members['IfInOctets'] = advanced_stats['commonStatistics']['rfc1213IfInOctets']
+        members['IfOutOctets'] = advanced_stats['commonStatistics']['rfc1213IfOutOctets']
+    else:
+        members['IfInOctets'] = None
+        members['IfOutOctets'] = None
+    return members
+
+
 ##################################################################
 # Process ports status
 #
+# The ports of all interconnects and the statistics of every linked
+# port are fetched concurrently, with at most maxInFlight calls
+# outstanding. The result keeps the order of the interconnects and
+# of the ports returned by OneView.
 ##################################################################
-def get_port_statistics(oneview_client):
+def get_port_statistics(oneview_client, maxInFlight=8):
 
     data = []
 
-    # Get all interconnects and parse them one by one
+    # Get all interconnects
     interconnects = oneview_client.interconnects.get_all()
 
-    for interconnect in interconnects:
-        interconnectName = interconnect['name']
-        linkedPorts = []
-        unlinkedPorts = []
-        # Get all ports in an interconnect
-        interconnect_ports = oneview_client.interconnects.get_ports(interconnect['uri'])
-
-        # get port statistics
-        for port in interconnect_ports:
-            if port['portStatus'] == "Linked":
-                portName = port['portName']
-                members = {}
-                members['Status'] = port['status']
-                advanced_stats = oneview_client.interconnects.get_statistics(interconnect['uri'],portName)
-                if port['operationalSpeed']:
-                    members['Speed'] = port['operationalSpeed']
-                else:
-                    members['Speed'] = None
-                if port['neighbor']:
-                    if port['neighbor']['remotePortId']:
-                        members['adopterPort'] = port['neighbor']['remotePortId']
-                    else:
-                        members['adopterPort'] = None
-                    if port['neighbor']['remoteMgmtAddress']:
-                        members['macAddress'] = port['neighbor']['remoteMgmtAddress']
-                    else:
-                        members['macAddress'] = None
-                else:
-                     members['adopterPort'] = None
-                     members['macAddress'] = None
-
-                if advanced_stats and advanced_stats['commonStatistics']:
-                    members['IfInOctets'] = advanced_stats['commonStatistics']['rfc1213IfInOctets']
-                    members['IfOutOctets'] = advanced_stats['commonStatistics']['rfc1213IfOutOctets']
-                else:
-                    members['IfInOctets'] = None
-                    members['IfOutOctets'] = None
-                linkedPorts.append({'portName':portName,'members': members})
-            elif port['portStatus'] == "Unlinked":
-                unlinkedPorts.append(port['portName'])
-        data.append({'interconnectName' : interconnectName, 'linkedPorts' : linkedPorts ,'unlinkedPorts' : unlinkedPorts})
+    with ThreadPoolExecutor(max_workers=max(1, maxInFlight)) as executor:
+        # Get all ports of every interconnect
+        portFutures = [executor.submit(oneview_client.interconnects.get_ports, interconnect['uri'])
+                       for interconnect in interconnects]
+
+        # Fan out the port statistics as the port lists come in
+        pending = []
+        for interconnect, portFuture in zip(interconnects, portFutures):
+            interconnect_ports = portFuture.result()
+
+            linkedPorts = []
+            unlinkedPorts = []
+            for port in interconnect_ports:
+                if port['portStatus'] == "Linked":
+                    statsFuture = executor.submit(oneview_client.interconnects.get_statistics,
+                                                  interconnect['uri'], port['portName'])
+                    linkedPorts.append((port, statsFuture))
+                elif port['portStatus'] == "Unlinked":
+                    unlinkedPorts.append(port['portName'])
+            pending.append((interconnect['name'], linkedPorts, unlinkedPorts))
+
+        # Collect the results in the original order
+        for interconnectName, linkedPorts, unlinkedPorts in pending:
+            ports = []
+            for port, statsFuture in linkedPorts:
+                advanced_stats = statsFuture.result()
+                ports.append({'portName': port['portName'], 'members': _port_members(port, advanced_stats)})
+            data.append({'interconnectName' : interconnectName, 'linkedPorts' : ports ,'unlinkedPorts' : unlinkedPorts})
+
     return data
 
 
+##################################################################
+# Name of a resource as logged in the NodeStats.
+#
+##################################################################
+def trim_name(name):
+    return (name or '').strip()
+
+
 ##################################################################
 # Get the host's status to update in log file when required.
 #
+# With 'modifiedSince', only the resources modified at or after
+# that time are listed. Logical interconnects can not be filtered
+# and are always listed in full.
 ##################################################################
-def get_hosts_status(oneview_client,hostCategory):
+def get_hosts_status(oneview_client,hostCategory,modifiedSince=None):
     hosts_status = []
+    listArgs = {'filter': "modified>='{}'".format(modifiedSince)} if modifiedSince else {}
 
     if hostCategory == "interconnects":
         #Get all interconnects
         response  = []
-        interconnects = oneview_client.interconnects.get_all()
+        interconnects = oneview_client.interconnects.get_all(**listArgs)
         # Extending the list with interconnects
         response.extend(interconnects)
         # TODO - To be validated in DCS
-        sas_interconnects = oneview_client.sas_interconnects.get_all()
+        sas_interconnects = oneview_client.sas_interconnects.get_all(**listArgs)
         if sas_interconnects:
             # Extending the list with sas-interconnects
             response.extend(sas_interconnects)
@@ -115,11 +169,11 @@ def get_hosts_status(oneview_client,hostCategory):
 
     if hostCategory == 'enclosures':
         # Get all enclosures
-        response = oneview_client.enclosures.get_all()
+        response = oneview_client.enclosures.get_all(**listArgs)
 
     if hostCategory == 'server-hardware':
         # Get all server hardwares
-        response = oneview_client.server_hardware.get_all()
+        response = oneview_client.server_hardware.get_all(**listArgs)
 
     for member in response:
         data = {}
@@ -134,5 +188,9 @@ def get_hosts_status(oneview_client,hostCategory):
         # else:
         except KeyError:
             data['model'] = 'N.A'
+        # Snapshot of the resource, for the changes-only NodeStats
+        data['uri'] = member.get('uri')
+        data['modified'] = member.get('modified') or ''
+        data['version'] = member.get('eTag') or data['modified']
         hosts_status.append(data)
     return hosts_status
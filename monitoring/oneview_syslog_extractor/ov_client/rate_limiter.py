@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-###
+# Copyright (2020) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import logging
+import threading
+import time
+import multiprocessing as mp
+
+# Limiter of each appliance, by host. Installed by main() before the
+# pollers start, shared by all the pollers of the appliance.
+apiLimiters = {}
+_installLock = threading.Lock()
+
+
+##################################################################
+# Token bucket limiting the rate of OneView API calls.
+#
+# The bucket state lives in shared memory, so the budget is shared
+# between the threads and the processes forked after it is created.
+##################################################################
+class TokenBucket(object):
+
+    def __init__(self, rate, burst):
+        if rate <= 0:
+            raise Exception("Invalid OneView API rate - {}. Should be greater than 0".format(rate))
+
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self._tokens = mp.Value('d', self.burst, lock=False)
+        self._stamp = mp.Value('d', time.time(), lock=False)
+        self._lock = mp.Lock()
+
+    ##################################################################
+    # Block until 'tokens' calls are allowed by the budget.
+    ##################################################################
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                now = time.time()
+                available = self._tokens.value + (now - self._stamp.value) * self.rate
+                available = min(self.burst, available)
+                self._stamp.value = now
+
+                if available >= tokens:
+                    self._tokens.value = available - tokens
+                    return
+                self._tokens.value = available
+                wait = (tokens - available) / self.rate
+
+            time.sleep(wait)
+
+
+##################################################################
+# Install the limiter of an appliance, shared by all its pollers.
+# Each appliance has its own budget, the appliances do not slow
+# each other down.
+##################################################################
+def install(host, rate, burst):
+    with _installLock:
+        apiLimiters[host] = TokenBucket(rate, burst)
+    logging.info("OneView API budget of {} : {} calls/sec, burst = {}".format(host, rate, burst))
+    return apiLimiters[host]
+
+
+##################################################################
+# Wait for the budget of 'host' to allow one more OneView API call.
+# No-op when no limiter is installed for the appliance.
+##################################################################
+def acquire(host, tokens=1):
+    limiter = apiLimiters.get(host)
+    if limiter:
+        limiter.acquire(tokens)